@@ -0,0 +1,334 @@
+import math
+import numpy as np
+from constants import *
+from agent import Agent
+from spatial import map_extent
+
+class AgentStore:
+    """
+    Columnar (structure-of-arrays) storage for every agent in the simulation.
+    Each agent field lives in its own contiguous NumPy array, so a whole simulation
+    step is a handful of batch array operations instead of a Python loop over agents.
+
+    The columns are views onto a preallocated pool of slots. Dead agents leave their
+    slot on a free-list, and newborns take slots from it before claiming fresh ones,
+    so births and deaths never rebuild the columns. Slots [0, count) have been used
+    at some point; the alive column tells which of them currently hold an agent.
+    """
+    # Per-slot columns, with their dtypes
+    COLUMNS = {
+        'id': np.int64,
+        'x': np.float64,        # World X-coordinates
+        'y': np.float64,        # World Y-coordinates
+        'angle': np.float64,    # Facing angles (radians)
+        'speed': np.float64,
+        'timer': np.int32,      # Steps until the next direction change
+        'type': np.int8,        # PREY_TYPE or PREDATOR_TYPE
+        'brain_row': np.int32,  # Row of the agent's weights in its species' Brain, -1 if none
+        'energy': np.float64,
+        'catches': np.int32,    # Prey caught so far
+        'alive': np.bool_,
+        'idle': np.bool_,       # Frozen in an idle chunk, see ChunkGrid
+    }
+
+    def __init__(self, map_size=MAP_SIZE, rng=None, direction_change_interval=DIRECTION_CHANGE_INTERVAL, capacity=AGENT_POOL_CAPACITY,
+                 reproduction_energy=REPRODUCTION_ENERGY):
+        self.map_size = map_size
+        width, height = map_extent(map_size)
+        self.half_width = width / 2
+        self.half_height = height / 2
+        self.direction_change_interval = direction_change_interval
+        self.reproduction_energy = reproduction_energy # New agents start with up to this much energy
+
+        # Random generator used for initial angles/timers and direction resampling
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        self.count = 0 # Slots in use (alive or dead)
+        self.next_id = 0 # ID of the next agent added; every store numbers its own agents
+
+        # Running statistics, updated as agents are added and removed
+        self.population = 0 # Living agents
+        self.type_counts = np.zeros(len(AGENT_TYPE_NAMES), dtype=np.int64) # Living agents per type
+        self.speed_total = 0.0 # Sum of the living agents' speeds
+        self.births = 0 # Agents added so far
+        self.deaths = 0 # Agents removed so far
+        self.pool = {} # Column name -> preallocated array of every slot
+        self.free_slots = np.empty(0, dtype=np.int64) # Stack of dead slots, most recently freed on top
+        self.free_count = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        """
+        Moves the columns into a pool of the given number of slots.
+        Only happens when the population outgrows the pool, which doubles every
+        time, so the cost of growing is spread thinly over many births.
+        """
+        for name, dtype in self.COLUMNS.items():
+            column = self.new_column(name, capacity, dtype)
+            if name in self.pool:
+                column[:self.count] = self.pool[name][:self.count]
+            self.pool[name] = column
+        self.capacity = capacity
+
+        free_slots = np.empty(capacity, dtype=np.int64)
+        free_slots[:self.free_count] = self.free_slots[:self.free_count]
+        self.free_slots = free_slots
+
+        # Scratch buffers reused by step() to avoid per-step allocations
+        self._dx_pool = np.empty(capacity, dtype=np.float64)
+        self._dy_pool = np.empty(capacity, dtype=np.float64)
+        self.update_views()
+
+    def new_column(self, name, capacity, dtype):
+        """
+        Returns a zeroed array of the given number of slots for the named column.
+        """
+        return np.zeros(capacity, dtype=dtype)
+
+    def update_views(self):
+        """
+        Points the column attributes at the used slots of the pool.
+        """
+        for name in self.COLUMNS:
+            setattr(self, name, self.pool[name][:self.count])
+        self._dx = self._dx_pool[:self.count]
+        self._dy = self._dy_pool[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for index in np.flatnonzero(self.alive).tolist():
+            yield Agent(self, index)
+
+    def view(self, index):
+        """
+        Returns a thin Agent view onto the agent stored at the given index.
+        """
+        return Agent(self, index)
+
+    def count_type(self, agent_type):
+        """
+        Returns the number of living agents of the given type code.
+        """
+        return int(self.type_counts[agent_type])
+
+    def claim_slots(self, n):
+        """
+        Returns n slots for new agents: freed slots first, then fresh ones past
+        the used slots, growing the pool if it is full.
+        """
+        reused = min(n, self.free_count)
+        self.free_count -= reused
+        slots = self.free_slots[self.free_count:self.free_count + reused].copy()
+
+        fresh = n - reused
+        if fresh:
+            if self.count + fresh > self.capacity:
+                self.allocate(max(2 * self.capacity, self.count + fresh))
+            slots = np.concatenate((slots, np.arange(self.count, self.count + fresh)))
+            self.count += fresh
+            self.update_views()
+        return slots
+
+    def add(self, xs, ys, agent_type, speed, energy=None):
+        """
+        Adds a batch of agents at the given world positions, and returns the slots
+        they were stored in. The type, speed and energy can be one value for the
+        whole batch or one per agent.
+        Angles and direction change timers are drawn at random, and every new
+        agent gets the next unique ID of the store. Energy defaults to a random
+        level below the reproduction threshold.
+        """
+        n = len(xs)
+        slots = self.claim_slots(n)
+        first_id = self.next_id
+        self.next_id += n
+
+        self.id[slots] = np.arange(first_id, first_id + n, dtype=np.int64)
+        self.x[slots] = xs
+        self.y[slots] = ys
+        self.angle[slots] = self.rng.uniform(0, 2 * math.pi, n)
+        self.speed[slots] = speed
+        self.timer[slots] = self.rng.integers(0, self.direction_change_interval, n, endpoint=True, dtype=np.int32)
+        self.type[slots] = agent_type
+        self.brain_row[slots] = -1
+        self.energy[slots] = energy if energy is not None else self.rng.uniform(0, self.reproduction_energy, n)
+        self.catches[slots] = 0
+        self.alive[slots] = True
+        self.idle[slots] = False
+
+        self.population += n
+        self.type_counts += np.bincount(self.type[slots], minlength=len(AGENT_TYPE_NAMES))
+        self.speed_total += float(self.speed[slots].sum())
+        self.births += n
+        return slots
+
+    def remove(self, slots):
+        """
+        Kills the agents in the given slots and puts the slots on the free-list.
+        """
+        n = len(slots)
+        self.type_counts -= np.bincount(self.type[slots], minlength=len(AGENT_TYPE_NAMES))
+        self.speed_total -= float(self.speed[slots].sum())
+        self.deaths += n
+        self.alive[slots] = False
+        self.idle[slots] = False
+        self.brain_row[slots] = -1
+        self.free_slots[self.free_count:self.free_count + n] = slots
+        self.free_count += n
+        self.population -= n
+
+    def compact(self):
+        """
+        Moves the living agents to the front of the pool, in slot order, and empties
+        the free-list. Only worth it after a population crash has left most used
+        slots dead, since every step still touches them.
+        Agents change slots, so Agent views must be looked up again by ID.
+        """
+        living = np.flatnonzero(self.alive)
+        for name in self.COLUMNS:
+            self.pool[name][:living.size] = self.pool[name][living]
+        self.count = living.size
+        self.free_count = 0
+        self.update_views()
+
+    def load_columns(self, columns, free_slots=None):
+        """
+        Replaces the contents of the store with the given column arrays
+        (a dictionary with one array per agent field), and the given free-list.
+        """
+        self.count = len(columns['x'])
+        self.pool = {}
+        self.free_count = 0
+        self.allocate(max(self.capacity, self.count))
+        for name, column in columns.items():
+            self.pool[name][:self.count] = column
+        if free_slots is not None:
+            self.free_slots[:len(free_slots)] = free_slots
+            self.free_count = len(free_slots)
+        self.population = int(np.count_nonzero(self.alive))
+        self.type_counts = np.bincount(self.type[self.alive], minlength=len(AGENT_TYPE_NAMES)).astype(np.int64)
+        self.speed_total = float(self.speed[self.alive].sum())
+
+    def step(self, steered=None, steps=None):
+        """
+        Advances every agent by one simulation step: ticks the direction change
+        timers, resamples the angle of agents whose timer expired, moves all agents
+        along their facing angle and wraps them around the toroidal map edges.
+        Agents flagged in the optional steered mask have their angle set by a brain
+        instead, and never turn randomly.
+        If steps is given, it holds the number of steps each agent advances by
+        instead (0 for agents frozen in idle chunks, more for agents catching up).
+        When some agents don't advance, only the others are touched. See
+        step_some() for how catching up on several steps at once is approximated.
+        Dead slots are stepped too, which is cheaper than skipping them; their
+        contents are never read.
+        """
+        if steps is not None and not steps.all():
+            self.step_some(steered, steps)
+            return
+
+        # Update direction periodically for agents without a brain
+        if steps is None:
+            self.timer -= 1
+        else:
+            self.timer -= steps
+        expired = self.timer <= 0
+        if steered is not None:
+            expired &= ~steered
+        expired = np.flatnonzero(expired)
+        if expired.size:
+            self.angle[expired] = self.rng.uniform(0, 2 * math.pi, expired.size)
+            self.timer[expired] = self.direction_change_interval
+
+        # Move along the facing angle
+        np.cos(self.angle, out=self._dx)
+        np.sin(self.angle, out=self._dy)
+        self._dx *= self.speed
+        self._dy *= self.speed
+        if steps is not None:
+            self._dx *= steps
+            self._dy *= steps
+        self.x += self._dx
+        self.y += self._dy
+
+        half_width = self.half_width
+        half_height = self.half_height
+        if steps is not None:
+            self.wrap_catch_up(steps > 1)
+
+        # Implement toroidal (looping) boundaries: an agent leaving one edge
+        # reappears on the opposite edge
+        self.x[self.x > half_width] = -half_width
+        self.x[self.x < -half_width] = half_width
+        self.y[self.y > half_height] = -half_height
+        self.y[self.y < -half_height] = half_height
+
+    def wrap_catch_up(self, far):
+        """
+        Wraps the agents of the far mask, which may have travelled more than a
+        map edge's width in one go, around the map by the whole distance.
+        Computes x - width * floor(x / width) in place, which is np.mod, only faster.
+        """
+        for position, half_size, buffer in ((self.x, self.half_width, self._dx), (self.y, self.half_height, self._dy)):
+            np.add(position, half_size, out=buffer)
+            buffer /= 2 * half_size
+            np.floor(buffer, out=buffer)
+            buffer *= 2 * half_size
+            buffer *= far
+            position -= buffer
+
+    def step_some(self, steered, steps):
+        """
+        Advances each agent by its own number of steps, skipping the slots of
+        agents that don't advance at all. Agents advancing by one step move
+        exactly as step() would move them.
+        Catching up on several steps at once is an approximation: the agent
+        travels the whole distance in a straight line along its current heading,
+        and its direction timer expires at most once. Its path differs from
+        stepping one step at a time, but frozen agents are far from anything
+        they could meet, so only where they end up changes, not what happens to
+        them. The distance travelled is wrapped around the map in full.
+        """
+        moving = np.flatnonzero(steps)
+        if not moving.size:
+            return
+        advance = steps[moving]
+        timer = self.timer[moving] - advance
+        expired = timer <= 0
+        if steered is not None:
+            expired &= ~steered[moving]
+        expired = np.flatnonzero(expired)
+        angle = self.angle[moving]
+        if expired.size:
+            angle[expired] = self.rng.uniform(0, 2 * math.pi, expired.size)
+            timer[expired] = self.direction_change_interval
+            self.angle[moving] = angle
+        self.timer[moving] = timer
+
+        # Move along the facing angle
+        dx = np.cos(angle, out=self._dx[:moving.size])
+        dy = np.sin(angle, out=self._dy[:moving.size])
+        distance = self.speed[moving]
+        distance *= advance
+        dx *= distance
+        dy *= distance
+        x = self.x[moving]
+        y = self.y[moving]
+        x += dx
+        y += dy
+
+        # Catching up wraps the whole distance travelled; single steps wrap like step() does
+        half_width = self.half_width
+        half_height = self.half_height
+        far = advance > 1
+        if far.any():
+            x -= 2 * half_width * np.floor((x + half_width) / (2 * half_width)) * far
+            y -= 2 * half_height * np.floor((y + half_height) / (2 * half_height)) * far
+        x[x > half_width] = -half_width
+        x[x < -half_width] = half_width
+        y[y > half_height] = -half_height
+        y[y < -half_height] = half_height
+        self.x[moving] = x
+        self.y[moving] = y
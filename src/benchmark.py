@@ -0,0 +1,206 @@
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import numpy as np
+from constants import *
+from world import World
+
+# Benchmark cases, in the order they run for each agent count.
+# Zoom-dependent cases run once per zoom level.
+CASES = ('query_radius', 'query_knn', 'pick', 'render', 'step')
+ZOOM_CASES = ('pick', 'render')
+
+def measure(function, min_time=BENCHMARK_MIN_TIME, min_repeats=BENCHMARK_MIN_REPEATS, max_repeats=BENCHMARK_MAX_REPEATS):
+    """
+    Calls function(i) for i = 0, 1, 2... after a few untimed warm-up calls, until
+    it has run for at least min_time seconds and min_repeats times (at most
+    max_repeats times). Returns the time of each timed call, in seconds.
+    """
+    for i in range(BENCHMARK_WARMUP):
+        function(i)
+    times = []
+    total = 0.0
+    while len(times) < max_repeats and (len(times) < min_repeats or total < min_time):
+        start_time = time.perf_counter()
+        function(len(times))
+        elapsed = time.perf_counter() - start_time
+        times.append(elapsed)
+        total += elapsed
+    return np.array(times)
+
+def summarize(case, agents, zoom, times):
+    """
+    Returns one result row: the timing statistics of a case, in milliseconds.
+    """
+    median = float(np.median(times))
+    return {
+        'case': case,
+        'agents': agents,
+        'zoom': zoom,
+        'repeats': len(times),
+        'median_ms': median * 1000,
+        'min_ms': float(times.min()) * 1000,
+        'mean_ms': float(times.mean()) * 1000,
+        'p90_ms': float(np.percentile(times, 90)) * 1000,
+        'ns_per_agent': median * 1e9 / agents,
+    }
+
+def case_key(row):
+    return (row['case'], row['agents'], row['zoom'])
+
+def make_world(agents, map_size, seed, ecosystem, idle_chunks=False):
+    """
+    Builds a world of the given total agent count, split between the species
+    in the default prey to predator ratio.
+    """
+    predators = max(1, round(agents * PREDATOR_COUNT / (PREY_COUNT + PREDATOR_COUNT)))
+    world = World(agents - predators, predators, map_size, seed, ecosystem=ecosystem, idle_chunks=idle_chunks)
+    world.reproduction = False # Keep the agent count fixed while timing
+    return world
+
+def map_size_for(agents, constant_density):
+    """
+    Returns the map size for an agent count: the default map, or one grown to keep
+    the default agent density.
+    """
+    if not constant_density:
+        return MAP_SIZE
+    return int(math.ceil(MAP_SIZE * math.sqrt(agents / (PREY_COUNT + PREDATOR_COUNT))))
+
+def run_benchmarks(agent_counts, zoom_levels, cases, seed=BENCHMARK_SEED, constant_density=False, ecosystem=False, idle_chunks=False):
+    """
+    Runs the selected cases at every agent count (and zoom level, for the pick and
+    render cases), each against a freshly seeded world. Returns the result rows.
+    """
+    needs_display = any(case in ZOOM_CASES for case in cases)
+    if needs_display:
+        # Render into an offscreen dummy display; pygame is only imported when needed
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        from simulation import Simulation
+
+    results = []
+    for agents in agent_counts:
+        map_size = map_size_for(agents, constant_density)
+        world = make_world(agents, map_size, seed, ecosystem, idle_chunks)
+        rng = np.random.default_rng(seed)
+        half_map = map_size / 2
+        points = rng.uniform(-half_map, half_map, (BENCHMARK_MAX_REPEATS + BENCHMARK_WARMUP, 2))
+        simulation = Simulation(world) if needs_display else None
+
+        for case in cases:
+            first_row = len(results)
+            if case == 'query_radius':
+                times = measure(lambda i: world.spatial.query_radius(points[i, 0], points[i, 1], BENCHMARK_QUERY_RADIUS))
+                results.append(summarize(case, agents, None, times))
+            elif case == 'query_knn':
+                times = measure(lambda i: world.spatial.query_knn(points[i, 0], points[i, 1], BENCHMARK_QUERY_K))
+                results.append(summarize(case, agents, None, times))
+            elif case == 'step':
+                times = measure(lambda i: world.update())
+                results.append(summarize(case, agents, None, times))
+            else:
+                for zoom in zoom_levels:
+                    simulation.zoom_level = zoom
+                    simulation.camera_x = simulation.camera_y = 0
+                    simulation.clamp_camera()
+                    if case == 'pick':
+                        # Clicks at random positions of the simulation area
+                        clicks = rng.integers(0, (simulation.config.content_width, simulation.config.content_height), (len(points), 2))
+                        times = measure(lambda i: simulation.select_agent(clicks[i]))
+                        simulation.selected_agent = None
+                    else:
+                        times = measure(lambda i: simulation.draw_simulation())
+                    results.append(summarize(case, agents, zoom, times))
+            for row in results[first_row:]:
+                print(format_row(row), file=sys.stderr)
+    return results
+
+def format_row(row):
+    zoom = f"{row['zoom']:.2f}" if row['zoom'] is not None else '-'
+    return (f"{row['case']:<14}{row['agents']:>10}{zoom:>8}{row['median_ms']:>12.3f}{row['min_ms']:>12.3f}"
+            f"{row['p90_ms']:>12.3f}{row['ns_per_agent']:>14.1f}")
+
+def format_header():
+    return f"{'case':<14}{'agents':>10}{'zoom':>8}{'median ms':>12}{'min ms':>12}{'p90 ms':>12}{'ns/agent':>14}"
+
+def environment():
+    """
+    Describes the machine and library versions the results were measured with.
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+def compare(results, baseline, threshold=BENCHMARK_REGRESSION_THRESHOLD):
+    """
+    Compares the median times of results against a baseline's, case by case.
+    Prints a table of the ratios and returns the rows more than threshold
+    (a fraction) slower than the baseline.
+    """
+    baseline_rows = {case_key(row): row for row in baseline}
+    regressions = []
+    print(f"{'case':<14}{'agents':>10}{'zoom':>8}{'baseline ms':>14}{'current ms':>14}{'ratio':>8}")
+    for row in results:
+        old = baseline_rows.get(case_key(row))
+        if old is None:
+            continue
+        ratio = row['median_ms'] / old['median_ms'] if old['median_ms'] > 0 else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(row)
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        zoom = f"{row['zoom']:.2f}" if row['zoom'] is not None else '-'
+        print(f"{row['case']:<14}{row['agents']:>10}{zoom:>8}{old['median_ms']:>14.3f}{row['median_ms']:>14.3f}{ratio:>8.2f}{flag}")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the step, query and render paths across agent counts and zoom levels")
+    parser.add_argument("--agents", type=int, nargs='+', default=list(BENCHMARK_AGENT_COUNTS), help="agent counts to benchmark")
+    parser.add_argument("--zoom", type=float, nargs='+', default=list(BENCHMARK_ZOOM_LEVELS), help="zoom levels of the pick and render cases")
+    parser.add_argument("--cases", choices=CASES, nargs='+', default=list(CASES), help="cases to run")
+    parser.add_argument("--seed", type=int, default=BENCHMARK_SEED, help="seed of the benchmark worlds and query points")
+    parser.add_argument("--constant-density", action="store_true", help="grow the map with the agent count instead of keeping the default map")
+    parser.add_argument("--ecosystem", action="store_true", help="include predation and energy in the step case (births stay off)")
+    parser.add_argument("--idle-chunks", action="store_true", help="step the agents of quiet map regions less often in the step case")
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    parser.add_argument("--results", default=None, help="compare this results file instead of running the benchmarks")
+    parser.add_argument("--compare", default=None, help="baseline results file to flag regressions against")
+    parser.add_argument("--threshold", type=float, default=BENCHMARK_REGRESSION_THRESHOLD, help="slowdown (fraction) flagged as a regression")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.results:
+        with open(args.results) as file:
+            report = json.load(file)
+    else:
+        print(format_header(), file=sys.stderr)
+        results = run_benchmarks(args.agents, args.zoom, args.cases, args.seed, args.constant_density, args.ecosystem, args.idle_chunks)
+        report = {
+            'environment': environment(),
+            'settings': {'seed': args.seed, 'constant_density': args.constant_density, 'ecosystem': args.ecosystem, 'idle_chunks': args.idle_chunks},
+            'results': results,
+        }
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(report, file, indent=1)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(report['results'], baseline['results'], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,156 @@
+import numpy as np
+from constants import *
+
+class Brain:
+    """
+    Neural networks for every agent of one species.
+    All agents of a species share one architecture (a small tanh MLP), and their
+    weights are stacked into one tensor per layer with a row per agent, so a whole
+    species thinks with one batched matmul per layer instead of one network call per agent.
+    Several agents may share a row (evolved genomes are dealt out to many agents),
+    so every row counts its users. Rows whose last user died go on a free-list and
+    are handed to newborns, so the tensors only grow (doubling) when the species
+    outgrows them.
+    """
+
+    def __init__(self, layer_sizes, count, rng):
+        self.layer_sizes = tuple(layer_sizes) # Inputs, hidden layer sizes, outputs
+        self.weights = []
+        self.biases = []
+        for n_in, n_out in zip(self.layer_sizes[:-1], self.layer_sizes[1:]):
+            # Scaled so every layer's outputs start in tanh's responsive range
+            self.weights.append(rng.normal(0, 1 / np.sqrt(n_in), (count, n_in, n_out)).astype(np.float32))
+            self.biases.append(np.zeros((count, n_out), dtype=np.float32))
+        self.rows_used = count # Rows handed out so far (alive or freed)
+        self.users = np.ones(count, dtype=np.int64) # Agents using each row
+        self.free_rows = np.empty(count, dtype=np.int64) # Stack of freed rows
+        self.free_count = 0
+
+    def __len__(self):
+        return self.rows_used
+
+    def claim_rows(self, n):
+        """
+        Returns n rows for new agents: freed rows first, then fresh ones, growing
+        the weight tensors if they are full.
+        """
+        reused = min(n, self.free_count)
+        self.free_count -= reused
+        rows = self.free_rows[self.free_count:self.free_count + reused].copy()
+
+        fresh = n - reused
+        if fresh:
+            capacity = len(self.weights[0])
+            if self.rows_used + fresh > capacity:
+                capacity = max(2 * capacity, self.rows_used + fresh)
+                self.weights = [self.grown(weights, capacity) for weights in self.weights]
+                self.biases = [self.grown(biases, capacity) for biases in self.biases]
+                self.users = self.grown(self.users, capacity)
+                self.free_rows = self.grown(self.free_rows, capacity)
+            rows = np.concatenate((rows, np.arange(self.rows_used, self.rows_used + fresh)))
+            self.rows_used += fresh
+        self.users[rows] = 1
+        return rows
+
+    @staticmethod
+    def grown(array, capacity):
+        """
+        Returns a copy of array with room for the given number of rows.
+        """
+        grown = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def release_rows(self, rows):
+        """
+        Lets go of the rows of agents that died, putting the rows left without
+        users on the free-list.
+        """
+        np.subtract.at(self.users, rows, 1)
+        emptied = np.unique(rows[self.users[rows] == 0])
+        self.free_rows[self.free_count:self.free_count + len(emptied)] = emptied
+        self.free_count += len(emptied)
+
+    def inherit(self, parent_rows, rng, mutation_scale=BRAIN_MUTATION_SCALE):
+        """
+        Gives each newborn a copy of its parent's network, slightly mutated.
+        Returns the newborns' rows.
+        """
+        rows = self.claim_rows(len(parent_rows))
+        for weights, biases in zip(self.weights, self.biases):
+            weights[rows] = weights[parent_rows] + rng.normal(0, mutation_scale, (len(rows), *weights.shape[1:]))
+            biases[rows] = biases[parent_rows] + rng.normal(0, mutation_scale, (len(rows), *biases.shape[1:]))
+        return rows
+
+    @staticmethod
+    def genome_length(layer_sizes):
+        """
+        Returns the number of parameters of one network with the given layer sizes.
+        """
+        return sum(n_in * n_out + n_out for n_in, n_out in zip(layer_sizes[:-1], layer_sizes[1:]))
+
+    def genomes(self, rows):
+        """
+        Returns the networks at the given rows flattened into parameter vectors
+        (genomes), one per row: each layer's weights followed by its biases.
+        """
+        parts = []
+        for weights, biases in zip(self.weights, self.biases):
+            parts.append(weights[rows].reshape(len(rows), -1))
+            parts.append(biases[rows])
+        return np.concatenate(parts, axis=1)
+
+    def load_genomes(self, genomes):
+        """
+        Replaces every network with the given genomes, which become rows 0 to len(genomes) - 1.
+        """
+        count = len(genomes)
+        self.weights = []
+        self.biases = []
+        position = 0
+        for n_in, n_out in zip(self.layer_sizes[:-1], self.layer_sizes[1:]):
+            self.weights.append(genomes[:, position:position + n_in * n_out].reshape(count, n_in, n_out).astype(np.float32))
+            position += n_in * n_out
+            self.biases.append(genomes[:, position:position + n_out].astype(np.float32))
+            position += n_out
+        self.rows_used = count
+        self.users = np.zeros(count, dtype=np.int64)
+        self.free_rows = np.empty(count, dtype=np.int64)
+        self.free_count = 0
+
+    def deal(self, count):
+        """
+        Deals the networks out evenly among count agents, and returns each agent's row.
+        """
+        rows = np.arange(count) % self.rows_used
+        self.users[:] = np.bincount(rows, minlength=self.rows_used)
+        return rows
+
+    def forward(self, inputs, rows):
+        """
+        Runs each input row through the network stored at the matching brain row.
+        inputs has shape (n, layer_sizes[0]); returns outputs of shape (n, layer_sizes[-1]) in [-1, 1].
+        When many agents share each row (evolution deals a few genomes out to a
+        whole species), each row's agents go through its network together, so its
+        weights are read once rather than copied for every agent.
+        """
+        inputs = inputs.astype(np.float32)
+        counts = np.bincount(rows, minlength=self.rows_used)
+        shared = np.flatnonzero(counts)
+        if len(rows) < BRAIN_SHARED_ROW_AGENTS * shared.size:
+            # Mostly one agent per row: gathering the rows reads each of them once anyway
+            activations = inputs[:, None, :]
+            for weights, biases in zip(self.weights, self.biases):
+                activations = np.tanh(np.matmul(activations, weights[rows]) + biases[rows][:, None, :])
+            return activations[:, 0, :]
+
+        outputs = np.empty((len(rows), self.layer_sizes[-1]), dtype=np.float32)
+        order = np.argsort(rows, kind='stable')
+        ends = np.cumsum(counts[shared])
+        for row, start, end in zip(shared.tolist(), (ends - counts[shared]).tolist(), ends.tolist()):
+            members = order[start:end]
+            activations = inputs[members]
+            for weights, biases in zip(self.weights, self.biases):
+                activations = np.tanh(np.matmul(activations, weights[row]) + biases[row])
+            outputs[members] = activations
+        return outputs
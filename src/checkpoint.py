@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import numpy as np
+from constants import *
+from world import World
+from brain import Brain
+from sensors import SENSORS
+
+# --- Checkpoint File Format ---
+# A checkpoint is a NumPy .npz archive holding the agent store columns and free-list,
+# the spatial index order (so neighbour queries return agents in the same order after
+# a restore), each species' brain weights, biases and free rows, plus a JSON metadata
+# entry with the format version, the world's parameters, the step count, the agent store's next ID,
+# the brain architectures and sensor, the idle chunk settings, and the random generator state.
+# Version 1 and 2 checkpoints (written before brains and before the ecosystem
+# existed) can still be loaded; they resume without the ecosystem. Version 3
+# checkpoints (before non-square maps and idle chunks) resume with every agent active.
+CHECKPOINT_FORMAT = 'predator-prey-checkpoint'
+CHECKPOINT_VERSION = 4
+STORE_COLUMNS = ('id', 'x', 'y', 'angle', 'speed', 'timer', 'type', 'brain_row', 'energy', 'catches', 'alive', 'idle')
+
+def snapshot(world):
+    """
+    Captures the full state of a world as a dictionary of arrays.
+    Arrays are copied, so the world can keep stepping while the snapshot is written.
+    """
+    metadata = {
+        'format': CHECKPOINT_FORMAT,
+        'version': CHECKPOINT_VERSION,
+        'prey_count': world.prey_count,
+        'predator_count': world.predator_count,
+        'map_size': world.map_size,
+        'seed': world.seed,
+        'prey_speed': world.prey_speed,
+        'predator_speed': world.predator_speed,
+        'direction_change_interval': world.direction_change_interval,
+        'ecosystem': world.ecosystem,
+        'idle_chunks': world.idle_chunks,
+        'catch_distance': world.catch_distance,
+        'energy_per_step': world.energy_per_step.tolist(),
+        'reproduction_energy': world.reproduction_energy,
+        'max_population': world.max_population,
+        'pool_capacity': world.pool_capacity,
+        'chunk_review_step': world.chunks.review_step,
+        'reproduction': world.reproduction,
+        'compaction': world.compaction,
+        'step_count': world.step_count,
+        'catch_count': world.catch_count,
+        'births': world.agents.births,
+        'deaths': world.agents.deaths,
+        'next_id': world.agents.next_id,
+        'rng_state': world.agents.rng.bit_generator.state,
+        'brains': {agent_type: brain.layer_sizes for agent_type, brain in world.brains.items()},
+        'sensor': world.sensor.name if world.sensor else None,
+    }
+    arrays = {name: getattr(world.agents, name)[:world.agents.count].copy() for name in STORE_COLUMNS}
+    arrays['free_slots'] = world.agents.free_slots[:world.agents.free_count].copy()
+    arrays['spatial_order'] = world.spatial.order.copy()
+    for agent_type, brain in world.brains.items():
+        for layer, (weights, biases) in enumerate(zip(brain.weights, brain.biases)):
+            arrays[f'brain_{agent_type}_weights_{layer}'] = weights[:brain.rows_used].copy()
+            arrays[f'brain_{agent_type}_biases_{layer}'] = biases[:brain.rows_used].copy()
+        arrays[f'brain_{agent_type}_free_rows'] = brain.free_rows[:brain.free_count].copy()
+    arrays['metadata'] = np.array(json.dumps(metadata))
+    return arrays
+
+def write_snapshot(arrays, path):
+    """
+    Writes a snapshot to disk atomically: a crash mid-write never leaves a
+    truncated checkpoint at the given path.
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(temporary_path, path)
+
+def save_checkpoint(world, path):
+    """
+    Saves the full state of a world to a checkpoint file.
+    """
+    write_snapshot(snapshot(world), path)
+
+def load_checkpoint(path, seed=None):
+    """
+    Restores a world from a checkpoint file, bit for bit.
+    If a seed is given, the restored world draws from a fresh generator seeded
+    with it instead of the saved random state, to fork a variant of the run.
+    """
+    with np.load(path) as archive:
+        metadata = json.loads(str(archive['metadata']))
+        if metadata.get('format') != CHECKPOINT_FORMAT or metadata.get('version') not in (1, 2, 3, CHECKPOINT_VERSION):
+            raise ValueError(f"{path} is not a version {CHECKPOINT_VERSION} checkpoint")
+
+        world = World(0, 0, metadata['map_size'], metadata['seed'], metadata['prey_speed'],
+                      metadata['predator_speed'], metadata['direction_change_interval'], metadata.get('ecosystem', False),
+                      metadata.get('idle_chunks', False), metadata.get('catch_distance', CATCH_DISTANCE),
+                      metadata.get('energy_per_step', ENERGY_PER_STEP), metadata.get('reproduction_energy', REPRODUCTION_ENERGY),
+                      metadata.get('max_population', MAX_POPULATION), metadata.get('pool_capacity', AGENT_POOL_CAPACITY))
+        world.prey_count = metadata['prey_count']
+        world.predator_count = metadata['predator_count']
+        world.step_count = metadata['step_count']
+        world.reproduction = metadata.get('reproduction', True)
+        world.compaction = metadata.get('compaction', True)
+        world.chunks.review_step = metadata.get('chunk_review_step', 0)
+
+        agents = world.agents
+        columns = {name: archive[name].copy() for name in STORE_COLUMNS if name in archive}
+        if 'brain_row' not in columns:
+            columns['brain_row'] = np.full(len(columns['x']), -1, dtype=np.int32)
+        if 'alive' not in columns:
+            columns['energy'] = np.full(len(columns['x']), world.reproduction_energy / 2)
+            columns['alive'] = np.ones(len(columns['x']), dtype=bool)
+        agents.load_columns(columns, archive['free_slots'] if 'free_slots' in archive else None)
+        spatial_order = archive['spatial_order'].copy()
+
+        for agent_type, layer_sizes in metadata.get('brains', {}).items():
+            agent_type = int(agent_type) # JSON object keys are strings
+            brain = Brain(layer_sizes, 0, agents.rng)
+            brain.weights = [archive[f'brain_{agent_type}_weights_{layer}'].copy() for layer in range(len(layer_sizes) - 1)]
+            brain.biases = [archive[f'brain_{agent_type}_biases_{layer}'].copy() for layer in range(len(layer_sizes) - 1)]
+            brain.rows_used = len(brain.weights[0])
+            # Row users are whoever still holds each row
+            users = agents.brain_row[agents.alive & (agents.type == agent_type) & (agents.brain_row >= 0)]
+            brain.users = np.bincount(users, minlength=brain.rows_used).astype(np.int64)
+            brain.free_rows = np.empty(brain.rows_used, dtype=np.int64)
+            free_rows = archive[f'brain_{agent_type}_free_rows'] if f'brain_{agent_type}_free_rows' in archive else np.empty(0, dtype=np.int64)
+            brain.free_rows[:len(free_rows)] = free_rows
+            brain.free_count = len(free_rows)
+            world.brains[agent_type] = brain
+        if world.brains:
+            world.sensor = SENSORS[metadata.get('sensor', 'nearest')](world.map_size)
+
+    world.catch_count = metadata.get('catch_count', 0)
+    agents.births = metadata.get('births', agents.population)
+    agents.deaths = metadata.get('deaths', 0)
+    if seed is None:
+        agents.rng.bit_generator.state = metadata['rng_state']
+    else:
+        world.seed = seed
+        agents.rng = np.random.default_rng(seed)
+    agents.next_id = metadata['next_id']
+
+    # Rebuild the spatial index in the saved order (the cell offsets don't depend on it)
+    world.spatial.update(agents.x, agents.y, agents.alive)
+    world.spatial.order = spatial_order
+    return world
+
+class Checkpointer:
+    """
+    Periodically saves checkpoints of a world without stopping the loop.
+    The state is copied in memory on the stepping thread, then written to disk
+    on a background thread while stepping continues.
+    """
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval # Steps between checkpoints
+        self.writer = None # Background thread writing the latest snapshot
+
+    def after_step(self, world):
+        """
+        Starts a checkpoint if one is due at the world's current step.
+        """
+        if world.step_count % self.interval == 0:
+            self.checkpoint(world)
+
+    def checkpoint(self, world):
+        """
+        Snapshots the world and writes it in the background.
+        """
+        # Only one write in flight: checkpoints can't pile up faster than the disk takes them
+        self.wait()
+        arrays = snapshot(world)
+        self.writer = threading.Thread(target=write_snapshot, args=(arrays, self.path), daemon=True)
+        self.writer.start()
+
+    def wait(self):
+        """
+        Blocks until the checkpoint being written, if any, is on disk.
+        """
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
@@ -0,0 +1,121 @@
+import numpy as np
+from constants import *
+from spatial import SpatialHash
+
+class ChunkGrid:
+    """
+    Divides the world into fixed-size region chunks, for stepping quiet regions
+    less often and for the viewer's zoomed-out density overview.
+    A chunk holding agents is active while an observer watches it or any of its
+    agents is within `border` world units of its edge, and idle otherwise. The
+    agents of idle chunks are frozen, and catch up on the steps they missed all at
+    once at the end of every idle interval (or as soon as an observer looks at
+    them). The border is wider than anything can travel and interact over an
+    interval, so frozen agents never miss an encounter with another chunk's agents.
+    Agents frozen in the same chunk only meet each other where they end up: on
+    the catch-up step every agent hunts and gives birth as usual, but contacts
+    along the way, during the steps they skipped, are not looked for. That is
+    the price of freezing them, and watched chunks are never idle, so it never
+    shows on screen.
+    Chunks are bucketed with a spatial index that only keeps track of occupied
+    chunks, so empty regions of the map cost nothing.
+    """
+
+    def __init__(self, map_size, chunk_size=CHUNK_SIZE, idle_interval=CHUNK_IDLE_INTERVAL):
+        self.index = SpatialHash(map_size, chunk_size)
+        self.idle_interval = idle_interval
+        self.border = 0.0 # Agents this close to their chunk's edge keep it active
+        self.review_step = 0 # Step count the idle chunks' agents were frozen at
+        self.observers = [] # World rectangles (left, top, right, bottom) being watched
+        self.checked_observers = [] # Observers no frozen agent was in view of, when last checked
+
+    def watched_cells(self):
+        """
+        Returns the chunks overlapping any observer's rectangle.
+        """
+        index = self.index
+        watched = [np.empty(0, dtype=np.int64)]
+        for left, top, right, bottom in self.observers:
+            first_column = int(np.floor((left + index.half_width) / index.cell_width))
+            last_column = int(np.floor((right + index.half_width) / index.cell_width))
+            first_row = int(np.floor((top + index.half_height) / index.cell_height))
+            last_row = int(np.floor((bottom + index.half_height) / index.cell_height))
+            # Rectangles crossing the map's edge watch the chunks on the other side
+            columns = np.unique(np.arange(first_column, last_column + 1) % index.cells_x)
+            rows = np.unique(np.arange(first_row, last_row + 1) % index.cells_y)
+            watched.append((rows[:, None] * index.cells_x + columns[None, :]).ravel())
+        return np.unique(np.concatenate(watched))
+
+    def steps_due(self, agents, step_count):
+        """
+        Returns how many steps each agent advances by in the coming step: 1 in
+        active chunks, 0 for frozen agents, and every step missed since they were
+        frozen for frozen agents catching up.
+        """
+        idle = agents.idle
+        missed = step_count + 1 - self.review_step
+        if missed >= self.idle_interval:
+            return np.where(idle, missed, 1) # The interval is over: everyone catches up, then chunks are reviewed
+
+        steps = (~idle).astype(np.int64)
+        if self.observers == self.checked_observers:
+            return steps # Frozen agents don't move, so they are still out of view
+
+        # Agents of chunks an observer just started watching catch up early
+        self.checked_observers = list(self.observers)
+        frozen = np.flatnonzero(idle)
+        cx, cy = self.index.cell_coords(agents.x[frozen], agents.y[frozen])
+        woken = np.isin(cy * self.index.cells_x + cx, self.watched_cells())
+        steps[frozen[woken]] = missed
+        agents.idle[frozen[woken]] = False
+        return steps
+
+    def review_due(self, step_count):
+        return step_count - self.review_step >= self.idle_interval
+
+    def review(self, agents, step_count):
+        """
+        Works out which chunks are idle, and freezes their agents.
+        Only called when every agent is up to date.
+        """
+        index = self.index
+        alive = agents.alive
+        self.review_step = step_count
+        self.checked_observers = list(self.observers)
+        index.update(agents.x, agents.y, alive)
+        occupied, counts = index.occupied_cells()
+        if not occupied.size:
+            agents.idle[:] = False
+            return
+        # Position in occupied of every living agent's chunk (the order is sorted by chunk)
+        chunk = np.zeros(len(agents), dtype=np.int64)
+        chunk[index.order[:index.indexed_count]] = np.repeat(np.arange(occupied.size), counts)
+
+        # Position of every agent within its chunk, as a fraction of the chunk's size
+        local_x = (agents.x + index.half_width) / index.cell_width
+        local_x -= np.floor(local_x)
+        local_y = (agents.y + index.half_height) / index.cell_height
+        local_y -= np.floor(local_y)
+        border_x = self.border / index.cell_width
+        border_y = self.border / index.cell_height
+        near_edge = alive & ((local_x < border_x) | (local_x > 1 - border_x) |
+                             (local_y < border_y) | (local_y > 1 - border_y))
+        # One flag per occupied chunk, so the cost follows the population, not the map's area
+        active = np.zeros(occupied.size, dtype=bool)
+        active[chunk[near_edge]] = True
+        watched = self.watched_cells()
+        position = np.minimum(np.searchsorted(occupied, watched), occupied.size - 1)
+        active[position[occupied[position] == watched]] = True
+        agents.idle[:] = alive & ~active[chunk]
+
+    def density(self, agents):
+        """
+        Returns (cells, totals, predators): every occupied chunk, with its number
+        of living agents and how many of them are predators.
+        """
+        index = self.index
+        index.update(agents.x, agents.y, agents.alive)
+        cells, totals = index.occupied_cells()
+        predator_cells = index.cells[agents.alive & (agents.type == PREDATOR_TYPE)]
+        predators = np.bincount(np.searchsorted(cells, predator_cells), minlength=cells.size)
+        return cells, totals, predators
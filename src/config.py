@@ -0,0 +1,135 @@
+import json
+from constants import *
+
+class Config:
+    """
+    Settings of one run: the world's parameters and the viewer's layout.
+    Values are checked when the config is created, and the values derived from them
+    (half the map size, the simulation area's size and centre...) are computed once
+    here, so the stepping and drawing code reads them instead of redoing the arithmetic.
+    Configs are never changed in place; replace() returns an updated copy, so
+    several worlds in one process can each have their own.
+    """
+    # Settable fields: name -> (type, default, minimum); None defaults may stay None
+    FIELDS = {
+        'map_size': (int, MAP_SIZE, 1), # Map width, and height unless map_height is set
+        'map_height': (int, None, 1),
+        'prey_count': (int, PREY_COUNT, 0),
+        'predator_count': (int, PREDATOR_COUNT, 0),
+        'prey_speed': (float, PREY_SPEED, 0),
+        'predator_speed': (float, PREDATOR_SPEED, 0),
+        'direction_change_interval': (int, DIRECTION_CHANGE_INTERVAL, 1),
+        'seed': (int, None, 0),
+        'ecosystem': (bool, True, None),
+        'idle_chunks': (bool, False, None),
+        'catch_distance': (float, CATCH_DISTANCE, 0),
+        'prey_energy_per_step': (float, ENERGY_PER_STEP[PREY_TYPE], None),
+        'predator_energy_per_step': (float, ENERGY_PER_STEP[PREDATOR_TYPE], None),
+        'reproduction_energy': (float, REPRODUCTION_ENERGY, 0),
+        'max_population': (int, MAX_POPULATION, 0),
+        'pool_capacity': (int, AGENT_POOL_CAPACITY, 1), # Initial agent slots
+        'screen_height': (int, SCREEN_HEIGHT, 1),
+        'content_width': (int, SIM_CONTENT_WIDTH, 1),
+        'area_padding': (int, SIM_AREA_PADDING, 0),
+        'panel_width': (int, METADATA_PANEL_WIDTH, 1),
+        'fps': (int, FPS, 1),
+        'max_zoom_level': (float, MAX_ZOOM_LEVEL, 0),
+    }
+    # Values computed from the fields
+    DERIVED = ('map_width', 'half_width', 'energy_per_step', 'half_height', 'content_height', 'half_content_width', 'half_content_height',
+               'total_display_width', 'screen_width', 'min_zoom_level', 'frame_time')
+    __slots__ = tuple(FIELDS) + DERIVED
+
+    def __init__(self, **values):
+        unknown = set(values) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown config fields: {', '.join(sorted(unknown))}")
+        for name, (kind, default, minimum) in self.FIELDS.items():
+            object.__setattr__(self, name, self.check(name, values.get(name, default), kind, default, minimum))
+
+        content_height = self.screen_height - 2 * self.area_padding
+        if content_height < 1:
+            raise ValueError("screen_height leaves no room for the simulation area inside its padding")
+        total_display_width = self.content_width + 2 * self.area_padding
+        map_width = self.map_size
+        map_height = self.map_height if self.map_height is not None else map_width
+        derived = {
+            'map_width': map_width,
+            'half_width': map_width / 2,
+            'half_height': map_height / 2,
+            'energy_per_step': (self.prey_energy_per_step, self.predator_energy_per_step), # By agent type
+            'content_height': content_height,
+            'half_content_width': self.content_width / 2,
+            'half_content_height': content_height / 2,
+            'total_display_width': total_display_width,
+            'screen_width': total_display_width + self.panel_width,
+            # Fully zoomed out, the whole map fits the simulation area
+            'min_zoom_level': min(self.content_width / map_width, content_height / map_height, self.max_zoom_level),
+            'frame_time': 1 / self.fps,
+        }
+        for name, value in derived.items():
+            object.__setattr__(self, name, value)
+
+    @staticmethod
+    def check(name, value, kind, default, minimum):
+        """
+        Returns the value converted to the field's type, or raises ValueError.
+        """
+        if value is None and default is None:
+            return None
+        if kind is bool:
+            if not isinstance(value, bool):
+                raise ValueError(f"{name} must be true or false, not {value!r}")
+            return value
+        # Booleans are ints to Python, but never a valid count or size
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and value != int(value)):
+            raise ValueError(f"{name} must be {'an integer' if kind is int else 'a number'}, not {value!r}")
+        value = kind(value)
+        if minimum is not None and value < minimum:
+            raise ValueError(f"{name} must be at least {minimum}, not {value!r}")
+        return value
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Config is read-only; use replace() to change values")
+
+    def __repr__(self):
+        return f"Config({', '.join(f'{name}={getattr(self, name)!r}' for name in self.FIELDS)})"
+
+    def as_dict(self):
+        """
+        Returns the settable fields as a dictionary.
+        """
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def replace(self, **changes):
+        """
+        Returns a copy of the config with the given fields changed.
+        """
+        return Config(**{**self.as_dict(), **changes})
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a config from a JSON file holding an object of field values;
+        fields it leaves out keep their defaults.
+        """
+        with open(path) as file:
+            values = json.load(file)
+        if not isinstance(values, dict):
+            raise ValueError(f"{path} must hold a JSON object of config fields")
+        return cls(**values)
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.as_dict(), file, indent=4)
+
+def config_from_args(args):
+    """
+    Builds the config of a run from parsed command line arguments: the --config
+    file (or the defaults), overridden by every field flag that was given.
+    Field flags must store into a destination named after their field, with a
+    default of None.
+    """
+    config = Config.load(args.config) if args.config else Config()
+    overrides = {name: getattr(args, name) for name in Config.FIELDS if getattr(args, name, None) is not None}
+    return config.replace(**overrides)
@@ -6,6 +6,91 @@ AGENT_RADIUS = 0.5
 PREY_SPEED = 0.05
 PREDATOR_SPEED = 0.07
 DIRECTION_CHANGE_INTERVAL = 60
+GRID_CELL_SIZE = 16 # World units per spatial index cell (also the grid overlay spacing)
+SPATIAL_DENSE_CELLS_PER_AGENT = 4 # Spatial indexes with more cells than this per agent only keep track of occupied cells
+
+# --- Chunk Constants ---
+CHUNK_SIZE = 64 # World units per region chunk
+CHUNK_IDLE_INTERVAL = 8 # Steps between catch-ups of idle chunks' agents (and chunk reviews)
+
+# --- Brain Constants ---
+SENSE_RADIUS = 16 # Distance within which agents sense each other
+SENSE_MIN_CELL_SIZE = 1 # Smallest cell size of the per-type spatial indexes used for sensing
+BRAIN_HIDDEN_SIZES = (16,)
+BRAIN_OUTPUT_SIZE = 1 # Turn, scaled by MAX_TURN_RATE
+BRAIN_SHARED_ROW_AGENTS = 32 # Agents per brain row, on average, from which each row's agents think together
+MAX_TURN_RATE = 0.2 # Radians per step
+
+# --- Ecosystem Constants ---
+AGENT_POOL_CAPACITY = 1024 # Initial agent slots; the pool doubles whenever it fills up
+POOL_COMPACT_FRACTION = 0.25 # Living agents are packed together when fewer than this fraction of used slots hold one
+MAX_POPULATION = 1000000 # Births are suppressed beyond this many living agents
+CATCH_DISTANCE = 2 * AGENT_RADIUS # A predator catches a prey when their bodies touch
+HUNT_BRUTE_FORCE_PAIRS = 4096 # Below this many predator-prey pairs, hunting measures every pair instead of indexing the prey
+ENERGY_PER_STEP = (0.1, -0.05) # Energy change per step, by agent type: prey graze, predators starve
+CATCH_ENERGY = 30 # Energy a predator gains per prey caught
+REPRODUCTION_ENERGY = 100 # Agents at this energy split it with a newborn
+BRAIN_MUTATION_SCALE = 0.02 # Standard deviation of the noise added to a newborn's inherited weights
+
+# --- Metrics Constants ---
+METRICS_INTERVAL = 10 # Steps between metric samples
+METRICS_HISTORY = 1024 # Samples kept in memory for the panel's sparkline
+METRICS_CHUNK_ROWS = 4096 # Samples per block of a metrics file
+
+# --- Profiler Constants ---
+PROFILER_WINDOW = 1024 # Latest samples per phase behind the rolling percentiles
+PROFILER_BINS = 96 # Log-scale histogram bins per phase
+PROFILER_MIN_TIME = 1e-6 # Upper edge of the first bin (seconds)
+PROFILER_BIN_RATIO = 1.2 # Each bin is this much wider than the previous one (about 1 us to 30 s overall)
+PROFILER_FONT_SIZE = 16
+PROFILER_LINE_HEIGHT = 16
+PROFILER_REFRESH_INTERVAL = 0.25 # Seconds between overlay refreshes, so the numbers stay readable
+PROFILER_CPROFILE_ENTRIES = 25 # Busiest functions listed by a headless cProfile run
+
+# --- Evolution Constants ---
+EVOLUTION_POPULATION = 64 # Genomes per species
+EVOLUTION_GROUP_SIZE = 8 # Genomes per species sharing one episode
+EVOLUTION_ROUNDS = 2 # Episodes each genome plays per generation
+EVOLUTION_EPISODE_STEPS = 2000
+EVOLUTION_ELITE = 4 # Best genomes carried over unchanged
+EVOLUTION_TOURNAMENT_SIZE = 3
+EVOLUTION_CROSSOVER_RATE = 0.5 # Fraction of children bred from two parents rather than one
+EVOLUTION_MUTATION_SCALE = 0.05 # Standard deviation of the noise added to every child's genome
+CATCH_FITNESS = 100 # Fitness of a catch, in steps survived
+
+# --- Vision Constants ---
+VISION_RAYS = 8
+VISION_FIELD_OF_VIEW = 2.0944 # Radians (120 degrees), centered on the facing angle
+VISION_RANGE = 16
+VISION_CELLS_PER_RANGE = 2 # Spatial index cells across the vision range; smaller cells cull more of what's out of view
+
+# --- Agent Type Codes ---
+# Agent types are stored as small integers in the columnar agent store
+PREY_TYPE = 0
+PREDATOR_TYPE = 1
+AGENT_TYPE_NAMES = ('prey', 'predator')
+
+# --- Recording Constants ---
+RECORDING_CHUNK_STEPS = 256 # Maximum frames per recording chunk
+RECORDING_CHUNK_BYTES = 16 * 1024 * 1024 # Frames are flushed once a chunk grows past this size
+REPLAY_SEEK_STEPS = 100 # Steps skipped by Shift+Left/Right in replay mode
+
+# --- Checkpoint Constants ---
+CHECKPOINT_INTERVAL = 10000 # Steps between periodic checkpoints
+
+# --- Streaming Constants ---
+STREAM_HOST = '127.0.0.1' # Only local clients by default
+STREAM_PORT = 8765
+STREAM_FPS = 20 # Snapshots handed to the stream server per second, at most
+STREAM_MAX_AGENTS = 20000 # Agents per frame sent to a client; busier viewports are sampled down
+STREAM_KEYFRAME_INTERVAL = 100 # Frames between keyframes sent to each client
+STREAM_COMPRESS_BYTES = 1024 # Frames larger than this are zlib-compressed
+STREAM_COMPRESSION_LEVEL = 1
+
+# --- Partition Constants ---
+PARTITION_REBALANCE_INTERVAL = 50 # Steps between moves of the strip boundaries to even out the workers' loads
+PARTITION_BALANCE_SAMPLE = 65536 # Agents sampled to place the strip boundaries
+PARTITION_HALO_SLACK = 1.0 # Extra world units of halo, so rounding never drops an agent right at its edge
 
 # --- Pygame Display Constants ---
 SIM_CONTENT_WIDTH = 568
@@ -26,12 +111,44 @@ GOLD = (255, 215, 0)
 BACKGROUND_COLOR = (50, 50, 150)
 BUTTON_COLOR = (70, 70, 180)
 BUTTON_HOVER_COLOR = (90, 90, 200)
+AGENT_TYPE_COLORS = (GREEN, RED) # Indexed by agent type code
 
 # --- Camera & Movement Constants ---
 ZOOM_FACTOR = 1.1
 MIN_ZOOM_LEVEL = 2.21875
 MAX_ZOOM_LEVEL = 30.0
 
+# --- Rendering Constants ---
+DENSITY_MODE_MAX_RADIUS = 1 # At or below this screen radius, agents are drawn as a density map
+DENSITY_SATURATION = 8 # Agents per pixel at which the density map reaches full brightness
+LOD_ZOOM_LEVEL = MIN_ZOOM_LEVEL # Below this zoom, the view shows per-chunk densities instead of agents
+
+# --- Text Constants ---
+PANEL_FONT_SIZE = 20
+AGENT_ID_FONT_SIZE = 16
+TEXT_CACHE_SIZE = 256 # Maximum number of rendered text surfaces kept in the cache
+
+# --- Metadata Panel Layout ---
+PANEL_PADDING = 16 # Padding above the panel's text
+PANEL_LINE_HEIGHT = 20
+PANEL_SELECTION_LINE = 9 # Line where the selected agent's info starts
+PANEL_TEXT_LINES = 15 # Lines of live text above the population sparkline
+SPARKLINE_HEIGHT = 60 # Height of the panel's population-over-time sparkline
+
 # --- Speed Control Constants ---
-SPEED_MULTIPLIERS = [0, 0.5, 1, 5, 10]
-INITIAL_SPEED_INDEX = 2
\ No newline at end of file
+MAX_SPEED = 'max' # Speed setting that steps as fast as possible
+SPEED_MULTIPLIERS = [0, 0.5, 1, 5, 10, MAX_SPEED]
+INITIAL_SPEED_INDEX = 2
+MAX_SKIPPED_FRAMES = 5 # Frames that may go unrendered in a row while stepping catches up
+
+# --- Benchmark Constants ---
+BENCHMARK_AGENT_COUNTS = (100, 1000, 10000, 100000, 1000000)
+BENCHMARK_ZOOM_LEVELS = (MIN_ZOOM_LEVEL, 6.0, MAX_ZOOM_LEVEL)
+BENCHMARK_SEED = 0
+BENCHMARK_WARMUP = 2 # Untimed calls before each case
+BENCHMARK_MIN_TIME = 1.0 # Seconds each case runs for, at least
+BENCHMARK_MIN_REPEATS = 5
+BENCHMARK_MAX_REPEATS = 1000
+BENCHMARK_QUERY_RADIUS = 16 # Radius of the benchmarked radius queries
+BENCHMARK_QUERY_K = 8 # Neighbours of the benchmarked k-nearest queries
+BENCHMARK_REGRESSION_THRESHOLD = 0.1 # A case this much slower than its baseline is flagged
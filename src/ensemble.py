@@ -0,0 +1,112 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from multiprocessing import Pool
+import numpy as np
+from constants import *
+from world import World
+
+# World parameters that can be swept, with the CLI flag for each
+SWEEP_PARAMETERS = {
+    'prey_count': '--prey',
+    'predator_count': '--predators',
+    'prey_speed': '--prey-speed',
+    'predator_speed': '--predator-speed',
+    'direction_change_interval': '--direction-change-interval',
+    'map_size': '--map-size',
+}
+
+def expand_grid(grid):
+    """
+    Expands a parameter grid (parameter name -> list of values) into a list of
+    parameter dictionaries, one per combination.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def make_tasks(grid, runs_per_combination, steps, base_seed=None):
+    """
+    Builds one task per (parameter combination, repetition).
+    Every task gets its own independent seed spawned from the base seed, so runs
+    are reproducible and no two workers share a random stream.
+    """
+    combinations = expand_grid(grid)
+    seed_sequences = np.random.SeedSequence(base_seed).spawn(len(combinations) * runs_per_combination)
+    tasks = []
+    for run_id, (params, seed_sequence) in enumerate(zip(
+            (params for params in combinations for _ in range(runs_per_combination)), seed_sequences)):
+        seed = int(seed_sequence.generate_state(1, np.uint64)[0])
+        tasks.append((run_id, params, seed, steps))
+    return tasks
+
+def run_task(task):
+    """
+    Runs one headless simulation and returns its summary row.
+    Executed inside a worker process.
+    """
+    run_id, params, seed, steps = task
+    world = World(seed=seed, **params)
+
+    start_time = time.perf_counter()
+    for _ in range(steps):
+        world.update()
+    elapsed = time.perf_counter() - start_time
+
+    row = {'run_id': run_id, 'seed': seed}
+    row.update(params)
+    row.update(world.summary())
+    row['elapsed'] = elapsed
+    row['steps_per_second'] = steps / elapsed if elapsed > 0 else float('inf')
+    return row
+
+def run_ensemble(tasks, output, workers=None):
+    """
+    Runs every task across a process pool sized to the machine's cores and
+    streams each run's summary into one CSV results table as soon as it finishes.
+    Returns the number of completed runs.
+    """
+    workers = workers or os.cpu_count() or 1
+    writer = None
+    completed = 0
+    start_time = time.perf_counter()
+    with Pool(processes=workers) as pool:
+        for row in pool.imap_unordered(run_task, tasks, chunksize=1):
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+            output.flush()
+            completed += 1
+    elapsed = time.perf_counter() - start_time
+
+    print(f"Completed {completed} runs on {workers} workers in {elapsed:.1f}s", file=sys.stderr)
+    return completed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run an ensemble of headless simulations over a parameter grid")
+    parser.add_argument("--prey", type=int, nargs='+', default=[PREY_COUNT], help="prey counts to sweep")
+    parser.add_argument("--predators", type=int, nargs='+', default=[PREDATOR_COUNT], help="predator counts to sweep")
+    parser.add_argument("--prey-speed", type=float, nargs='+', default=[PREY_SPEED], help="prey speeds to sweep")
+    parser.add_argument("--predator-speed", type=float, nargs='+', default=[PREDATOR_SPEED], help="predator speeds to sweep")
+    parser.add_argument("--direction-change-interval", type=int, nargs='+', default=[DIRECTION_CHANGE_INTERVAL], help="direction change intervals to sweep")
+    parser.add_argument("--map-size", type=int, nargs='+', default=[MAP_SIZE], help="map sizes to sweep")
+    parser.add_argument("--runs", type=int, default=1, help="runs (seeds) per parameter combination")
+    parser.add_argument("--steps", type=int, default=10000, help="steps per run")
+    parser.add_argument("--seed", type=int, default=None, help="base seed the per-run seeds are spawned from")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--output", default=None, help="CSV file for the results table (default: stdout)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    grid = {name: getattr(args, flag.lstrip('-').replace('-', '_')) for name, flag in SWEEP_PARAMETERS.items()}
+    tasks = make_tasks(grid, args.runs, args.steps, args.seed)
+
+    if args.output:
+        with open(args.output, 'w', newline='') as output:
+            run_ensemble(tasks, output, args.workers)
+    else:
+        run_ensemble(tasks, sys.stdout, args.workers)
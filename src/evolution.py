@@ -0,0 +1,235 @@
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from constants import *
+from world import World
+from brain import Brain
+from sensors import SENSORS
+
+# Genomes of the current generation, as seen by a worker process
+# (attached to the shared memory block once, when the worker starts)
+_worker_memory = None
+_worker_genomes = None
+
+def _attach_genomes(name, shape):
+    """
+    Pool initializer: maps the generation's genomes from shared memory into the worker.
+    """
+    global _worker_memory, _worker_genomes
+    _worker_memory = SharedMemory(name=name)
+    _worker_genomes = np.ndarray(shape, dtype=np.float32, buffer=_worker_memory.buf)
+
+def run_episode(task):
+    """
+    Runs one headless episode for a group of genomes of each species and returns
+    the fitness of every genome in the groups.
+    The species' agents are dealt out evenly among its group's genomes, and
+    births and compaction are off, so every agent keeps its genome and its slot
+    for the whole episode. An
+    agent's fitness is the number of steps it survived plus CATCH_FITNESS per prey
+    it caught; a genome's fitness is the mean over its agents.
+    Executed inside a worker process: only genome indices travel with the task,
+    the weights are read from shared memory.
+    """
+    groups, seed, params = task
+    world = World(params['prey_count'], params['predator_count'], params['map_size'], seed)
+    world.reproduction = False
+    world.compaction = False # Fitness is tallied by slot
+    world.attach_brains(params['hidden_sizes'], sensor=params['sensor'])
+
+    agents = world.agents
+    genome_rows = {}
+    for agent_type, group in groups.items():
+        brain = world.brains[agent_type]
+        brain.load_genomes(_worker_genomes[agent_type, group])
+        members = np.flatnonzero(agents.alive & (agents.type == agent_type))
+        agents.brain_row[members] = brain.deal(members.size)
+        genome_rows[agent_type] = (members, agents.brain_row[members].copy())
+
+    survival = np.zeros(len(agents), dtype=np.int64)
+    for _ in range(params['steps']):
+        world.update()
+        survival += agents.alive
+
+    results = {}
+    for agent_type, group in groups.items():
+        members, rows = genome_rows[agent_type]
+        fitness = survival[members] + CATCH_FITNESS * agents.catches[members]
+        totals = np.bincount(rows, weights=fitness, minlength=len(group))
+        counts = np.bincount(rows, minlength=len(group))
+        results[agent_type] = (group, totals / np.maximum(counts, 1))
+    return results
+
+class Evolution:
+    """
+    Genetic algorithm evolving the brains of both species at once.
+    Each generation, every genome is evaluated in a few headless episodes (with
+    random groupings of genomes), then the next generation is bred from the best:
+    the elite are kept as they are, the rest are uniform crossovers of
+    tournament-selected parents with Gaussian mutation.
+    The genomes live in one shared memory block read by a persistent worker pool,
+    so tasks carry only genome indices and seeds, never weights.
+    """
+
+    def __init__(self, params, population=EVOLUTION_POPULATION, seed=None, workers=None):
+        self.params = params
+        self.population = population
+        self.rng = np.random.default_rng(seed)
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.workers = workers or os.cpu_count() or 1
+        self.layer_sizes = (SENSORS[params['sensor']](params['map_size']).input_size,
+                            *params['hidden_sizes'], BRAIN_OUTPUT_SIZE)
+        self.species = (PREY_TYPE, PREDATOR_TYPE)
+
+        # One genome per row, per species
+        shape = (len(self.species), population, Brain.genome_length(self.layer_sizes))
+        self.memory = SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(np.float32).itemsize)
+        self.genomes = np.ndarray(shape, dtype=np.float32, buffer=self.memory.buf)
+        for agent_type in self.species:
+            brain = Brain(self.layer_sizes, population, self.rng)
+            self.genomes[agent_type] = brain.genomes(np.arange(population))
+        self.pool = Pool(self.workers, initializer=_attach_genomes, initargs=(self.memory.name, shape))
+
+        self.generation = 0
+        self.episodes = 0 # Episodes run so far, across all generations
+        self.elapsed = 0.0
+
+    def make_tasks(self):
+        """
+        Shuffles each species' genomes into groups, once per evaluation round,
+        and pairs up the groups of both species into episodes with fresh seeds.
+        """
+        group_size = self.params['group_size']
+        tasks = []
+        for _ in range(self.params['rounds']):
+            shuffled = {agent_type: self.rng.permutation(self.population) for agent_type in self.species}
+            for start in range(0, self.population, group_size):
+                groups = {agent_type: order[start:start + group_size] for agent_type, order in shuffled.items()}
+                seed = int(self.seed_sequence.spawn(1)[0].generate_state(1, np.uint64)[0])
+                tasks.append((groups, seed, self.params))
+        return tasks
+
+    def evaluate(self):
+        """
+        Runs the generation's episodes across the worker pool and returns each
+        species' genome fitness, averaged over the episodes each genome played in.
+        """
+        totals = np.zeros((len(self.species), self.population))
+        counts = np.zeros((len(self.species), self.population))
+        tasks = self.make_tasks()
+        for results in self.pool.imap_unordered(run_episode, tasks, chunksize=1):
+            for agent_type, (group, fitness) in results.items():
+                totals[agent_type, group] += fitness
+                counts[agent_type, group] += 1
+        self.episodes += len(tasks)
+        return totals / np.maximum(counts, 1)
+
+    def tournament(self, fitness, n):
+        """
+        Picks n parents, each the fittest of EVOLUTION_TOURNAMENT_SIZE random genomes.
+        """
+        entrants = self.rng.integers(0, self.population, (n, EVOLUTION_TOURNAMENT_SIZE))
+        return entrants[np.arange(n), np.argmax(fitness[entrants], axis=1)]
+
+    def breed(self, genomes, fitness):
+        """
+        Returns the next generation of one species' genomes.
+        """
+        elite_count = min(EVOLUTION_ELITE, self.population)
+        elite = np.argsort(fitness)[::-1][:elite_count]
+        n = self.population - elite_count
+
+        mothers = genomes[self.tournament(fitness, n)]
+        fathers = genomes[self.tournament(fitness, n)]
+        # Uniform crossover for some children, a mutated copy of the mother for the rest
+        crossed = self.rng.random(n) < EVOLUTION_CROSSOVER_RATE
+        from_father = (self.rng.random(mothers.shape) < 0.5) & crossed[:, None]
+        children = np.where(from_father, fathers, mothers)
+        children += self.rng.normal(0, EVOLUTION_MUTATION_SCALE, children.shape)
+        return np.concatenate((genomes[elite], children))
+
+    def step(self):
+        """
+        Evaluates the current generation and replaces it with the next.
+        Returns the generation's fitness per species.
+        """
+        start_time = time.perf_counter()
+        fitness = self.evaluate()
+        for agent_type in self.species:
+            self.genomes[agent_type] = self.breed(self.genomes[agent_type].copy(), fitness[agent_type])
+        self.generation += 1
+        self.elapsed += time.perf_counter() - start_time
+        return fitness
+
+    def save(self, path):
+        """
+        Saves the current generation's genomes, with the brain architecture and
+        sensor needed to load them into a world.
+        """
+        np.savez(path, genomes=self.genomes, layer_sizes=np.array(self.layer_sizes), sensor=np.array(self.params['sensor']))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.memory.close()
+        self.memory.unlink()
+
+def load_genomes(world, path):
+    """
+    Gives the world's agents brains from a saved generation, dealing each species'
+    genomes out evenly among its agents.
+    """
+    with np.load(path) as archive:
+        genomes = archive['genomes']
+        layer_sizes = tuple(int(size) for size in archive['layer_sizes'])
+        sensor = str(archive['sensor'])
+    world.attach_brains(layer_sizes[1:-1], sensor=sensor)
+    for agent_type, brain in world.brains.items():
+        brain.load_genomes(genomes[agent_type])
+        members = np.flatnonzero(world.agents.alive & (world.agents.type == agent_type))
+        world.agents.brain_row[members] = brain.deal(members.size)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evolve the agents' brains with a genetic algorithm")
+    parser.add_argument("--generations", type=int, default=100, help="generations to evolve")
+    parser.add_argument("--population", type=int, default=EVOLUTION_POPULATION, help="genomes per species")
+    parser.add_argument("--group-size", type=int, default=EVOLUTION_GROUP_SIZE, help="genomes per species sharing one episode")
+    parser.add_argument("--rounds", type=int, default=EVOLUTION_ROUNDS, help="episodes each genome plays per generation")
+    parser.add_argument("--steps", type=int, default=EVOLUTION_EPISODE_STEPS, help="steps per episode")
+    parser.add_argument("--prey", type=int, default=PREY_COUNT, help="prey per episode")
+    parser.add_argument("--predators", type=int, default=PREDATOR_COUNT, help="predators per episode")
+    parser.add_argument("--map-size", type=int, default=MAP_SIZE, help="side length of the episodes' map")
+    parser.add_argument("--sensor", choices=sorted(SENSORS), default='nearest', help="what the brains sense")
+    parser.add_argument("--seed", type=int, default=None, help="seed for a reproducible run")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--output", default="genomes.npz", help="file the latest generation is saved to")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    params = {
+        'prey_count': args.prey,
+        'predator_count': args.predators,
+        'map_size': args.map_size,
+        'hidden_sizes': BRAIN_HIDDEN_SIZES,
+        'sensor': args.sensor,
+        'steps': args.steps,
+        'group_size': args.group_size,
+        'rounds': args.rounds,
+    }
+    evolution = Evolution(params, args.population, args.seed, args.workers)
+    try:
+        for _ in range(args.generations):
+            fitness = evolution.step()
+            episodes_per_hour = evolution.episodes / evolution.elapsed * 3600
+            print(f"Generation {evolution.generation}: "
+                  f"prey best {fitness[PREY_TYPE].max():.1f} mean {fitness[PREY_TYPE].mean():.1f}, "
+                  f"predators best {fitness[PREDATOR_TYPE].max():.1f} mean {fitness[PREDATOR_TYPE].mean():.1f} "
+                  f"({episodes_per_hour:.0f} episodes/hour on {evolution.workers} workers)", file=sys.stderr)
+            evolution.save(args.output)
+    finally:
+        evolution.close()
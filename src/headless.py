@@ -0,0 +1,37 @@
+import cProfile
+import pstats
+import time
+from constants import *
+from profiler import Profiler
+
+def run_headless(world, steps, profile=False, cprofile_steps=0):
+    """
+    Advances the world by the given number of steps as fast as possible,
+    without pygame, a display or a frame rate cap.
+    With profile, prints a per-phase timing breakdown of the world's steps at the end.
+    With cprofile_steps, the first that many steps also run under cProfile, and
+    its busiest functions are printed.
+    Returns the achieved steps per second.
+    """
+    profiler = Profiler() if profile else None
+    world.profiler = profiler
+
+    start_time = time.perf_counter()
+    if cprofile_steps:
+        with cProfile.Profile() as function_profile:
+            for _ in range(min(cprofile_steps, steps)):
+                world.update()
+    for _ in range(max(steps - cprofile_steps, 0)):
+        world.update()
+    elapsed = time.perf_counter() - start_time
+
+    steps_per_second = steps / elapsed if elapsed > 0 else float('inf')
+    print(f"Simulated {steps} steps with {world.agents.population} agents "
+          f"(map {world.map_size}, seed {world.seed}) in {elapsed:.3f}s: "
+          f"{steps_per_second:.1f} steps/s")
+    if profiler:
+        print(profiler.report())
+    if cprofile_steps:
+        print(f"cProfile of the first {min(cprofile_steps, steps)} steps:")
+        pstats.Stats(function_profile).sort_stats('tottime').print_stats(PROFILER_CPROFILE_ENTRIES)
+    return steps_per_second
@@ -1,5 +1,129 @@
-from simulation import Simulation
+import argparse
+import sys
+from constants import *
+from world import World
+from config import config_from_args
+from recording import Recorder, Replay
+from checkpoint import Checkpointer, load_checkpoint
+from sensors import SENSORS
+from evolution import load_genomes
+from metrics import Metrics, MetricsFile, MetricsPrinter
+from streaming import StreamServer, StreamClient
+from partition import Partitioner
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Predator-Prey Simulation")
+    parser.add_argument("--headless", action="store_true", help="run without pygame or a display")
+    parser.add_argument("--steps", type=int, default=10000, help="number of steps to run in headless mode")
+    # Run configuration: a JSON file of Config fields, overridden by the flags below
+    parser.add_argument("--config", default=None, help="load the run configuration from this JSON file")
+    parser.add_argument("--prey", dest="prey_count", type=int, default=None, metavar="N", help=f"number of prey agents (default {PREY_COUNT})")
+    parser.add_argument("--predators", dest="predator_count", type=int, default=None, metavar="N", help=f"number of predator agents (default {PREDATOR_COUNT})")
+    parser.add_argument("--map-size", type=int, default=None, help=f"width of the toroidal map, and its height unless --map-height is given (default {MAP_SIZE})")
+    parser.add_argument("--map-height", type=int, default=None, help="height of the toroidal map, for a non-square map")
+    parser.add_argument("--prey-speed", type=float, default=None, help=f"prey speed (default {PREY_SPEED})")
+    parser.add_argument("--predator-speed", type=float, default=None, help=f"predator speed (default {PREDATOR_SPEED})")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for a reproducible run")
+    parser.add_argument("--no-ecosystem", dest="ecosystem", action="store_const", const=False, default=None,
+                        help="agents only move: no predation, energy, births or deaths")
+    parser.add_argument("--idle-chunks", dest="idle_chunks", action="store_const", const=True, default=None,
+                        help="step the agents of quiet map regions less often (see ChunkGrid)")
+    parser.add_argument("--brains", action="store_true", help="steer agents with (randomly initialized) neural networks")
+    parser.add_argument("--genomes", default=None, help="steer agents with brains evolved by evolution.py, loaded from this file")
+    parser.add_argument("--sensor", choices=sorted(SENSORS), default='nearest', help="what the brains sense")
+    parser.add_argument("--record", default=None, help="record the run's agent trajectories to this file")
+    parser.add_argument("--record-interval", type=int, default=1, help="record every n-th step")
+    parser.add_argument("--float16", action="store_true", help="quantize recorded positions and angles to float16")
+    parser.add_argument("--replay", default=None, help="watch a recording instead of simulating")
+    parser.add_argument("--serve", type=int, default=None, metavar="PORT", help="stream live frames to remote viewers on this port")
+    parser.add_argument("--serve-host", default=STREAM_HOST, help="address the stream server listens on")
+    parser.add_argument("--connect", default=None, metavar="HOST:PORT", help="watch a simulation streamed by --serve instead of simulating")
+    parser.add_argument("--workers", type=int, default=None, metavar="N",
+                        help="run the world's neighbour searches on N worker processes, each taking a strip of the map (0 for one per core)")
+    parser.add_argument("--metrics", default=None, help="stream population metrics to this file ('-' for stdout)")
+    parser.add_argument("--metrics-interval", type=int, default=METRICS_INTERVAL, help="steps between metric samples")
+    parser.add_argument("--profile", action="store_true", help="print a per-phase timing breakdown after a headless run")
+    parser.add_argument("--cprofile", type=int, default=0, metavar="N", help="run the first N headless steps under cProfile and print its stats")
+    parser.add_argument("--checkpoint", default=None, help="periodically save checkpoints of the world to this file")
+    parser.add_argument("--checkpoint-interval", type=int, default=CHECKPOINT_INTERVAL, help="steps between checkpoints")
+    parser.add_argument("--resume", default=None, help="restore the world from this checkpoint instead of starting fresh")
+    parser.add_argument("--fork-seed", type=int, default=None, help="reseed a resumed world to fork a variant of the run")
+    args = parser.parse_args()
+    if args.replay and args.headless:
+        parser.error("--replay needs the interactive viewer")
+    if args.connect and args.headless:
+        parser.error("--connect needs the interactive viewer")
+    if args.serve is not None and (args.replay or args.connect):
+        parser.error("--serve streams a running simulation, not a replay or another stream")
+    if args.workers is not None and args.workers < 0:
+        parser.error("--workers must be 0 or more")
+    if args.workers is not None and (args.replay or args.connect):
+        parser.error("--workers steps a simulation, not a replay or a stream")
+    try:
+        args.run_config = config_from_args(args)
+    except (OSError, ValueError) as error:
+        parser.error(f"invalid configuration: {error}")
+    return args
 
 if __name__ == "__main__":
-    sim = Simulation()
-    sim.run()
+    args = parse_args()
+    recorder = None
+    checkpointer = None
+    metrics = None
+    streamer = None
+    partitioner = None
+    if args.replay:
+        world = Replay(args.replay)
+    elif args.connect:
+        host, _, port = args.connect.rpartition(':')
+        world = StreamClient(host or STREAM_HOST, int(port))
+    else:
+        if args.resume:
+            world = load_checkpoint(args.resume, args.fork_seed)
+        else:
+            world = World.from_config(args.run_config)
+            if args.genomes:
+                load_genomes(world, args.genomes)
+            elif args.brains:
+                world.attach_brains(sensor=args.sensor)
+        if args.workers is not None:
+            partitioner = Partitioner(world, args.workers)
+        if args.checkpoint:
+            checkpointer = Checkpointer(args.checkpoint, args.checkpoint_interval)
+            world.checkpointer = checkpointer
+        if args.metrics:
+            stream = MetricsPrinter(sys.stdout) if args.metrics == '-' else MetricsFile(args.metrics)
+            metrics = Metrics(args.metrics_interval, stream=stream)
+            world.metrics = metrics
+        if args.record:
+            recorder = Recorder(args.record, world, args.float16, args.record_interval)
+            world.recorder = recorder
+        if args.serve is not None:
+            streamer = StreamServer(args.serve_host, args.serve)
+            try:
+                streamer.start(world)
+            except OSError as error:
+                sys.exit(f"Can't stream on {args.serve_host}:{args.serve}: {error}")
+            world.streamer = streamer
+            print(f"Streaming on {args.serve_host}:{streamer.port}", file=sys.stderr)
+
+    if args.headless:
+        from headless import run_headless
+        run_headless(world, args.steps, args.profile, args.cprofile)
+    else:
+        # pygame is only imported when the interactive viewer is requested
+        from simulation import Simulation
+        sim = Simulation(world, args.run_config)
+        sim.run()
+
+    if streamer:
+        streamer.close()
+    if recorder:
+        recorder.close()
+    if metrics:
+        metrics.close()
+    if checkpointer:
+        checkpointer.checkpoint(world) # Save the final state too
+        checkpointer.wait()
+    if partitioner:
+        partitioner.close()
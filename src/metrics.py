@@ -0,0 +1,174 @@
+import struct
+import numpy as np
+from constants import *
+
+# --- Metrics File Format ---
+# All values are little-endian.
+#
+#   file header   magic, version, column count
+#   column table  per column: name (16 bytes, NUL-padded) and type code ('q' int64, 'd' float64)
+#   block*        row count, then each column's values for those rows, one column after another
+#
+# Blocks are written every METRICS_CHUNK_ROWS samples and when the stream is closed,
+# so each column of a block can be read as one contiguous array.
+METRICS_MAGIC = b'PPSIMMET'
+METRICS_VERSION = 1
+METRICS_HEADER = struct.Struct('<8sII')
+METRICS_COLUMN = struct.Struct('<16sc7x')
+METRICS_BLOCK = struct.Struct('<Q')
+
+# Sampled metrics, with their type codes
+METRIC_COLUMNS = (
+    ('step', 'q'),
+    ('population', 'q'),
+    ('prey', 'q'),
+    ('predators', 'q'),
+    ('births', 'q'),      # Agents added since the start, including the initial population
+    ('deaths', 'q'),      # Agents removed since the start
+    ('catches', 'q'),     # Prey caught since the start
+    ('density', 'd'),     # Living agents per square world unit
+    ('mean_speed', 'd'),
+    ('catch_rate', 'd'),  # Prey caught per step since the previous sample
+)
+METRIC_DTYPE = np.dtype([(name, '<' + {'q': 'i8', 'd': 'f8'}[code]) for name, code in METRIC_COLUMNS])
+
+class Metrics:
+    """
+    Samples population statistics at a fixed step interval.
+    Every value is read from counters the agent store and world keep up to date
+    as agents are born and die, so a sample costs the same whatever the population.
+    The latest samples are kept in a fixed-size ring buffer (for the viewer's
+    sparkline), and every sample can also be streamed to a MetricsFile or MetricsPrinter.
+    """
+
+    def __init__(self, interval=METRICS_INTERVAL, history=METRICS_HISTORY, stream=None):
+        self.interval = interval # Steps between samples
+        self.history = np.zeros(history, dtype=METRIC_DTYPE) # Ring buffer of the latest samples
+        self.samples = 0 # Samples taken so far
+        self.stream = stream
+        self.last_step = None
+        self.last_catches = 0
+
+    def after_step(self, world):
+        """
+        Takes a sample if one is due at the world's current step.
+        """
+        if world.step_count % self.interval == 0:
+            self.sample(world)
+
+    def sample(self, world):
+        """
+        Records the world's current statistics.
+        """
+        agents = world.agents
+        population = agents.population
+        steps = world.step_count - self.last_step if self.last_step is not None else 0
+        catch_rate = (world.catch_count - self.last_catches) / steps if steps else 0.0
+        self.last_step = world.step_count
+        self.last_catches = world.catch_count
+
+        position = self.samples % len(self.history)
+        self.history[position] = (
+            world.step_count,
+            population,
+            agents.count_type(PREY_TYPE),
+            agents.count_type(PREDATOR_TYPE),
+            agents.births,
+            agents.deaths,
+            world.catch_count,
+            population / (world.map_width * world.map_height),
+            agents.speed_total / population if population else 0.0,
+            catch_rate,
+        )
+        self.samples += 1
+        if self.stream:
+            self.stream.write(self.history[position])
+
+    def series(self, name):
+        """
+        Returns the buffered values of one metric, oldest first.
+        """
+        if self.samples <= len(self.history):
+            return self.history[name][:self.samples]
+        return np.roll(self.history[name], -(self.samples % len(self.history)))
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+
+class MetricsFile:
+    """
+    Streams samples to a compact columnar binary file, a block of rows at a time.
+    """
+
+    def __init__(self, path, chunk_rows=METRICS_CHUNK_ROWS):
+        self.file = open(path, 'wb')
+        self.file.write(METRICS_HEADER.pack(METRICS_MAGIC, METRICS_VERSION, len(METRIC_COLUMNS)))
+        for name, code in METRIC_COLUMNS:
+            self.file.write(METRICS_COLUMN.pack(name.encode(), code.encode()))
+        self.rows = np.zeros(chunk_rows, dtype=METRIC_DTYPE) # Rows of the block being buffered
+        self.buffered = 0
+
+    def write(self, row):
+        self.rows[self.buffered] = row
+        self.buffered += 1
+        if self.buffered == len(self.rows):
+            self.flush_block()
+
+    def flush_block(self):
+        """
+        Writes the buffered rows as one block, column by column.
+        """
+        if not self.buffered:
+            return
+        self.file.write(METRICS_BLOCK.pack(self.buffered))
+        for name, _ in METRIC_COLUMNS:
+            self.file.write(np.ascontiguousarray(self.rows[name][:self.buffered]).tobytes())
+        self.buffered = 0
+
+    def close(self):
+        self.flush_block()
+        self.file.close()
+
+class MetricsPrinter:
+    """
+    Streams samples as tab-separated lines, with a header line first.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.output.write('\t'.join(name for name, _ in METRIC_COLUMNS) + '\n')
+
+    def write(self, row):
+        self.output.write('\t'.join(f"{value:.6g}" if code == 'd' else str(value)
+                                    for value, (_, code) in zip(row.tolist(), METRIC_COLUMNS)) + '\n')
+
+    def close(self):
+        self.output.flush()
+
+def read_metrics(path):
+    """
+    Reads a metrics file written by MetricsFile.
+    Returns a dictionary with one array per metric.
+    """
+    data = np.fromfile(path, dtype=np.uint8)
+    magic, version, column_count = METRICS_HEADER.unpack_from(data, 0)
+    if magic != METRICS_MAGIC or version != METRICS_VERSION:
+        raise ValueError(f"{path} is not a version {METRICS_VERSION} metrics file")
+
+    offset = METRICS_HEADER.size
+    columns = []
+    for _ in range(column_count):
+        name, code = METRICS_COLUMN.unpack_from(data, offset)
+        columns.append((name.rstrip(b'\0').decode(), np.dtype('<' + {b'q': 'i8', b'd': 'f8'}[code])))
+        offset += METRICS_COLUMN.size
+
+    blocks = {name: [] for name, _ in columns}
+    while offset + METRICS_BLOCK.size <= len(data):
+        (rows,) = METRICS_BLOCK.unpack_from(data, offset)
+        offset += METRICS_BLOCK.size
+        for name, dtype in columns:
+            blocks[name].append(np.frombuffer(data, dtype=dtype, count=rows, offset=offset))
+            offset += rows * dtype.itemsize
+    return {name: np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+            for (name, dtype), arrays in zip(columns, blocks.values())}
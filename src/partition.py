@@ -0,0 +1,316 @@
+import os
+import time
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from constants import *
+from agent_store import AgentStore
+from spatial import SpatialHash
+from sensors import SENSORS
+
+# Store columns the workers read
+STRIP_COLUMNS = ('x', 'y', 'angle', 'type', 'alive')
+
+# Shared memory blocks attached by a worker process, by block name, and the
+# sensor and prey index it reuses from one task to the next
+_worker_blocks = {}
+_worker_sensor = None
+_worker_prey_index = None
+
+def create_block(shape, dtype):
+    """
+    Returns (block, array): a new shared memory block, and a zeroed array of the
+    given shape and dtype over it.
+    """
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    block = SharedMemory(create=True, size=max(size, 1))
+    array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    array[...] = 0
+    return block, array
+
+def release_blocks(blocks):
+    """
+    Unlinks the given shared memory blocks, and unmaps those no array points into
+    anymore. Returns the blocks that are still mapped, to try again later.
+    """
+    mapped = []
+    for block in blocks:
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass # Unlinked on an earlier try
+        try:
+            block.close()
+        except BufferError:
+            mapped.append(block) # Some array still reads it
+    return mapped
+
+def strip_members(y, alive, height, boundaries, strip, halo):
+    """
+    Returns (owned, present): the living agents in the given horizontal strip
+    of the map, and the living agents within halo of it (owned ones included).
+    Strips span boundaries[strip] to boundaries[strip + 1], measured from the
+    top edge of the map, and wrap around it like the map does.
+    """
+    position = np.mod(y + height / 2, height)
+    owned = alive & (np.searchsorted(boundaries[1:-1], position, side='right') == strip)
+    low, high = boundaries[strip], boundaries[strip + 1]
+    offset = np.mod(position - low, height)
+    present = owned | (alive & ((offset < high - low + halo) | (offset > height - halo)))
+    return owned, present
+
+class StripAgents:
+    """
+    The agents in and around one strip, as a stand-in for the AgentStore the
+    sensors read. Agents keep the relative order of their slots, so searches
+    break ties the way they would over the whole store, and the population
+    counts are the whole world's, so indexes are sized the same way too.
+    """
+
+    def __init__(self, columns, type_counts):
+        for name, column in columns.items():
+            setattr(self, name, column)
+        self.type_counts = type_counts
+
+    def __len__(self):
+        return len(self.x)
+
+    def count_type(self, agent_type):
+        return int(self.type_counts[agent_type])
+
+def _attach(blocks):
+    """
+    Maps the shared arrays described by blocks (name -> (block name, dtype, shape))
+    into the worker. Blocks the coordinator has since retired are unmapped.
+    """
+    names = {block for block, _, _ in blocks.values()}
+    for name in list(_worker_blocks):
+        if name not in names:
+            _worker_blocks.pop(name).close()
+    arrays = {}
+    for name, (block, dtype, shape) in blocks.items():
+        if block not in _worker_blocks:
+            _worker_blocks[block] = SharedMemory(name=block)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=_worker_blocks[block].buf)
+    return arrays
+
+def run_strip(task):
+    """
+    Runs the searches of one phase of a step ('sense' or 'hunt') for the agents
+    of one strip, and writes their results into the shared output arrays.
+    Only the strip's agents and its halo (the agents of the neighbouring strips
+    close enough to be found) are indexed, so the cost follows the strip's size.
+    Executed inside a worker process: only the shared blocks' names travel with
+    the task, the agents are read from shared memory. Returns the CPU time the
+    task took, in seconds.
+    """
+    global _worker_sensor, _worker_prey_index
+    start_time = time.process_time()
+    phase, strip, layout, params = task
+    arrays = _attach(layout['blocks'])
+    count = layout['count']
+    columns = {name: arrays[name][:count] for name in STRIP_COLUMNS}
+    owned, present = strip_members(columns['y'], columns['alive'], layout['height'], layout['boundaries'], strip, params['halo'])
+    if params['stepping']:
+        # Frozen agents don't search, and can be sensed but not caught
+        stepping = arrays['stepping'][:count]
+        owned &= stepping
+        if phase == 'hunt':
+            present &= stepping
+    slots = np.flatnonzero(present)
+    agents = StripAgents({name: column[slots] for name, column in columns.items()}, params['type_counts'])
+    owned = owned[slots]
+
+    if phase == 'sense':
+        if _worker_sensor is None or _worker_sensor.name != params['sensor'] or _worker_sensor.map_size != layout['map_size']:
+            _worker_sensor = SENSORS[params['sensor']](layout['map_size'])
+        _worker_sensor.resize(agents, params['cell_sizes'])
+        inputs = _worker_sensor.sense(agents, owned)
+        sensing = np.flatnonzero(owned)
+        arrays['inputs'][slots[sensing]] = inputs[sensing]
+    else:
+        index = _worker_prey_index
+        if index is None or index.map_size != layout['map_size'] or index.target_cell_size != params['cell_size']:
+            index = _worker_prey_index = SpatialHash(layout['map_size'], params['cell_size'])
+        hunters = np.flatnonzero(owned & (agents.type == PREDATOR_TYPE))
+        index.update(agents.x, agents.y, agents.type == PREY_TYPE)
+        caught, _ = index.batch_nearest(agents.x[hunters], agents.y[hunters], params['catch_distance'])
+        arrays['caught'][slots[hunters]] = np.where(caught >= 0, slots[np.maximum(caught, 0)], -1)
+    return time.process_time() - start_time
+
+class SharedAgentStore(AgentStore):
+    """
+    An AgentStore whose pool of slots lives in shared memory, so worker
+    processes read the agents where they are instead of receiving copies.
+    Every column is its own block; when the pool grows, the columns move to
+    new blocks and the old ones are unlinked.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.blocks = {} # Column name -> shared memory block holding its pool
+        self.retired = [] # Replaced blocks that some array still points into
+        super().__init__(*args, **kwargs)
+
+    def new_column(self, name, capacity, dtype):
+        if name in self.blocks:
+            self.retired.append(self.blocks[name])
+        self.blocks[name], column = create_block(capacity, dtype)
+        return column
+
+    def allocate(self, capacity):
+        super().allocate(capacity)
+        self.retired = release_blocks(self.retired)
+
+    def layout(self, names):
+        """
+        Returns where the named columns' pools are, for workers to attach:
+        name -> (block name, dtype, shape).
+        """
+        return {name: (self.blocks[name].name, np.dtype(self.COLUMNS[name]).str, (self.capacity,)) for name in names}
+
+    def close(self):
+        """
+        Unlinks the shared memory blocks. The columns stay readable in this process.
+        """
+        self.retired = release_blocks(self.retired + list(self.blocks.values()))
+
+class Partitioner:
+    """
+    Spreads the neighbour searches of a single world's steps (the sensing of
+    brain inputs, and predators looking for a catch) over a pool of worker processes.
+    The toroidal map is split into horizontal strips, one per worker, and the
+    world's agents move to a shared memory store that every worker reads. A
+    worker indexes its strip's agents plus a halo of the neighbouring strips'
+    agents within search range, and writes the results of its own agents into
+    shared output arrays. Strip membership is worked out from the positions on
+    every step, so an agent crossing into another strip is simply picked up by
+    that strip's worker; the boundaries move now and then to keep the strips'
+    populations even.
+    Only these two searches are spread; the rest of the step (movement, brain
+    outputs, energy, births, deaths and the world's spatial index) runs in the
+    main process. The searches are the bulk of a step with brains, but the rest
+    bounds the speedup. Everything that draws random numbers or depends on the
+    order agents are processed in stays in the main process, so a seeded world
+    steps exactly as it does without workers.
+    """
+
+    def __init__(self, world, workers=None, rebalance_interval=PARTITION_REBALANCE_INTERVAL):
+        self.world = world
+        self.workers = workers or os.cpu_count() or 1
+        self.rebalance_interval = rebalance_interval
+        self.boundaries = np.linspace(0, world.map_height, self.workers + 1)
+        self.balanced_step = None # Step count the boundaries were last placed at
+        self.outputs = {} # Output array name -> (shared memory block, array)
+        self.retired = [] # Replaced output blocks that some array still points into
+
+        # Move the agents into shared memory, as they are
+        agents = world.agents
+        store = SharedAgentStore(world.map_size, agents.rng, agents.direction_change_interval, agents.capacity,
+                                 agents.reproduction_energy)
+        store.load_columns({name: getattr(agents, name) for name in AgentStore.COLUMNS}, agents.free_slots[:agents.free_count])
+        store.births = agents.births
+        store.next_id = agents.next_id
+        store.deaths = agents.deaths
+        world.agents = store
+        world.spatial.update(store.x, store.y, store.alive)
+        world.partitioner = self
+
+        self.pool = Pool(self.workers)
+
+    def output(self, name, shape, dtype):
+        """
+        Returns the shared output array of the given name, made anew when it
+        doesn't have the given shape.
+        """
+        if name in self.outputs:
+            block, array = self.outputs[name]
+            if array.shape == shape:
+                return array
+            self.retired.append(block)
+            self.retired = release_blocks(self.retired)
+        self.outputs[name] = create_block(shape, dtype)
+        return self.outputs[name][1]
+
+    def balance(self):
+        """
+        Places the strip boundaries so each strip holds about as many agents,
+        going by a sample of them.
+        """
+        world = self.world
+        agents = world.agents
+        living = np.flatnonzero(agents.alive)
+        if not living.size:
+            return
+        sample = living[::max(living.size // PARTITION_BALANCE_SAMPLE, 1)]
+        position = np.mod(agents.y[sample] + world.map_height / 2, world.map_height)
+        self.boundaries = np.quantile(position, np.linspace(0, 1, self.workers + 1))
+        self.boundaries[0] = 0
+        self.boundaries[-1] = world.map_height
+        self.balanced_step = world.step_count
+
+    def run(self, phase, params, stepping=None):
+        """
+        Runs one phase's searches on every strip, and waits for all of them.
+        """
+        world = self.world
+        agents = world.agents
+        if self.balanced_step is None or world.step_count - self.balanced_step >= self.rebalance_interval:
+            self.balance()
+        blocks = agents.layout(STRIP_COLUMNS)
+        params['stepping'] = stepping is not None
+        if stepping is not None:
+            self.output('stepping', (agents.capacity,), np.bool_)[:agents.count] = stepping
+        params['type_counts'] = agents.type_counts.copy()
+        for name, (block, array) in self.outputs.items():
+            blocks[name] = (block.name, array.dtype.str, array.shape)
+        layout = {
+            'blocks': blocks,
+            'count': agents.count,
+            'map_size': world.map_size,
+            'height': world.map_height,
+            'boundaries': self.boundaries,
+        }
+        strip_times = self.pool.map(run_strip, [(phase, strip, layout, params) for strip in range(self.workers)], chunksize=1)
+        if world.profiler:
+            # With a core per worker, the slowest strip is how long the phase's searches take
+            world.profiler.record(f'{phase} strip', max(strip_times))
+
+    def sense(self, stepping=None):
+        """
+        Computes the brain inputs of every agent (or only of the agents in the
+        optional stepping mask), like the world's sensor does.
+        """
+        agents = self.world.agents
+        sensor = self.world.sensor
+        inputs = self.output('inputs', (agents.capacity, sensor.input_size), np.float32)
+        params = {
+            'sensor': sensor.name,
+            'cell_sizes': sensor.resize(agents), # The main process keeps the indexes' sizing history
+            'halo': sensor.reach + PARTITION_HALO_SLACK,
+        }
+        self.run('sense', params, stepping)
+        return inputs[:agents.count]
+
+    def catch_targets(self, predators, cell_size, stepping=None):
+        """
+        Returns, for each of the given predator slots, the slot of the nearest prey
+        its body touches (-1 if none), searching prey indexes with the given cell size.
+        """
+        agents = self.world.agents
+        caught = self.output('caught', (agents.capacity,), np.int64)
+        catch_distance = self.world.catch_distance
+        params = {'cell_size': cell_size, 'catch_distance': catch_distance, 'halo': catch_distance + PARTITION_HALO_SLACK}
+        self.run('hunt', params, stepping)
+        return caught[predators]
+
+    def close(self):
+        """
+        Stops the workers and unlinks the shared memory. The world stays usable,
+        stepping in this process only.
+        """
+        self.pool.close()
+        self.pool.join()
+        self.world.partitioner = None
+        self.world.agents.close()
+        self.retired = release_blocks(self.retired + [block for block, _ in self.outputs.values()])
+        self.outputs = {}
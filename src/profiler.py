@@ -0,0 +1,118 @@
+import contextlib
+import math
+import time
+from constants import *
+
+# Histogram bins are logarithmic, from PROFILER_MIN_TIME up, each PROFILER_BIN_RATIO times wider than the last
+_LOG_RATIO = math.log(PROFILER_BIN_RATIO)
+
+def _bin_of(seconds):
+    if seconds <= PROFILER_MIN_TIME:
+        return 0
+    return min(int(math.log(seconds / PROFILER_MIN_TIME) / _LOG_RATIO), PROFILER_BINS - 1)
+
+def _bin_time(index):
+    # Geometric middle of a bin
+    return PROFILER_MIN_TIME * PROFILER_BIN_RATIO ** (index + 0.5)
+
+class PhaseHistogram:
+    """
+    Timings of one phase: a fixed-size log-scale histogram over a rolling window of
+    the latest samples, plus running totals over the whole run.
+    Adding a sample is O(1) and never allocates; percentiles walk the bins.
+    """
+
+    def __init__(self, window=PROFILER_WINDOW):
+        self.counts = [0] * PROFILER_BINS # Samples per bin, within the window
+        self.window = [0] * window # Bin of each of the latest samples (a ring)
+        self.position = 0
+        self.filled = 0
+        self.total_count = 0
+        self.total_time = 0.0
+
+    def add(self, seconds):
+        index = _bin_of(seconds)
+        if self.filled == len(self.window):
+            self.counts[self.window[self.position]] -= 1 # The oldest sample leaves the window
+        else:
+            self.filled += 1
+        self.window[self.position] = index
+        self.counts[index] += 1
+        self.position = (self.position + 1) % len(self.window)
+        self.total_count += 1
+        self.total_time += seconds
+
+    def percentile(self, fraction):
+        """
+        Returns the given percentile (0 to 1) of the samples in the window, in seconds,
+        to within a bin's width.
+        """
+        if not self.filled:
+            return 0.0
+        rank = fraction * (self.filled - 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen > rank:
+                return _bin_time(index)
+        return _bin_time(PROFILER_BINS - 1)
+
+class _Span:
+    """
+    Times one phase with the monotonic clock. Reused for every span of its phase.
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.add(time.perf_counter() - self.start)
+
+_NO_SPAN = contextlib.nullcontext()
+
+class Profiler:
+    """
+    Collects per-phase timings of a loop.
+    Wrap each phase in `with profiler.span(name):`; phases are created on first use
+    and keep the order they were first seen in.
+    """
+
+    def __init__(self, window=PROFILER_WINDOW):
+        self.window = window
+        self.histograms = {}
+        self.spans = {}
+
+    def span(self, phase):
+        span = self.spans.get(phase)
+        if span is None:
+            self.histograms[phase] = PhaseHistogram(self.window)
+            span = self.spans[phase] = _Span(self.histograms[phase])
+        return span
+
+    def record(self, phase, seconds):
+        """
+        Adds a timing measured elsewhere (in a worker process, say) to a phase.
+        """
+        self.span(phase).histogram.add(seconds)
+
+    def report(self):
+        """
+        Returns a breakdown table, one line per phase: sample count, total time,
+        mean, and the rolling p50/p99.
+        """
+        lines = [f"{'phase':<16}{'count':>10}{'total s':>10}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}"]
+        for phase, histogram in self.histograms.items():
+            mean = histogram.total_time / histogram.total_count if histogram.total_count else 0.0
+            lines.append(f"{phase:<16}{histogram.total_count:>10}{histogram.total_time:>10.3f}{mean * 1000:>10.3f}"
+                         f"{histogram.percentile(0.5) * 1000:>10.3f}{histogram.percentile(0.99) * 1000:>10.3f}")
+        return '\n'.join(lines)
+
+def span(profiler, phase):
+    """
+    Returns a span timing the given phase, or a no-op one without a profiler.
+    """
+    return profiler.span(phase) if profiler else _NO_SPAN
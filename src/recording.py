@@ -0,0 +1,276 @@
+import struct
+import numpy as np
+from constants import *
+from agent import Agent
+from spatial import SpatialHash, map_extent
+from chunks import ChunkGrid
+
+# --- Recording File Format ---
+# All values are little-endian, and every section starts on an 8-byte boundary.
+#
+#   file header   magic, version, flags, map width, map height, prey speed, predator speed
+#   chunk*        chunk header (magic, step count, first step, chunk size in bytes),
+#                 step number table, step offset table (relative to the chunk start),
+#                 then one frame per step
+#   chunk index   (first step, file offset) per chunk, followed by the index footer
+#
+# A frame is a frame header (step, agent count) followed by the agent columns
+# id (uint32), x, y, angle (float32, or float16 when quantized) and type (uint8),
+# each padded to 8 bytes. The chunk index is only written when the recording is
+# closed; if it is missing, Replay rebuilds it by walking the chunk headers.
+# Version 1 files (square maps only) have no map height in their header.
+FILE_MAGIC = b'PPSIMREC'
+FILE_VERSION = 2
+FLAG_FLOAT16 = 1
+FILE_HEADER = struct.Struct('<8sIIdddd')
+FILE_HEADERS = {1: struct.Struct('<8sIIddd'), 2: FILE_HEADER} # By file version
+CHUNK_MAGIC = b'CHNK'
+CHUNK_HEADER = struct.Struct('<4sIqQ')
+FRAME_HEADER = struct.Struct('<qI4x')
+INDEX_ENTRY = np.dtype([('first_step', '<i8'), ('offset', '<u8')])
+INDEX_MAGIC = b'PPSIMIDX'
+INDEX_FOOTER = struct.Struct('<QQ8s')
+
+def _padded(size):
+    """
+    Rounds a byte size up to the next multiple of 8.
+    """
+    return (size + 7) & ~7
+
+def _frame_layout(count, float_dtype):
+    """
+    Returns the byte offset of each column within a frame (after the frame header),
+    and the total size of the frame including its header.
+    """
+    offsets = {}
+    position = FRAME_HEADER.size
+    for name, dtype in (('id', np.uint32), ('x', float_dtype), ('y', float_dtype),
+                        ('angle', float_dtype), ('type', np.uint8)):
+        offsets[name] = (position, np.dtype(dtype))
+        position += _padded(count * np.dtype(dtype).itemsize)
+    return offsets, position
+
+class Recorder:
+    """
+    Appends each recorded step's agent columns to a compact chunked binary file.
+    Frames are buffered in memory and written out a chunk at a time, together with
+    the offset of every frame in the chunk, so a replay can seek straight to any step.
+    """
+
+    def __init__(self, path, world, quantize=False, interval=1):
+        self.file = open(path, 'wb')
+        self.float_dtype = np.float16 if quantize else np.float32
+        self.interval = interval # Record every n-th step
+
+        self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, FLAG_FLOAT16 if quantize else 0,
+                                         world.map_width, world.map_height, world.prey_speed, world.predator_speed))
+        self.chunk_index = [] # (first step, file offset) of every chunk written so far
+        self.frames = [] # Encoded frames of the chunk being buffered
+        self.frame_steps = []
+        self.buffered_bytes = 0
+
+        self.record(world.step_count, world.agents) # Start with the world's current state
+
+    def record(self, step, agents):
+        """
+        Encodes the current state of the agents as one frame of the recording.
+        """
+        if step % self.interval:
+            return
+
+        # Only living agents are recorded, packed together
+        living = np.flatnonzero(agents.alive)
+        count = living.size
+        layout, frame_size = _frame_layout(count, self.float_dtype)
+        frame = bytearray(frame_size)
+        FRAME_HEADER.pack_into(frame, 0, step, count)
+        for name, (offset, dtype) in layout.items():
+            column = np.frombuffer(frame, dtype=dtype, count=count, offset=offset)
+            column[:] = getattr(agents, name)[living]
+
+        self.frames.append(frame)
+        self.frame_steps.append(step)
+        self.buffered_bytes += frame_size
+        if len(self.frames) >= RECORDING_CHUNK_STEPS or self.buffered_bytes >= RECORDING_CHUNK_BYTES:
+            self.flush_chunk()
+
+    def flush_chunk(self):
+        """
+        Writes the buffered frames to the file as one chunk.
+        """
+        if not self.frames:
+            return
+
+        n_steps = len(self.frames)
+        tables_size = 2 * 8 * n_steps # Step number table and step offset table
+        frame_offsets = CHUNK_HEADER.size + tables_size + np.concatenate(
+            ([0], np.cumsum([len(frame) for frame in self.frames[:-1]]))).astype('<u8')
+        chunk_size = CHUNK_HEADER.size + tables_size + self.buffered_bytes
+
+        self.chunk_index.append((self.frame_steps[0], self.file.tell()))
+        self.file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, n_steps, self.frame_steps[0], chunk_size))
+        self.file.write(np.asarray(self.frame_steps, dtype='<i8').tobytes())
+        self.file.write(frame_offsets.tobytes())
+        for frame in self.frames:
+            self.file.write(frame)
+
+        self.frames = []
+        self.frame_steps = []
+        self.buffered_bytes = 0
+
+    def close(self):
+        """
+        Flushes the last chunk and writes the chunk index, completing the recording.
+        """
+        self.flush_chunk()
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.chunk_index, dtype=INDEX_ENTRY).tobytes())
+        self.file.write(INDEX_FOOTER.pack(index_offset, len(self.chunk_index), INDEX_MAGIC))
+        self.file.close()
+
+class ReplayAgents:
+    """
+    The agents of the replay frame currently shown.
+    Columns are read-only views straight into the memory-mapped recording, and are
+    swapped whenever the replay seeks, so Agent views always see the current frame.
+    """
+
+    def __init__(self, prey_speed, predator_speed):
+        self.type_speeds = np.array([prey_speed, predator_speed])
+        self.count = 0
+        self.id = np.empty(0, dtype=np.uint32)
+        self.x = np.empty(0, dtype=np.float32)
+        self.y = np.empty(0, dtype=np.float32)
+        self.angle = np.empty(0, dtype=np.float32)
+        self.type = np.empty(0, dtype=np.uint8)
+        self.alive = np.empty(0, dtype=bool) # Recordings only hold living agents
+        self.type_counts = np.zeros(len(AGENT_TYPE_NAMES), dtype=np.int64) # Counted once per frame shown
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def population(self):
+        return self.count
+
+    @property
+    def speed(self):
+        # Speeds aren't recorded; they follow from each agent's type
+        return self.type_speeds[self.type]
+
+    def view(self, index):
+        return Agent(self, index)
+
+    def count_type(self, agent_type):
+        return int(self.type_counts[agent_type])
+
+class Replay:
+    """
+    Plays back a recording by memory-mapping the file and reading frames on demand.
+    Stands in for a World in the pygame viewer: update() advances playback by one
+    recorded frame and seek() jumps straight to any step, without loading the whole
+    recording into memory.
+    """
+
+    def __init__(self, path):
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version = struct.unpack_from('<8sI', self.data, 0)
+        if magic != FILE_MAGIC or version not in FILE_HEADERS:
+            raise ValueError(f"{path} is not a version {' or '.join(map(str, FILE_HEADERS))} recording")
+        self.header = FILE_HEADERS[version]
+        if version == 1:
+            _, _, flags, map_width, prey_speed, predator_speed = self.header.unpack_from(self.data, 0)
+            map_height = map_width
+        else:
+            _, _, flags, map_width, map_height, prey_speed, predator_speed = self.header.unpack_from(self.data, 0)
+        self.float_dtype = np.float16 if flags & FLAG_FLOAT16 else np.float32
+        self.map_size = map_width if map_width == map_height else (map_width, map_height)
+        self.map_width, self.map_height = map_extent(self.map_size)
+        self.prey_speed = prey_speed
+        self.predator_speed = predator_speed
+
+        index = self.load_index()
+        self.chunk_first_steps = index['first_step'].astype(np.int64)
+        self.chunk_offsets = index['offset'].astype(np.int64)
+        if not len(self.chunk_offsets):
+            raise ValueError(f"{path} contains no frames")
+        self.first_step = int(self.chunk_first_steps[0])
+        self.last_step = int(self.chunk_steps(len(self.chunk_offsets) - 1)[-1])
+
+        self.agents = ReplayAgents(prey_speed, predator_speed)
+        self.spatial = SpatialHash(self.map_size)
+        self.chunks = ChunkGrid(self.map_size) # Only used for the zoomed-out view
+        self.step_count = None
+        self.seek(self.first_step)
+
+    def load_index(self):
+        """
+        Returns the chunk index, read from the end of the file, or rebuilt by walking
+        the chunk headers if the recording was never closed.
+        """
+        if len(self.data) >= self.header.size + INDEX_FOOTER.size:
+            index_offset, n_chunks, magic = INDEX_FOOTER.unpack_from(self.data, len(self.data) - INDEX_FOOTER.size)
+            if magic == INDEX_MAGIC:
+                return np.frombuffer(self.data, dtype=INDEX_ENTRY, count=n_chunks, offset=index_offset)
+
+        entries = []
+        offset = self.header.size
+        while offset + CHUNK_HEADER.size <= len(self.data):
+            magic, n_steps, first_step, chunk_size = CHUNK_HEADER.unpack_from(self.data, offset)
+            if magic != CHUNK_MAGIC or offset + chunk_size > len(self.data):
+                break # Truncated chunk at the end of an interrupted recording
+            entries.append((first_step, offset))
+            offset += chunk_size
+        return np.array(entries, dtype=INDEX_ENTRY)
+
+    def chunk_steps(self, chunk):
+        """
+        Returns the step numbers of the frames in the given chunk.
+        """
+        offset = int(self.chunk_offsets[chunk])
+        n_steps = CHUNK_HEADER.unpack_from(self.data, offset)[1]
+        return np.frombuffer(self.data, dtype='<i8', count=n_steps, offset=offset + CHUNK_HEADER.size)
+
+    def seek(self, step):
+        """
+        Shows the last recorded frame at or before the given step.
+        """
+        step = min(max(step, self.first_step), self.last_step)
+        chunk = int(np.searchsorted(self.chunk_first_steps, step, side='right')) - 1
+        chunk_offset = int(self.chunk_offsets[chunk])
+        steps = self.chunk_steps(chunk)
+        position = int(np.searchsorted(steps, step, side='right')) - 1
+        frame_offsets = np.frombuffer(self.data, dtype='<u8', count=len(steps),
+                                      offset=chunk_offset + CHUNK_HEADER.size + 8 * len(steps))
+        frame_offset = chunk_offset + int(frame_offsets[position])
+
+        frame_step, count = FRAME_HEADER.unpack_from(self.data, frame_offset)
+        layout, _ = _frame_layout(count, self.float_dtype)
+        agents = self.agents
+        for name, (offset, dtype) in layout.items():
+            setattr(agents, name, np.frombuffer(self.data, dtype=dtype, count=count, offset=frame_offset + offset))
+        agents.count = count
+        if len(agents.alive) != count:
+            agents.alive = np.ones(count, dtype=bool)
+        agents.type_counts = np.bincount(agents.type, minlength=len(AGENT_TYPE_NAMES))
+
+        self.step_count = frame_step
+        self.spatial.update(agents.x.astype(np.float64), agents.y.astype(np.float64))
+
+    def update(self):
+        """
+        Advances playback to the next recorded frame (stays on the last frame at the end).
+        """
+        if self.step_count < self.last_step:
+            self.seek(self.next_step())
+
+    def next_step(self):
+        """
+        Returns the step number of the frame after the current one.
+        """
+        chunk = int(np.searchsorted(self.chunk_first_steps, self.step_count, side='right')) - 1
+        steps = self.chunk_steps(chunk)
+        position = int(np.searchsorted(steps, self.step_count, side='right'))
+        if position < len(steps):
+            return int(steps[position])
+        return int(self.chunk_first_steps[chunk + 1])
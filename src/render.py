@@ -0,0 +1,207 @@
+import pygame
+import numpy as np
+from constants import *
+
+class AgentRenderer:
+    """
+    Draws all agents onto the simulation content surface in batches.
+    Every agent is projected to screen space and culled against the camera
+    rectangle in one vectorized pass. Visible agents are then either blitted from
+    cached pre-rendered sprites, or, when zoomed out so far that agents are only a
+    pixel or two wide, rasterized straight into the surface's pixel buffer as a density map.
+    Facing lines are written into the pixel buffer too, for all visible agents at once.
+    Zoomed out further still, draw_heatmap() shows one cell per map chunk instead.
+    """
+
+    def __init__(self, width, height, text_cache):
+        self.width = width
+        self.height = height
+        self.text = text_cache # Shared text cache used to draw agent IDs
+        self.sprites = {} # Pre-rendered agent circles, keyed by (agent type, screen radius)
+        self.line_steps = {} # Pixel offsets along facing lines, keyed by line length
+        self.density_shade = np.zeros(width * height, dtype=np.int64) # Palette index of every pixel in density mode
+        # Density mode colors: the background, then each type's shades from 1 agent per pixel up to DENSITY_SATURATION
+        level = np.arange(DENSITY_SATURATION) / (DENSITY_SATURATION - 1)
+        shades = [np.asarray(BLACK, dtype=np.uint8)[None, :]]
+        for color in AGENT_TYPE_COLORS:
+            base = np.asarray(color, dtype=np.float64)[None, :]
+            shades.append((base + (255 - base) * level[:, None]).astype(np.uint8))
+        self.density_palette = np.concatenate(shades)
+
+    def get_sprite(self, agent_type, screen_radius):
+        """
+        Returns the cached circle sprite for an agent type at the given screen radius,
+        rendering it on first use.
+        """
+        key = (agent_type, screen_radius)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            size = 2 * screen_radius + 1
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, AGENT_TYPE_COLORS[agent_type], (screen_radius, screen_radius), screen_radius)
+            self.sprites[key] = sprite
+        return sprite
+
+    def project(self, agents, camera_x, camera_y, zoom_level):
+        """
+        Converts every agent's world coordinates to screen coordinates and culls
+        the ones outside the camera rectangle.
+        Returns (indices, screen_x, screen_y, screen_radius) for the visible agents.
+        """
+        screen_radius = int(AGENT_RADIUS * zoom_level)
+        screen_x = ((agents.x - camera_x) * zoom_level + self.width / 2).astype(np.int64)
+        screen_y = ((agents.y - camera_y) * zoom_level + self.height / 2).astype(np.int64)
+
+        # Only keep agents that are somewhat visible within the simulation content area
+        visible = (screen_x > -screen_radius) & (screen_x < self.width + screen_radius) & \
+                  (screen_y > -screen_radius) & (screen_y < self.height + screen_radius) & agents.alive
+        indices = np.flatnonzero(visible)
+        return indices, screen_x[indices], screen_y[indices], screen_radius
+
+    def draw(self, surface, agents, camera_x, camera_y, zoom_level, selected_index=None):
+        """
+        Draws every visible agent, its facing line and ID (depending on zoom level),
+        and a highlight around the selected agent.
+        """
+        indices, screen_x, screen_y, screen_radius = self.project(agents, camera_x, camera_y, zoom_level)
+        types = agents.type[indices]
+
+        if screen_radius <= DENSITY_MODE_MAX_RADIUS:
+            self.draw_density(surface, screen_x, screen_y, types)
+        else:
+            self.draw_sprites(surface, screen_x, screen_y, types, screen_radius)
+
+        # if zoom is > 5, draw direction & cone
+        if zoom_level > 5:
+            self.draw_facing_lines(surface, screen_x, screen_y, agents.angle[indices], screen_radius * 8)
+
+        # if zoom is > 11, draw the agents' IDs for debugging purposes
+        if zoom_level > 11:
+            for agent_id, center in zip(agents.id[indices].tolist(), zip(screen_x.tolist(), screen_y.tolist())):
+                self.text.blit_number(surface, agent_id, WHITE, AGENT_ID_FONT_SIZE, center)
+
+        # if an agent is selected and visible, draw a border around it
+        if selected_index is not None:
+            position = np.flatnonzero(indices == selected_index)
+            if position.size:
+                center = (int(screen_x[position[0]]), int(screen_y[position[0]]))
+                pygame.draw.circle(surface, GOLD, center, screen_radius + 2, 2)
+
+    def draw_sprites(self, surface, screen_x, screen_y, types, screen_radius):
+        """
+        Blits the cached sprite of each visible agent, one batched blits() call per agent type.
+        """
+        for agent_type in range(len(AGENT_TYPE_COLORS)):
+            of_type = types == agent_type
+            if not of_type.any():
+                continue
+            sprite = self.get_sprite(agent_type, screen_radius)
+            left = (screen_x[of_type] - screen_radius).tolist()
+            top = (screen_y[of_type] - screen_radius).tolist()
+            surface.blits([(sprite, position) for position in zip(left, top)], False)
+
+    def get_line_steps(self, line_length):
+        """
+        Returns the cached pixel offsets along every line that fits the given length,
+        as (x offsets, y offsets) indexed by the line end's (x + line_length, y + line_length).
+        Each line gets the pixels pygame.draw.line would draw; lines shorter than
+        line_length repeat some of them.
+        """
+        steps = self.line_steps.get(line_length)
+        if steps is None:
+            ends = np.arange(-line_length, line_length + 1)
+            end_x, end_y = (end.astype(np.float64)[:, :, None] for end in np.meshgrid(ends, ends, indexing='ij'))
+            longest = np.maximum(np.maximum(np.abs(end_x), np.abs(end_y)), 1)
+            along = np.round(np.arange(line_length + 1) / line_length * longest)
+            # Halfway pixels round towards the start, as pygame.draw.line picks them
+            steps = tuple((np.sign(offset) * np.ceil(np.abs(offset) - 0.5)).astype(np.int64)
+                          for offset in (along * end_x / longest, along * end_y / longest))
+            self.line_steps[line_length] = steps
+        return steps
+
+    def draw_facing_lines(self, surface, screen_x, screen_y, angles, line_length):
+        """
+        Draws a line of the given length from each agent's center in its facing
+        direction, by writing the lines' pixels straight into the surface.
+        """
+        steps_x, steps_y = self.get_line_steps(line_length)
+        end_x = (line_length * np.cos(angles)).astype(np.int64) + line_length
+        end_y = (line_length * np.sin(angles)).astype(np.int64) + line_length
+        line_x = screen_x[:, None] + steps_x[end_x, end_y]
+        line_y = screen_y[:, None] + steps_y[end_x, end_y]
+        inside = (line_x >= 0) & (line_x < self.width) & (line_y >= 0) & (line_y < self.height)
+        pixels = pygame.surfarray.pixels2d(surface)
+        pixels[line_x[inside], line_y[inside]] = surface.map_rgb(WHITE)
+        del pixels # Unlocks the surface
+
+    def draw_density(self, surface, screen_x, screen_y, types):
+        """
+        Rasterizes visible agents straight into the surface's pixels, replacing its contents.
+        Each agent covers a 2x2 pixel block in its type's color, which fades towards
+        white as more agents pile onto the same pixel. Predators are drawn over prey.
+        """
+        # Each agent covers the 2x2 block around its center, clipped to the surface
+        block_x = np.concatenate((screen_x, screen_x - 1, screen_x, screen_x - 1))
+        block_y = np.concatenate((screen_y, screen_y, screen_y - 1, screen_y - 1))
+        block_types = np.tile(types, 4)
+        inside = (block_x >= 0) & (block_x < self.width) & (block_y >= 0) & (block_y < self.height)
+        pixel_count = self.width * self.height
+        pixel_index = block_x[inside] * self.height + block_y[inside]
+
+        # Agents per pixel and type, counted in one pass, then turned into an index into
+        # the palette of shades: 0 is the background, and later types cover earlier ones
+        type_count = len(AGENT_TYPE_COLORS)
+        counts = np.bincount(block_types[inside].astype(np.int64) * pixel_count + pixel_index,
+                             minlength=type_count * pixel_count).reshape(type_count, pixel_count)
+        shade = self.density_shade
+        shade[:] = 0
+        for agent_type in range(type_count):
+            occupied = np.flatnonzero(counts[agent_type])
+            shade[occupied] = agent_type * DENSITY_SATURATION + np.minimum(counts[agent_type, occupied], DENSITY_SATURATION)
+
+        # Write the shades' pixel values over the whole surface in one go
+        colors = np.array([surface.map_rgb(color) for color in self.density_palette.tolist()], dtype=np.uint32)
+        pixels = pygame.surfarray.pixels2d(surface)
+        pixels[...] = colors[shade].reshape(self.width, self.height)
+        del pixels # Unlocks the surface
+
+    def draw_heatmap(self, surface, chunks, agents, camera_x, camera_y, zoom_level):
+        """
+        Draws the level-of-detail view: one cell per visible map chunk, brightening
+        with the log of the chunk's agent count (relative to the busiest chunk), and
+        shading from the prey color to the predator color with its share of predators.
+        Only occupied chunks are counted, so the cost follows the agents rather than the map.
+        """
+        index = chunks.index
+        cells, totals, predators = chunks.density(agents)
+        if not cells.size:
+            return
+
+        # Range of chunks overlapping the view, in chunk coordinates
+        left = camera_x - self.width / 2 / zoom_level + index.half_width
+        top = camera_y - self.height / 2 / zoom_level + index.half_height
+        first_column = max(int(left // index.cell_width), 0)
+        first_row = max(int(top // index.cell_height), 0)
+        last_column = min(int((left + self.width / zoom_level) // index.cell_width), index.cells_x - 1)
+        last_row = min(int((top + self.height / zoom_level) // index.cell_height), index.cells_y - 1)
+        columns = last_column - first_column + 1
+        rows = last_row - first_row + 1
+        if columns <= 0 or rows <= 0:
+            return
+
+        column = cells % index.cells_x - first_column
+        row = cells // index.cells_x - first_row
+        visible = (column >= 0) & (column < columns) & (row >= 0) & (row < rows)
+        level = np.log1p(totals[visible]) / np.log1p(totals.max())
+        share = predators[visible] / totals[visible]
+        prey_color, predator_color = (np.asarray(color, dtype=np.float64) for color in AGENT_TYPE_COLORS)
+        shade = (prey_color[None, :] * (1 - share[:, None]) + predator_color[None, :] * share[:, None]) * level[:, None]
+
+        # One pixel per chunk, scaled up to the chunks' size on screen
+        image = np.zeros((columns, rows, 3), dtype=np.uint8)
+        image[column[visible], row[visible]] = shade.astype(np.uint8)
+        size = (max(int(round(columns * index.cell_width * zoom_level)), 1), max(int(round(rows * index.cell_height * zoom_level)), 1))
+        heatmap = pygame.transform.scale(pygame.surfarray.make_surface(image), size)
+        screen_left = (first_column * index.cell_width - index.half_width - camera_x) * zoom_level + self.width / 2
+        screen_top = (first_row * index.cell_height - index.half_height - camera_y) * zoom_level + self.height / 2
+        surface.blit(heatmap, (int(round(screen_left)), int(round(screen_top))))
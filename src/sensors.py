@@ -0,0 +1,264 @@
+import numpy as np
+from constants import *
+from spatial import SpatialHash, index_for_population
+
+class NearestSensor:
+    """
+    Senses, for every agent at once, the nearest agent of each type.
+    Keeps a spatial index per agent type, so looking for the nearest predator never
+    has to sift through the (usually far more numerous) prey. Each index's cells are
+    sized to hold about one agent of its type, and are resized as the population changes.
+    """
+    name = 'nearest'
+
+    def __init__(self, map_size, radius=SENSE_RADIUS):
+        self.map_size = map_size
+        self.radius = radius
+        self.reach = radius # Farthest distance at which another agent affects the inputs
+        self.indexes = [None for _ in AGENT_TYPE_NAMES]
+        self.input_size = 3 * len(AGENT_TYPE_NAMES) # Bearing (cos, sin) and closeness per type
+
+    def resize(self, agents, cell_sizes=None):
+        """
+        Sizes each type's index to the type's living population, or to the given
+        cell sizes (one per type, as returned by another copy of the sensor).
+        Returns the cell sizes, to size the indexes of other copies alike.
+        """
+        for agent_type in range(len(AGENT_TYPE_NAMES)):
+            index = self.indexes[agent_type]
+            if cell_sizes is None:
+                index = index_for_population(index, self.map_size, agents.count_type(agent_type), SENSE_MIN_CELL_SIZE, self.radius)
+            elif index is None or index.target_cell_size != cell_sizes[agent_type]:
+                index = SpatialHash(self.map_size, cell_sizes[agent_type])
+            self.indexes[agent_type] = index
+        return [index.target_cell_size for index in self.indexes]
+
+    def sense(self, agents, sensing=None):
+        """
+        Computes the brain inputs of every agent: for each agent type, the bearing
+        (as cosine and sine, relative to the agent's facing angle) and the closeness
+        (1 at contact, 0 at the sensing radius or with nobody in range) of the
+        nearest agent of that type.
+        With the optional sensing mask, only those agents' inputs are computed.
+        Returns an array of shape (agent count, 3 * number of agent types).
+        """
+        inputs = np.zeros((len(agents), 3 * len(AGENT_TYPE_NAMES)), dtype=np.float32)
+        x = agents.x
+        y = agents.y
+        # Agents sensing their own type must not find themselves
+        sensors = np.arange(len(agents)) if sensing is None else np.flatnonzero(sensing)
+
+        self.resize(agents)
+        for agent_type in range(len(AGENT_TYPE_NAMES)):
+            members = agents.alive & (agents.type == agent_type)
+            index = self.indexes[agent_type]
+            index.update(x, y, members)
+            if not members.any():
+                continue
+
+            nearest, distances = index.batch_nearest(x[sensors], y[sensors], self.radius, sensors)
+            found = np.flatnonzero(nearest >= 0)
+            neighbours = nearest[found]
+            distances = distances[found]
+            found = sensors[found]
+            dx = index.wrapped_dx(x[neighbours], x[found])
+            dy = index.wrapped_dy(y[neighbours], y[found])
+            bearing = np.arctan2(dy, dx) - agents.angle[found]
+            inputs[found, 3 * agent_type] = np.cos(bearing)
+            inputs[found, 3 * agent_type + 1] = np.sin(bearing)
+            inputs[found, 3 * agent_type + 2] = 1 - distances / self.radius
+        return inputs
+
+class RaySensor:
+    """
+    Cone vision: casts a fan of rays across a field of view centered on each
+    agent's facing angle, and reports the distance and type of the first agent
+    each ray hits within the vision range.
+    All agents are handled at once: candidate pairs come from a spatial index
+    sized to the vision range, and each candidate is only intersected with the
+    few rays pointing within its angular radius, all in one batch.
+    The cost follows the number of candidate pairs, so it grows with density
+    rather than staying sub-millisecond: on the default 256 map, sensing takes
+    about 0.3 ms for the default 60 agents, 3 ms for 1,000 and 50 ms for 5,000.
+    Stopping each agent's search at the nearest cell rings would not cut that:
+    most agents have a ray that sees nothing, and that ray needs every candidate
+    out to the vision range.
+    """
+    name = 'rays'
+
+    def __init__(self, map_size, rays=VISION_RAYS, field_of_view=VISION_FIELD_OF_VIEW, vision_range=VISION_RANGE):
+        self.map_size = map_size
+        self.field_of_view = field_of_view
+        self.vision_range = vision_range
+        self.reach = vision_range + AGENT_RADIUS # Farthest distance at which another agent affects the inputs
+        # Ray directions relative to the facing angle, spread evenly across the field of view
+        self.ray_offsets = np.linspace(-field_of_view / 2, field_of_view / 2, rays) if rays > 1 else np.zeros(1)
+        self.ray_spacing = field_of_view / (rays - 1) if rays > 1 else 2 * np.pi
+        self.index = SpatialHash(map_size, max(vision_range / VISION_CELLS_PER_RANGE, SENSE_MIN_CELL_SIZE))
+        self.input_size = 3 * rays # Closeness, is prey, is predator per ray
+
+    def resize(self, agents, cell_sizes=None):
+        """
+        The index's cells are sized to the vision range, whatever the population:
+        there is nothing to resize. Returns the cell size, as NearestSensor.resize does.
+        """
+        return [self.index.target_cell_size]
+
+    def candidates(self, x, y, angle, alive):
+        """
+        Returns (i, j, dx, dy, distances) for every pair of agents where j is within
+        reach of agent i's rays, with (dx, dy) the wrapped offset from i to j.
+        Works like SpatialHash.neighbour_pairs, but in a single pass: every agent is
+        matched at once with the neighbouring cells its cone can reach, and paired
+        with all of their agents, so no Python loop runs per cell offset.
+        """
+        index = self.index
+        cell_width = index.cell_width
+        cell_height = index.cell_height
+        reach = self.reach
+        ring_x = int(np.ceil(reach / cell_width))
+        ring_y = int(np.ceil(reach / cell_height))
+        offsets_x = np.arange(-ring_x, ring_x + 1)
+        offsets_y = np.arange(-ring_y, ring_y + 1)
+        # Cells only lie in a known direction when the window doesn't wrap onto itself
+        cull = offsets_x.size <= index.cells_x and offsets_y.size <= index.cells_y
+        if not cull:
+            offsets_x = np.unique(offsets_x % index.cells_x)
+            offsets_y = np.unique(offsets_y % index.cells_y)
+        offsets_x, offsets_y = (offsets.ravel() for offsets in np.meshgrid(offsets_x, offsets_y))
+
+        # Cell of every casting agent
+        everyone = np.flatnonzero(alive)
+        cx, cy = index.cell_coords(x[everyone], y[everyone])
+        if cull:
+            # Offset from each agent to each neighbouring cell's center, one row per agent
+            local_x = np.mod(x[everyone] + index.half_width, cell_width) - cell_width / 2
+            local_y = np.mod(y[everyone] + index.half_height, cell_height) - cell_height / 2
+            to_x = offsets_x * cell_width - local_x[:, None]
+            to_y = offsets_y * cell_height - local_y[:, None]
+            to_squared = to_x * to_x + to_y * to_y
+            along = to_x * np.cos(angle[everyone])[:, None] + to_y * np.sin(angle[everyone])[:, None]
+            # Every agent touching a cell is within this distance of the cell's center, so the
+            # cell is seen if its center's bearing is within half the field of view plus
+            # spread = asin(cell_radius / distance) of the facing angle. Comparing cosines
+            # (cos(half_view + spread), times the distance) saves the trigonometry.
+            cell_radius = np.hypot(cell_width, cell_height) / 2 + AGENT_RADIUS
+            half_view = self.field_of_view / 2
+            edge = np.cos(half_view) * np.sqrt(np.maximum(to_squared - cell_radius * cell_radius, 0)) - np.sin(half_view) * cell_radius
+            # With a wide enough view, a close cell is seen whatever its bearing
+            surrounding = half_view >= np.pi / 2 and np.sin(half_view) * np.sqrt(to_squared) <= cell_radius
+            seeing = (to_squared <= (reach + cell_radius) ** 2) & \
+                     ((to_squared <= cell_radius * cell_radius) | (along >= edge) | surrounding)
+            agent, offset = np.nonzero(seeing)
+        else:
+            agent = np.repeat(np.arange(everyone.size), offsets_x.size)
+            offset = np.tile(np.arange(offsets_x.size), everyone.size)
+
+        neighbour_cells = ((cy[agent] + offsets_y[offset]) % index.cells_y) * index.cells_x + \
+                          (cx[agent] + offsets_x[offset]) % index.cells_x
+        starts, counts = index.cell_ranges(neighbour_cells)
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0), np.empty(0), np.empty(0)
+
+        # Pair every agent with every agent in the cells it sees
+        group_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        i = np.repeat(everyone[agent], counts)
+        j = index.order[np.repeat(starts, counts) + (np.arange(total) - group_offsets)]
+        # Wrapped offsets: pairs within reach are never more than half the map apart
+        dx = x[j] - x[i]
+        dx -= index.width * np.round(dx / index.width)
+        dy = y[j] - y[i]
+        dy -= index.height * np.round(dy / index.height)
+        squared = dx * dx + dy * dy
+        keep = np.flatnonzero((squared <= reach * reach) & (i != j))
+        return i[keep], j[keep], dx[keep], dy[keep], np.sqrt(squared[keep])
+
+    def cast(self, agents, sensing=None):
+        """
+        Casts every agent's rays (or only those of the agents in the optional sensing mask).
+        Returns (distances, types), both of shape (agent count, rays): the distance
+        to the first agent hit by each ray (inf if none) and that agent's type (-1 if none).
+        """
+        count = len(agents)
+        rays = len(self.ray_offsets)
+        x = agents.x
+        y = agents.y
+        angle = agents.angle
+        hit_distances = np.full((count, rays), np.inf)
+        hit_types = np.full((count, rays), -1, dtype=np.int8)
+
+        # Candidate pairs: every agent j within reach of agent i's cone
+        self.index.update(x, y, agents.alive)
+        casting = agents.alive if sensing is None else agents.alive & sensing
+        i, j, dx, dy, distances = self.candidates(x, y, angle, casting)
+
+        # The rays that can hit each candidate are the ones whose direction lies within
+        # the candidate's angular radius of its bearing: only those get intersected
+        bearing = np.arctan2(dy, dx) - angle[i]
+        bearing -= 2 * np.pi * np.round(bearing / (2 * np.pi)) # Within [-pi, pi]
+        apart = distances > AGENT_RADIUS
+        angular_radius = np.full(distances.size, np.pi) # An agent overlapping i covers every direction
+        angular_radius[apart] = np.arcsin(AGENT_RADIUS / distances[apart])
+        # Candidates wholly outside the field of view can't be hit by any ray
+        in_view = np.flatnonzero(np.abs(bearing) <= self.field_of_view / 2 + angular_radius)
+        i, j, distances, bearing, angular_radius = i[in_view], j[in_view], distances[in_view], bearing[in_view], angular_radius[in_view]
+        # Candidates straddling the direction straight behind i are also checked a turn over
+        straddling = np.abs(bearing) + angular_radius > np.pi
+        i = np.concatenate((i, i[straddling]))
+        j = np.concatenate((j, j[straddling]))
+        distances = np.concatenate((distances, distances[straddling]))
+        angular_radius = np.concatenate((angular_radius, angular_radius[straddling]))
+        bearing = np.concatenate((bearing, bearing[straddling] - 2 * np.pi * np.sign(bearing[straddling])))
+        first_ray = np.ceil((bearing - angular_radius - self.ray_offsets[0]) / self.ray_spacing).astype(np.int64)
+        last_ray = np.floor((bearing + angular_radius - self.ray_offsets[0]) / self.ray_spacing).astype(np.int64)
+        first_ray = np.maximum(first_ray, 0)
+        last_ray = np.minimum(last_ray, rays - 1)
+        ray_counts = np.maximum(last_ray - first_ray + 1, 0)
+        total = int(ray_counts.sum())
+        if not total:
+            return hit_distances, hit_types
+
+        # One entry per (candidate, ray) combination
+        pair = np.repeat(np.arange(i.size), ray_counts)
+        ray = np.repeat(first_ray, ray_counts) + (np.arange(total) - np.repeat(np.cumsum(ray_counts) - ray_counts, ray_counts))
+        i, j, distances, bearing = i[pair], j[pair], distances[pair], bearing[pair]
+
+        # Distance along the ray to where it enters the candidate's circle (0 when overlapping)
+        offset = self.ray_offsets[ray] - bearing
+        along = distances * np.cos(offset)
+        across = distances * np.sin(offset)
+        distance = np.maximum(along - np.sqrt(np.maximum(AGENT_RADIUS * AGENT_RADIUS - across * across, 0)), 0)
+        hits = distance <= self.vision_range
+        i, j, ray, distance = i[hits], j[hits], ray[hits], distance[hits]
+
+        # Keep the nearest hit per (agent, ray)
+        key = i * rays + ray
+        np.minimum.at(hit_distances.ravel(), key, distance)
+        nearest = np.flatnonzero(distance == hit_distances.ravel()[key])
+        # Of several agents hit at the very same distance, the first candidate wins
+        key, first = np.unique(key[nearest], return_index=True)
+        hit_types.ravel()[key] = agents.type[j[nearest[first]]]
+        return hit_distances, hit_types
+
+    def sense(self, agents, sensing=None):
+        """
+        Computes the brain inputs of every agent: for each ray, the closeness of
+        the first agent hit (1 at contact, 0 at the vision range or with no hit)
+        and whether it is prey or a predator.
+        With the optional sensing mask, only those agents' inputs are computed.
+        Returns an array of shape (agent count, 3 * rays).
+        """
+        hit_distances, hit_types = self.cast(agents, sensing)
+        inputs = np.zeros((len(agents), len(self.ray_offsets), 3), dtype=np.float32)
+        inputs[:, :, 0] = np.maximum(1 - hit_distances / self.vision_range, 0)
+        inputs[:, :, 1] = hit_types == PREY_TYPE
+        inputs[:, :, 2] = hit_types == PREDATOR_TYPE
+        return inputs.reshape(len(agents), -1)
+
+# Sensors available to brains, by name
+SENSORS = {
+    NearestSensor.name: NearestSensor,
+    RaySensor.name: RaySensor,
+}
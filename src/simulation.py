@@ -1,12 +1,32 @@
+import time
 import pygame
-import random
+import numpy as np
 from constants import *
-from agent import Agent
+from world import World
+from config import Config
+from recording import Replay
+from streaming import StreamClient
+from render import AgentRenderer
+from text import TextCache
+from metrics import Metrics
+from profiler import Profiler
 
 class Simulation:
-    def __init__(self):
+    """
+    The pygame front end: renders a World and handles camera, selection and UI input.
+    The screen layout comes from a Config; without a world, one is created from it too.
+    """
+    def __init__(self, world=None, config=None):
+        config = config if config is not None else Config()
+        self.world = world if world is not None else World.from_config(config)
+        map_width, map_height = self.world.map_width, self.world.map_height
+        if (map_width, map_height) != (config.map_width, 2 * config.half_height):
+            # Zoom limits follow the world actually shown
+            config = config.replace(map_size=map_width, map_height=map_height if map_height != map_width else None)
+        self.config = config
+
         pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.screen = pygame.display.set_mode((config.screen_width, config.screen_height))
         pygame.display.set_caption("Predator-Prey Simulation")
         self.clock = pygame.time.Clock()
         self.running = True
@@ -14,7 +34,7 @@ class Simulation:
         # Camera state
         self.camera_x = 0
         self.camera_y = 0
-        self.zoom_level = MIN_ZOOM_LEVEL # Start at the new max zoom-out level
+        self.zoom_level = config.min_zoom_level # Start fully zoomed out
 
         # Variables for click-and-drag panning
         self.dragging = False
@@ -22,47 +42,70 @@ class Simulation:
         self.mouse_world_x = 0 # New: Stores mouse X position in world coordinates
         self.mouse_world_y = 0 # New: Stores mouse Y position in world coordinates
 
-        # Font for metadata display
-        self.font = pygame.font.Font(None, 20) # Default font, size 24
+        # Shared fonts and cached text surfaces for the metadata panel and agent IDs
+        self.text = TextCache()
 
         # Speed control state
         self.current_speed_index = INITIAL_SPEED_INDEX
         self.current_speed_multiplier = SPEED_MULTIPLIERS[self.current_speed_index]
         self.show_grid = False # New: Toggle for grid display
+
+        # Fixed-timestep loop state
+        self.step_accumulator = 0.0 # Simulation steps owed to real time
+        self.skipped_frames = 0 # Consecutive frames not rendered because stepping fell behind
+        self.steps_per_second = 0.0 # Achieved steps per second, sampled about once a second
+        self.steps_since_sample = 0
+        self.last_sample_time = time.perf_counter()
+        self.frames_since_sample = 0
+        self.frames_per_second = 0.0 # Achieved rendered frames per second
+
+        # Per-phase timings of the main loop, shown in an overlay toggled with P
+        self.profiler = Profiler()
+        self.show_profiler = False
+        self.profiler_refresh_time = 0.0 # When the overlay was last redrawn
         
         # Speed control button properties
         self.speed_button_rect = pygame.Rect(
-            SIM_TOTAL_DISPLAY_WIDTH, # Center button in panel
-            SCREEN_HEIGHT - 30 - 16, # 50 pixels from bottom
+            config.total_display_width, # Center button in panel
+            config.screen_height - 30 - 16, # 50 pixels from bottom
             109, 30 # Button width and height
         )
         self.grid_button_rect = pygame.Rect(
-            SIM_TOTAL_DISPLAY_WIDTH + 117, # Offset to the right of speed button
-            SCREEN_HEIGHT - 30 - 16, # Same vertical position as speed button
+            config.total_display_width + 117, # Offset to the right of speed button
+            config.screen_height - 30 - 16, # Same vertical position as speed button
             109, 30 # Button width and height
         )
 
-        self.agents = []
+        self.agents = self.world.agents
+        self.replay = isinstance(self.world, Replay) # Playing back a recording instead of simulating
+        self.remote = isinstance(self.world, StreamClient) # Showing a stream from a remote simulation
+        # Population statistics for the sparkline (not available when replaying or remote)
+        self.metrics = None
+        if not self.replay and not self.remote:
+            if self.world.metrics is None:
+                self.world.metrics = Metrics()
+            self.metrics = self.world.metrics
         self.selected_agent = None
-        self.initialize_agents()
+        self.renderer = AgentRenderer(config.content_width, config.content_height, self.text)
         self.clamp_camera() # Clamp camera position immediately after initialization
 
-    def initialize_agents(self):
-        """
-        Places agents randomly on the 128x128 map.
-        The map ranges from -MAP_SIZE/2 to +MAP_SIZE/2 for both X and Y.
-        """
-        # Reset agent ID counter for fresh simulations
-        Agent._next_id = 0 
-        for _ in range(PREY_COUNT):
-            x = random.uniform(-MAP_SIZE / 2, MAP_SIZE / 2)
-            y = random.uniform(-MAP_SIZE / 2, MAP_SIZE / 2)
-            self.agents.append(Agent(x, y, 'prey', GREEN, PREY_SPEED))
-
-        for _ in range(PREDATOR_COUNT):
-            x = random.uniform(-MAP_SIZE / 2, MAP_SIZE / 2)
-            y = random.uniform(-MAP_SIZE / 2, MAP_SIZE / 2)
-            self.agents.append(Agent(x, y, 'predator', RED, PREDATOR_SPEED))
+        # Persistent surfaces, only redrawn when their inputs change
+        self.first_frame = True
+        self.content_rect = pygame.Rect(config.area_padding, config.area_padding, config.content_width, config.content_height)
+        self.content_surface = pygame.Surface(self.content_rect.size)
+        self.content_key = None
+        self.grid_surface = pygame.Surface(self.content_rect.size, pygame.SRCALPHA)
+        self.grid_key = None
+        self.panel_rect = pygame.Rect(config.total_display_width, 0, config.panel_width, config.screen_height)
+        self.panel_surface = pygame.Surface(self.panel_rect.size)
+        self.panel_chrome_key = None
+        # Area of the panel holding the live text lines above the sparkline
+        self.panel_text_rect = pygame.Rect(config.total_display_width, PANEL_PADDING, config.panel_width, PANEL_TEXT_LINES * PANEL_LINE_HEIGHT)
+        self.sparkline_rect = pygame.Rect(config.total_display_width, self.panel_text_rect.bottom,
+                                          config.panel_width - PANEL_PADDING, SPARKLINE_HEIGHT)
+        self.sparkline_samples = None # Metrics sample count the sparkline was last drawn at
+        self.profiler_rect = pygame.Rect(config.total_display_width, self.sparkline_rect.bottom + PANEL_LINE_HEIGHT // 2,
+                                         config.panel_width, 9 * PROFILER_LINE_HEIGHT)
 
     def clamp_camera(self):
         """
@@ -70,16 +113,19 @@ class Simulation:
         The camera's center should not allow the visible area to go beyond the map edges.
         """
         # Calculate half the visible world width/height on screen, based on content area
-        half_visible_world_width = (SIM_CONTENT_WIDTH / 2) / self.zoom_level
-        half_visible_world_height = ((SCREEN_HEIGHT - 2 * SIM_AREA_PADDING) / 2) / self.zoom_level 
+        half_visible_world_width = self.config.half_content_width / self.zoom_level
+        half_visible_world_height = self.config.half_content_height / self.zoom_level
+
+        half_width = self.config.half_width
+        half_height = self.config.half_height
 
         # Calculate min/max camera X bounds
-        x_min_bound = -MAP_SIZE / 2 + half_visible_world_width
-        x_max_bound = MAP_SIZE / 2 - half_visible_world_width
+        x_min_bound = -half_width + half_visible_world_width
+        x_max_bound = half_width - half_visible_world_width
 
         # Calculate min/max camera Y bounds
-        y_min_bound = -MAP_SIZE / 2 + half_visible_world_height
-        y_max_bound = MAP_SIZE / 2 - half_visible_world_height
+        y_min_bound = -half_height + half_visible_world_height
+        y_max_bound = half_height - half_visible_world_height
 
         # If the visible area is wider/taller than the map, center the camera
         if x_min_bound > x_max_bound: # Map is smaller than visible area horizontally
@@ -97,15 +143,20 @@ class Simulation:
         Processes user input for camera movement (click-and-drag) and zoom.
         Also updates mouse world position and handles button clicks.
         """
+        config = self.config
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE: # Press ESC to quit
                     self.running = False
+                elif event.key == pygame.K_p: # Press P to toggle the profiler overlay
+                    self.show_profiler = not self.show_profiler
+                elif self.replay:
+                    self.handle_replay_key(event)
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 # Check if click is within the padded simulation area
-                if event.pos[0] < SIM_TOTAL_DISPLAY_WIDTH:
+                if event.pos[0] < config.total_display_width:
                     if event.button == 1:  # Left mouse button for dragging
                         self.dragging = True
                         self.last_mouse_pos = event.pos # Store current mouse position
@@ -119,7 +170,7 @@ class Simulation:
                     self.zoom_level /= ZOOM_FACTOR
                 
                 # Clamp zoom level to prevent extreme values
-                self.zoom_level = max(MIN_ZOOM_LEVEL, min(self.zoom_level, MAX_ZOOM_LEVEL))
+                self.zoom_level = max(config.min_zoom_level, min(self.zoom_level, config.max_zoom_level))
                 # Re-clamp camera position after zoom, as bounds change
                 self.clamp_camera() 
 
@@ -140,19 +191,15 @@ class Simulation:
                 mouse_x_screen, mouse_y_screen = event.pos
 
                 # Only convert if mouse is within the simulation area
-                if mouse_x_screen >= SIM_AREA_PADDING and \
-                   mouse_x_screen < SIM_TOTAL_DISPLAY_WIDTH - SIM_AREA_PADDING and \
-                   mouse_y_screen >= SIM_AREA_PADDING and \
-                   mouse_y_screen < SCREEN_HEIGHT - SIM_AREA_PADDING:
-                    
+                if self.content_rect.collidepoint(mouse_x_screen, mouse_y_screen):
                     # Convert screen coordinates (relative to padded content area) to world coordinates
                     # 1. Adjust for padding offset
-                    adjusted_mouse_x = mouse_x_screen - SIM_AREA_PADDING
-                    adjusted_mouse_y = mouse_y_screen - SIM_AREA_PADDING
+                    adjusted_mouse_x = mouse_x_screen - config.area_padding
+                    adjusted_mouse_y = mouse_y_screen - config.area_padding
 
-                    # 2. Adjust for screen center offset (relative to SIM_CONTENT_WIDTH/SCREEN_HEIGHT)
-                    relative_x = adjusted_mouse_x - SIM_CONTENT_WIDTH / 2
-                    relative_y = adjusted_mouse_y - (SCREEN_HEIGHT - 2 * SIM_AREA_PADDING) / 2
+                    # 2. Adjust for screen center offset (relative to the content area's centre)
+                    relative_x = adjusted_mouse_x - config.half_content_width
+                    relative_y = adjusted_mouse_y - config.half_content_height
 
                     # 3. Scale by zoom level
                     self.mouse_world_x = relative_x / self.zoom_level + self.camera_x
@@ -174,116 +221,267 @@ class Simulation:
                     self.last_mouse_pos = current_mouse_pos # Update last mouse position
                     self.clamp_camera() # Clamp camera position after panning
 
+    def handle_replay_key(self, event):
+        """
+        Scrubs through a replay: Left/Right step one frame (REPLAY_SEEK_STEPS steps with Shift),
+        Page Up/Down jump a tenth of the recording, Home/End go to the start/end.
+        """
+        replay = self.world
+        step = replay.step_count
+        seek_steps = REPLAY_SEEK_STEPS if event.mod & pygame.KMOD_SHIFT else 1
+        page_steps = max(1, (replay.last_step - replay.first_step) // 10)
+
+        if event.key == pygame.K_RIGHT:
+            replay.seek(step + seek_steps if seek_steps > 1 else replay.next_step())
+        elif event.key == pygame.K_LEFT:
+            replay.seek(step - seek_steps)
+        elif event.key == pygame.K_PAGEDOWN:
+            replay.seek(step + page_steps)
+        elif event.key == pygame.K_PAGEUP:
+            replay.seek(step - page_steps)
+        elif event.key == pygame.K_HOME:
+            replay.seek(replay.first_step)
+        elif event.key == pygame.K_END:
+            replay.seek(replay.last_step)
+
     def select_agent(self, mouse_pos):
         """
-        Selects an agent based on mouse position.
-        This is a placeholder for future functionality.
+        Selects the agent nearest to a click on the simulation area, within 30
+        screen pixels, or clears the selection if there is none.
         """
-        # Convert mouse position to world coordinates
+        # Convert the mouse position (relative to the padded content area) to world coordinates
+        config = self.config
         mouse_x, mouse_y = mouse_pos
-        relative_x = (mouse_x - SIM_CONTENT_WIDTH / 2) / self.zoom_level + self.camera_x
-        relative_y = (mouse_y - (SCREEN_HEIGHT - 2 * SIM_AREA_PADDING) / 2) / self.zoom_level + self.camera_y
+        relative_x = (mouse_x - config.area_padding - config.half_content_width) / self.zoom_level + self.camera_x
+        relative_y = (mouse_y - config.area_padding - config.half_content_height) / self.zoom_level + self.camera_y
         click_range = 30 / self.zoom_level  # Click range scales with zoom level
 
-        # Check if any agent is close to the clicked position
-        for agent in self.agents:
-            # check distance to agent's position
-            distance = ((agent.x - relative_x) ** 2 + (agent.y - relative_y) ** 2) ** 0.5
-            if distance < click_range:
-                self.selected_agent = agent
-                return
+        # Pick the agent nearest to the clicked position, if any is close enough
+        indices, distances = self.world.spatial.query_knn(relative_x, relative_y, 1, max_radius=click_range)
+        if indices.size and distances[0] < click_range:
+            self.selected_agent = self.agents.view(indices[0])
+            return
         
         self.selected_agent = None  # Reset selection if no agent is close enough
 
+    def refresh_selection(self):
+        """
+        Follows the selected agent after its slot changed hands: a replay frame
+        stores agents in a different order, and a dead agent's slot is reused.
+        Drops the selection once the agent is gone.
+        """
+        if self.selected_agent is None or self.selected_agent.alive:
+            return
+        found = np.flatnonzero((self.agents.id == self.selected_agent.identity) & self.agents.alive)
+        self.selected_agent = self.agents.view(found[0]) if found.size else None
+
     def update(self):
         """
-        Updates the state of all agents, including movement, direction changes, and boundary looping.
-        """
-        for agent in self.agents:
-            # Update direction periodically
-            agent.direction_change_timer -= 1
-            if agent.direction_change_timer <= 0:
-                agent.update_direction()
-                agent.direction_change_timer = DIRECTION_CHANGE_INTERVAL
-
-            agent.move()
-
-            # Implement toroidal (looping) boundaries
-            # If agent goes beyond right edge, wrap to left
-            if agent.x > MAP_SIZE / 2:
-                agent.x = -MAP_SIZE / 2
-            # If agent goes beyond left edge, wrap to right
-            elif agent.x < -MAP_SIZE / 2:
-                agent.x = MAP_SIZE / 2
-            
-            # If agent goes beyond top edge, wrap to bottom
-            if agent.y > MAP_SIZE / 2:
-                agent.y = -MAP_SIZE / 2
-            # If agent goes beyond bottom edge, wrap to top
-            elif agent.y < -MAP_SIZE / 2:
-                agent.y = MAP_SIZE / 2
+        Advances the world by one simulation step.
+        """
+        self.world.update()
 
     def draw(self):
         """
-        Clears the screen and draws all agents and map boundaries,
-        then draws the metadata panel.
+        Redraws the parts of the screen whose inputs changed since the last frame,
+        then pushes only those dirty rectangles to the display.
         """
-        # Clear the entire screen first with the background color for the simulation panel
-        self.screen.fill(BACKGROUND_COLOR) 
-
-        self.draw_panel()
-        self.draw_simulation() # Draw the simulation area with agents
-        self.draw_grid() # Draw grid if enabled 
-
-        pygame.display.flip() # Update the full display Surface to the screen
+        dirty_rects = []
+        self.refresh_selection()
+        self.update_observers()
+
+        # The padding around the simulation area never changes, so the whole
+        # screen only needs clearing once
+        if self.first_frame:
+            self.screen.fill(BACKGROUND_COLOR)
+            dirty_rects.append(self.screen.get_rect())
+            self.first_frame = False
+
+        # The simulation area only changes when the world steps or the view changes
+        selected_index = self.selected_agent.index if self.selected_agent else None
+        content_key = (self.world.step_count, self.camera_x, self.camera_y, self.zoom_level, self.show_grid, selected_index)
+        if content_key != self.content_key:
+            self.content_key = content_key
+            with self.profiler.span('draw_simulation'):
+                self.draw_simulation() # Draw the simulation area with agents
+            with self.profiler.span('draw_grid'):
+                self.draw_grid() # Draw grid if enabled 
+            self.screen.blit(self.content_surface, self.content_rect)
+            dirty_rects.append(self.content_rect)
+
+        with self.profiler.span('draw_panel'):
+            dirty_rects.extend(self.draw_panel())
+
+        with self.profiler.span('display'):
+            pygame.display.update(dirty_rects) # Only update the changed parts of the display
+        self.frames_since_sample += 1
+
+    def update_observers(self):
+        """
+        Tells the world's chunk grid which part of the map is on screen, so idle
+        chunks in view are stepped every step. Zoomed out to the per-chunk view,
+        individual agents can't be seen, so nothing is watched.
+        A remote stream is subscribed to the part of the map on screen instead.
+        """
+        if self.replay:
+            return
+        half_visible_width = self.config.half_content_width / self.zoom_level
+        half_visible_height = self.config.half_content_height / self.zoom_level
+        view = (self.camera_x - half_visible_width, self.camera_y - half_visible_height,
+                self.camera_x + half_visible_width, self.camera_y + half_visible_height)
+        if self.remote:
+            self.world.subscribe(view)
+        else:
+            self.world.chunks.observers = [view] if self.zoom_level >= LOD_ZOOM_LEVEL else []
 
     def draw_simulation(self):
         """
-        Draws the simulation area, including agents and map boundaries.
+        Draws the agents into the persistent simulation content surface, or the
+        per-chunk density heatmap when zoomed out past LOD_ZOOM_LEVEL.
         This method is called within the main draw loop.
         """
-        # Create a surface for the simulation content (map and agents)
-        simulation_content_surface = pygame.Surface((SIM_CONTENT_WIDTH, SCREEN_HEIGHT - 2 * SIM_AREA_PADDING)) # Adjusted height for padding
-        simulation_content_surface.fill(BLACK) # Fill background of the content area
-
-        # Draw agents on the simulation_content_surface
-        for agent in self.agents:
-            # Pass the content surface for drawing, and the camera/zoom info
-            # Agent's draw method now correctly assumes surface's (0,0) is its top-left
-            agent.draw(simulation_content_surface, self.camera_x, self.camera_y, self.zoom_level)
-
-            # if an agent is selected, draw a border around it
-            if self.selected_agent and agent.id == self.selected_agent.id:
-                # Draw a border around the selected agent
-                screen_x = int((agent.x - self.camera_x) * self.zoom_level + SIM_CONTENT_WIDTH / 2)
-                screen_y = int((agent.y - self.camera_y) * self.zoom_level + (SCREEN_HEIGHT - 2 * SIM_AREA_PADDING) / 2)
-                screen_radius = int(agent.radius * self.zoom_level)
-                pygame.draw.circle(simulation_content_surface, GOLD, (screen_x, screen_y), screen_radius + 2, 2)
-        
-        # Blit (copy) the simulation_content_surface onto the main screen, offset by padding
-        self.screen.blit(simulation_content_surface, (SIM_AREA_PADDING, SIM_AREA_PADDING))
+        self.content_surface.fill(BLACK) # Fill background of the content area
+        if self.zoom_level < LOD_ZOOM_LEVEL:
+            self.renderer.draw_heatmap(self.content_surface, self.world.chunks, self.agents,
+                                       self.camera_x, self.camera_y, self.zoom_level)
+            return
+
+        # Draw all agents in batches, culled against the camera rectangle
+        selected_index = self.selected_agent.index if self.selected_agent else None
+        self.renderer.draw(self.content_surface, self.agents, self.camera_x, self.camera_y, self.zoom_level, selected_index)
+
+    def draw_panel_chrome(self, speed_hover, grid_hover):
+        """
+        Redraws the static parts of the metadata panel (background, static labels
+        and buttons) into the persistent panel surface.
+        """
+        panel = self.panel_surface
+        panel.fill(BACKGROUND_COLOR)
+
+        # Static labels shown in place of the selected agent's info
+        if not self.selected_agent:
+            no_selection_text = self.text.render("No agent selected", WHITE, PANEL_FONT_SIZE)
+            panel.blit(no_selection_text, (0, PANEL_PADDING + PANEL_SELECTION_LINE * PANEL_LINE_HEIGHT))
+            no_selection_text = self.text.render("Right click to select agent", WHITE, PANEL_FONT_SIZE)
+            panel.blit(no_selection_text, (0, PANEL_PADDING + (PANEL_SELECTION_LINE + 1) * PANEL_LINE_HEIGHT))
+
+        # --- Draw NN Stuff --- (the profiler overlay takes its place when shown)
+        if not self.show_profiler:
+            nn_text = self.text.render("NN Stuff", WHITE, PANEL_FONT_SIZE)
+            panel.blit(nn_text, (0, self.sparkline_rect.bottom + PANEL_LINE_HEIGHT // 2))
+
+        # --- Draw Speed Control Button ---
+        speed_button_rect = self.speed_button_rect.move(-self.config.total_display_width, 0)
+        pygame.draw.rect(panel, BUTTON_HOVER_COLOR if speed_hover else BUTTON_COLOR, speed_button_rect)
+        if self.current_speed_multiplier == MAX_SPEED:
+            speed_label = "Max Speed"
+        else:
+            speed_label = f"{self.current_speed_multiplier}x Speed"
+        speed_button_text = self.text.render(speed_label, WHITE, PANEL_FONT_SIZE)
+        panel.blit(speed_button_text, speed_button_text.get_rect(center=speed_button_rect.center))
+
+        # --- Draw Grid Toggle Button ---
+        grid_button_rect = self.grid_button_rect.move(-self.config.total_display_width, 0)
+        pygame.draw.rect(panel, BUTTON_HOVER_COLOR if grid_hover else BUTTON_COLOR, grid_button_rect)
+        grid_button_text = self.text.render("Toggle Grid", WHITE, PANEL_FONT_SIZE)
+        panel.blit(grid_button_text, grid_button_text.get_rect(center=grid_button_rect.center))
 
     def draw_panel(self):
         """
         Draws the metadata panel on the right side of the screen.
+        The static chrome is only redrawn when its inputs change; every frame the
+        text area is restored from it and the live values are drawn on top.
+        Returns the screen rectangles that changed.
+        """
+        # Redraw the panel chrome if a button or the selection state changed
+        mouse_pos = pygame.mouse.get_pos()
+        speed_hover = self.speed_button_rect.collidepoint(mouse_pos)
+        grid_hover = self.grid_button_rect.collidepoint(mouse_pos)
+        chrome_key = (self.current_speed_multiplier, speed_hover, grid_hover, self.selected_agent is None, self.show_profiler)
+        if chrome_key != self.panel_chrome_key:
+            self.panel_chrome_key = chrome_key
+            self.draw_panel_chrome(speed_hover, grid_hover)
+            self.screen.blit(self.panel_surface, self.panel_rect)
+            self.draw_panel_text() # The live values sit on top of the chrome just blitted
+            self.draw_sparkline()
+            self.draw_profiler()
+            return [self.panel_rect]
+
+        # Restore the text area from the chrome before drawing the live values
+        self.screen.blit(self.panel_surface, self.panel_text_rect, self.panel_text_rect.move(-self.config.total_display_width, 0))
+        self.draw_panel_text()
+        dirty_rects = [self.panel_text_rect]
+
+        # The sparkline only changes when a new sample comes in
+        if self.metrics and self.metrics.samples != self.sparkline_samples:
+            self.draw_sparkline()
+            dirty_rects.append(self.sparkline_rect)
+
+        # The profiler overlay is refreshed a few times a second
+        if self.show_profiler and time.perf_counter() - self.profiler_refresh_time >= PROFILER_REFRESH_INTERVAL:
+            self.draw_profiler()
+            dirty_rects.append(self.profiler_rect)
+        return dirty_rects
+
+    def draw_profiler(self):
+        """
+        Draws the profiler overlay: rolling p50/p99 per main loop phase, the
+        achieved FPS against the target, and the achieved steps per second.
+        """
+        if not self.show_profiler:
+            return
+        self.profiler_refresh_time = time.perf_counter()
+        rect = self.profiler_rect
+        self.screen.blit(self.panel_surface, rect, rect.move(-self.config.total_display_width, 0))
+
+        # Phase name, p50 and p99 columns
+        columns = (rect.x, rect.x + 130, rect.x + 185)
+        rows = [("Phase", "p50 ms", "p99 ms")]
+        for phase, histogram in self.profiler.histograms.items():
+            rows.append((phase, f"{histogram.percentile(0.5) * 1000:.2f}", f"{histogram.percentile(0.99) * 1000:.2f}"))
+        for line, row in enumerate(rows):
+            for x, value in zip(columns, row):
+                value_text = self.text.render(value, WHITE, PROFILER_FONT_SIZE)
+                self.screen.blit(value_text, (x, rect.y + line * PROFILER_LINE_HEIGHT))
+
+        line = len(rows)
+        for value in (f"FPS: {self.frames_per_second:.1f} / {self.config.fps}", f"Steps/s: {self.steps_per_second:.0f}"):
+            value_text = self.text.render(value, WHITE, PROFILER_FONT_SIZE)
+            self.screen.blit(value_text, (rect.x, rect.y + line * PROFILER_LINE_HEIGHT))
+            line += 1
+
+    def draw_sparkline(self):
         """
-        metadata_padding = 16 # Padding for the metadata panel content
-        metadata_panel_rect = pygame.Rect(SIM_TOTAL_DISPLAY_WIDTH, 0, METADATA_PANEL_WIDTH, SCREEN_HEIGHT)
-        pygame.draw.rect(self.screen, BACKGROUND_COLOR, metadata_panel_rect)
+        Draws the prey and predator populations over the buffered metric samples,
+        scaled to the largest population in the window.
+        """
+        if not self.metrics:
+            return
+        self.sparkline_samples = self.metrics.samples
+        rect = self.sparkline_rect
+        self.screen.blit(self.panel_surface, rect, rect.move(-self.config.total_display_width, 0))
+        prey = self.metrics.series('prey')
+        predators = self.metrics.series('predators')
+        if len(prey) < 2:
+            return
 
-        # Draw an inner rectangle with padding for content within the metadata panel
-        metadata_inner_rect = pygame.Rect(
-            SIM_TOTAL_DISPLAY_WIDTH, # Offset by total simulation width + padding
-            metadata_padding,
-            METADATA_PANEL_WIDTH - 2 * metadata_padding,
-            SCREEN_HEIGHT - 2 * metadata_padding
-        )
+        # One point per pixel column at most
+        picked = np.linspace(0, len(prey) - 1, min(len(prey), rect.width)).astype(np.int64)
+        scale = (rect.height - 1) / max(int(prey.max()), int(predators.max()), 1)
+        xs = (rect.x + np.linspace(0, rect.width - 1, len(picked))).astype(np.int64).tolist()
+        for series, color in ((prey, GREEN), (predators, RED)):
+            ys = (rect.bottom - 1 - series[picked] * scale).astype(np.int64).tolist()
+            pygame.draw.lines(self.screen, color, False, list(zip(xs, ys)))
 
+    def draw_panel_text(self):
+        """
+        Draws the live values of the metadata panel.
+        """
         # --- Render Metadata Text ---
-        # Calculate text positions within the metadata_inner_rect
-        text_start_x = metadata_inner_rect.x
-        text_start_y = metadata_inner_rect.y
-        line_height = 20
+        # Calculate text positions within the panel's text area
+        text_start_x = self.panel_text_rect.x
+        text_start_y = self.panel_text_rect.y
+        line_height = PANEL_LINE_HEIGHT
         current_line = 0
 
         # Current Runtime
@@ -294,134 +492,190 @@ class Simulation:
         minutes = (total_milliseconds % 3600000) // 60000
         seconds = (total_milliseconds % 60000) // 1000
         milliseconds = total_milliseconds % 1000
-        runtime_text = self.font.render(f"Runtime: {hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}", True, WHITE)
+        runtime_text = self.text.render(f"Runtime: {hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}", WHITE, PANEL_FONT_SIZE)
         self.screen.blit(runtime_text, (text_start_x, text_start_y + current_line * line_height))
         current_line += 1
 
         # Current Zoom Level
-        zoom_text = self.font.render(f"Zoom: {self.zoom_level:.2f}x", True, WHITE)
+        zoom_text = self.text.render(f"Zoom: {self.zoom_level:.2f}x", WHITE, PANEL_FONT_SIZE)
         self.screen.blit(zoom_text, (text_start_x, text_start_y + current_line * line_height))
         current_line += 1
 
         # Mouse Position (World Coordinates)
-        mouse_pos_text = self.font.render(f"Mouse: ({self.mouse_world_x:.1f}, {self.mouse_world_y:.1f})", True, WHITE)
+        mouse_pos_text = self.text.render(f"Mouse: ({self.mouse_world_x:.1f}, {self.mouse_world_y:.1f})", WHITE, PANEL_FONT_SIZE)
         self.screen.blit(mouse_pos_text, (text_start_x, text_start_y + current_line * line_height))
         current_line += 1
+
+        # Achieved simulation speed
+        steps_text = self.text.render(f"Steps/s: {self.steps_per_second:.0f}", WHITE, PANEL_FONT_SIZE)
+        self.screen.blit(steps_text, (text_start_x, text_start_y + current_line * line_height))
+        current_line += 1
         current_line += 1 # Add an extra line for spacing
 
         # Total Agent Count
-        total_agents = len(self.agents)
-        total_text = self.font.render(f"Total Agents: {total_agents}", True, WHITE)
+        total_agents = self.agents.population
+        total_text = self.text.render(f"Total Agents: {total_agents}", WHITE, PANEL_FONT_SIZE)
         self.screen.blit(total_text, (text_start_x, text_start_y + current_line * line_height))
         current_line += 1
 
         # Count of Prey
-        prey_count = sum(1 for agent in self.agents if agent.type == 'prey')
-        prey_text = self.font.render(f"Prey: {prey_count}", True, GREEN)
+        prey_count = self.agents.count_type(PREY_TYPE)
+        prey_text = self.text.render(f"Prey: {prey_count}", GREEN, PANEL_FONT_SIZE)
         self.screen.blit(prey_text, (text_start_x, text_start_y + current_line * line_height))
         current_line += 1
 
         # Count of Predators
-        predator_count = sum(1 for agent in self.agents if agent.type == 'predator')
-        predator_text = self.font.render(f"Predators: {predator_count}", True, RED)
+        predator_count = self.agents.count_type(PREDATOR_TYPE)
+        predator_text = self.text.render(f"Predators: {predator_count}", RED, PANEL_FONT_SIZE)
         self.screen.blit(predator_text, (text_start_x, text_start_y + current_line * line_height))
         current_line += 1
         current_line += 1
 
-        # Selected Agent Info
+        # Selected Agent Info (the "No agent selected" labels are part of the chrome)
         if self.selected_agent:
-            selected_text = self.font.render(f"ID: {self.selected_agent.id}", True, WHITE)
+            selected_text = self.text.render(f"ID: {self.selected_agent.id}", WHITE, PANEL_FONT_SIZE)
             self.screen.blit(selected_text, (text_start_x, text_start_y + current_line * line_height))
             current_line += 1
 
             # Display selected agent's type and position
-            agent_type_text = self.font.render(f"Type: {self.selected_agent.type.capitalize()}", True, WHITE)
+            agent_type_text = self.text.render(f"Type: {self.selected_agent.type.capitalize()}", WHITE, PANEL_FONT_SIZE)
             self.screen.blit(agent_type_text, (text_start_x, text_start_y + current_line * line_height))
             current_line += 1
 
-            position_text = self.font.render(f"Pos: ({self.selected_agent.x:.2f}, {self.selected_agent.y:.2f})", True, WHITE)
+            position_text = self.text.render(f"Pos: ({self.selected_agent.x:.2f}, {self.selected_agent.y:.2f})", WHITE, PANEL_FONT_SIZE)
             self.screen.blit(position_text, (text_start_x, text_start_y + current_line * line_height))
             current_line += 1
 
-            speed_text = self.font.render(f"Speed: {self.selected_agent.speed:.2f}", True, WHITE)
+            speed_text = self.text.render(f"Speed: {self.selected_agent.speed:.2f}", WHITE, PANEL_FONT_SIZE)
             self.screen.blit(speed_text, (text_start_x, text_start_y + current_line * line_height))
             current_line += 1
 
-            angle_text = self.font.render(f"Angle: {self.selected_agent.angle:.2f} rad", True, WHITE)
+            angle_text = self.text.render(f"Angle: {self.selected_agent.angle:.2f} rad", WHITE, PANEL_FONT_SIZE)
             self.screen.blit(angle_text, (text_start_x, text_start_y + current_line * line_height))
             current_line += 1
-            current_line += 1
-        else:
-            no_selection_text = self.font.render("No agent selected", True, WHITE)
-            self.screen.blit(no_selection_text, (text_start_x, text_start_y + current_line * line_height))
-            current_line += 1
-            no_selection_text = self.font.render("Right click to select agent", True, WHITE)
-            self.screen.blit(no_selection_text, (text_start_x, text_start_y + current_line * line_height))
-            current_line += 1
-            current_line += 1
-            current_line += 1
-            current_line += 1
-            current_line += 1
-
-        # --- Draw NN Stuff ---
-        angle_text = self.font.render(f"NN Stuff", True, WHITE)
-        self.screen.blit(angle_text, (text_start_x, text_start_y + current_line * line_height))
-        current_line += 1
-
-        # --- Draw Speed Control Button ---
-        mouse_pos = pygame.mouse.get_pos()
-        button_color = BUTTON_HOVER_COLOR if self.speed_button_rect.collidepoint(mouse_pos) else BUTTON_COLOR
-        pygame.draw.rect(self.screen, button_color, self.speed_button_rect)
-        speed_button_text = self.font.render(f"{self.current_speed_multiplier}x Speed", True, WHITE)
-        speed_text_rect = speed_button_text.get_rect(center=self.speed_button_rect.center)
-        self.screen.blit(speed_button_text, speed_text_rect)
-
-        # --- Draw Grid Toggle Button ---
-        grid_button_color = BUTTON_HOVER_COLOR if self.grid_button_rect.collidepoint(mouse_pos) else BUTTON_COLOR
-        pygame.draw.rect(self.screen, grid_button_color, self.grid_button_rect)
-        grid_button_text = self.font.render("Toggle Grid", True, WHITE)
-        grid_text_rect = grid_button_text.get_rect(center=self.grid_button_rect.center)
-        self.screen.blit(grid_button_text, grid_text_rect)
 
     def draw_grid(self):
         """
         Draws a grid overlay on the simulation area if enabled.
-        The grid is drawn relative to the camera position and zoom level.
+        The grid is drawn relative to the camera position and zoom level, and is only
+        redrawn into its persistent surface when the camera or zoom changes.
         """
         if not self.show_grid:
             return
-        
-        grid_surface = pygame.Surface((SIM_CONTENT_WIDTH, SCREEN_HEIGHT - 2 * SIM_AREA_PADDING), pygame.SRCALPHA)
-        color = (255, 255, 255, 20)
-        grid_spacing = 16
 
-        # add vertical grid lines
-        for x in range(int(-MAP_SIZE / 2), int(MAP_SIZE / 2) + grid_spacing, grid_spacing):
-            screen_x = int((x - self.camera_x) * self.zoom_level + SIM_CONTENT_WIDTH / 2)
-            pygame.draw.line(grid_surface, color, (screen_x, 0), (screen_x, SCREEN_HEIGHT - 2 * SIM_AREA_PADDING))
+        grid_key = (self.camera_x, self.camera_y, self.zoom_level)
+        if grid_key != self.grid_key:
+            self.grid_key = grid_key
+            grid_surface = self.grid_surface
+            grid_surface.fill((0, 0, 0, 0))
+            color = (255, 255, 255, 20)
+            grid_spacing = GRID_CELL_SIZE
+
+            config = self.config
 
-        # add horizontal grid lines
-        for y in range(int(-MAP_SIZE / 2), int(MAP_SIZE / 2) + grid_spacing, grid_spacing):
-            screen_y = int((y - self.camera_y) * self.zoom_level + (SCREEN_HEIGHT - 2 * SIM_AREA_PADDING) / 2)
-            pygame.draw.line(grid_surface, color, (0, screen_y), (SIM_CONTENT_WIDTH, screen_y))
+            # add vertical grid lines
+            for x in self.grid_lines(self.camera_x, config.half_width, config.half_content_width, grid_spacing):
+                screen_x = int((x - self.camera_x) * self.zoom_level + config.half_content_width)
+                pygame.draw.line(grid_surface, color, (screen_x, 0), (screen_x, config.content_height))
 
-        # add to screen
-        self.screen.blit(grid_surface, (SIM_AREA_PADDING, SIM_AREA_PADDING))
+            # add horizontal grid lines
+            for y in self.grid_lines(self.camera_y, config.half_height, config.half_content_height, grid_spacing):
+                screen_y = int((y - self.camera_y) * self.zoom_level + config.half_content_height)
+                pygame.draw.line(grid_surface, color, (0, screen_y), (config.content_width, screen_y))
+
+        # add to the simulation content
+        self.content_surface.blit(self.grid_surface, (0, 0))
+
+    def grid_lines(self, camera, half_map, half_content, spacing):
+        """
+        Returns the world coordinates of the grid lines along one axis that are on
+        screen, so large maps don't draw thousands of lines out of view.
+        """
+        half_visible = half_content / self.zoom_level
+        first = max(int((camera - half_visible + half_map) // spacing), 0)
+        last = min(int((camera + half_visible + half_map) // spacing), int(2 * half_map // spacing))
+        return [-half_map + line * spacing for line in range(first, last + 1)]
 
     def run(self):
         """
         Main game loop.
+        Uses a fixed-timestep accumulator: at 1x the world advances FPS steps per
+        second of real time, so a multiplier of k runs about k steps per rendered
+        frame. Stepping gets at most one frame's time budget; when the simulation
+        falls behind, rendering is skipped for a few frames before the backlog is dropped.
         """
+        fps = self.config.fps
+        frame_time = self.config.frame_time
+        last_time = time.perf_counter()
+        input_span = self.profiler.span('handle_input')
+        update_span = self.profiler.span('update')
         while self.running:
-            # pause if the speed multiplier is 0
-            if self.current_speed_multiplier == 0:
+            with input_span:
                 self.handle_input()
+
+            frame_start = time.perf_counter()
+            elapsed = frame_start - last_time
+            last_time = frame_start
+            budget_end = frame_start + frame_time
+
+            if self.current_speed_multiplier == 0:
+                # Paused: keep drawing the UI, and sleep out the rest of the frame instead of spinning
+                self.step_accumulator = 0.0
+                self.draw()
+                self.clock.tick(fps)
+                continue
+
+            if self.current_speed_multiplier == MAX_SPEED:
+                # Unlimited: step for the whole frame budget, then render once
+                steps = 0
+                while True:
+                    with update_span:
+                        self.update()
+                    steps += 1
+                    if time.perf_counter() >= budget_end:
+                        break
+                behind = False
+            else:
+                self.step_accumulator += elapsed * fps * self.current_speed_multiplier
+                steps_due = int(self.step_accumulator)
+                steps = 0
+                while steps < steps_due:
+                    with update_span:
+                        self.update()
+                    steps += 1
+                    if time.perf_counter() >= budget_end:
+                        break
+                self.step_accumulator -= steps
+                behind = steps < steps_due
+
+            self.count_steps(steps)
+
+            # Skip rendering while the simulation is behind, but never for too many frames in a row
+            if behind and self.skipped_frames < MAX_SKIPPED_FRAMES:
+                self.skipped_frames += 1
                 continue
-            
-            self.handle_input()
-            self.update()
-            # The clock.tick() call is now scaled by the current_speed_multiplier
-            self.clock.tick(FPS * self.current_speed_multiplier) 
+            if behind:
+                # Still behind after skipping frames: drop the backlog so the simulation slows down instead
+                self.step_accumulator -= int(self.step_accumulator)
+            self.skipped_frames = 0
+
             self.draw()
+            if self.current_speed_multiplier != MAX_SPEED:
+                self.clock.tick(fps) # Sleep out the rest of the frame
 
         pygame.quit()
+
+    def count_steps(self, steps):
+        """
+        Tracks the number of simulation steps run, and refreshes the achieved
+        steps and frames per second about once a second.
+        """
+        self.steps_since_sample += steps
+        now = time.perf_counter()
+        sample_time = now - self.last_sample_time
+        if sample_time >= 1.0:
+            self.steps_per_second = self.steps_since_sample / sample_time
+            self.frames_per_second = self.frames_since_sample / sample_time
+            self.steps_since_sample = 0
+            self.frames_since_sample = 0
+            self.last_sample_time = now
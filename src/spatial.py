@@ -0,0 +1,365 @@
+import math
+import numpy as np
+from constants import *
+
+def map_extent(map_size):
+    """
+    Returns the (width, height) of a map given as one side length (a square map)
+    or as a (width, height) pair.
+    """
+    if np.ndim(map_size):
+        width, height = map_size
+        return width, height
+    return map_size, map_size
+
+def index_for_population(index, map_size, count, min_cell_size, max_cell_size):
+    """
+    Returns a spatial index whose cells hold about one agent when count agents
+    are spread over the map, within the given cell size bounds.
+    The given index (which may be None) is reused unless the population has grown
+    or shrunk so much that its cell size is off by more than a factor of two.
+    """
+    width, height = map_extent(map_size)
+    cell_size = np.sqrt(width * height / max(count, 1))
+    cell_size = min(max(cell_size, min_cell_size), max_cell_size)
+    if index is None or not 0.5 < index.cell_size / cell_size < 2:
+        index = SpatialHash(map_size, cell_size)
+    return index
+
+def brute_force_nearest(px, py, x, y, map_size, max_radius):
+    """
+    Finds, for every query point, the nearest of the given positions within
+    max_radius on the toroidal map, by measuring every pair.
+    Cheaper than building an index when there are only a few of either.
+    Returns (indices into x and y, distances), with -1 and inf for queries with no match.
+    """
+    width, height = map_extent(map_size)
+    if not len(x):
+        return np.full(len(px), -1, dtype=np.int64), np.full(len(px), np.inf)
+    # Wrapped offsets and squared distances, one row per query
+    dx = x[None, :] - px[:, None]
+    dx -= width * np.round(dx / width)
+    dy = y[None, :] - py[:, None]
+    dy -= height * np.round(dy / height)
+    squared = dx * dx + dy * dy
+    nearest = np.argmin(squared, axis=1)
+    best = squared[np.arange(len(px)), nearest]
+    found = best <= max_radius * max_radius
+    return np.where(found, nearest, -1), np.where(found, np.sqrt(best), np.inf)
+
+class SpatialHash:
+    """
+    Uniform-grid spatial index over the toroidal world.
+    Agents are bucketed into cells of roughly GRID_CELL_SIZE world units.
+    The index is kept as agent indices sorted by cell plus the start offset of each
+    cell, so neighbour queries only look at the handful of cells around a point.
+    The offsets are kept in a dense per-cell table when the grid is small next to
+    the number of agents, and only for the occupied cells otherwise, so a huge and
+    mostly empty map costs memory and time per agent rather than per cell.
+    """
+
+    def __init__(self, map_size=MAP_SIZE, cell_size=GRID_CELL_SIZE):
+        self.map_size = map_size
+        self.target_cell_size = cell_size # As asked for: the actual cells are stretched to fit the map
+        self.width, self.height = map_extent(map_size)
+        self.half_width = self.width / 2
+        self.half_height = self.height / 2
+        # Use a whole number of cells along each side so the grid wraps exactly with the map
+        self.cells_x = max(1, int(self.width // cell_size))
+        self.cells_y = max(1, int(self.height // cell_size))
+        self.cell_width = self.width / self.cells_x
+        self.cell_height = self.height / self.cells_y
+        self.cell_size = max(self.cell_width, self.cell_height)
+        self.min_cell_size = min(self.cell_width, self.cell_height) # Searching a ring of cells covers at least this much
+        self.cell_count = self.cells_x * self.cells_y
+
+        self.x = np.empty(0, dtype=np.float64)
+        self.y = np.empty(0, dtype=np.float64)
+        self.cells = np.empty(0, dtype=np.int64)       # Cell index of each agent
+        self.order = np.empty(0, dtype=np.int64)       # Agent indices sorted by cell
+        self.indexed_count = 0                         # Leading entries of order that are indexed
+        self.cell_start = None                         # Dense table: offset of each cell in order
+        self.occupied = np.empty(0, dtype=np.int64)    # Sparse table: occupied cells, sorted...
+        self.occupied_start = np.zeros(1, dtype=np.int64) # ...and the offset of each in order
+
+    def cell_coords(self, x, y):
+        """
+        Returns the (column, row) grid coordinates of the given world positions.
+        """
+        cx = (np.floor((np.asarray(x) + self.half_width) / self.cell_width).astype(np.int64)) % self.cells_x
+        cy = (np.floor((np.asarray(y) + self.half_height) / self.cell_height).astype(np.int64)) % self.cells_y
+        return cx, cy
+
+    def update(self, x, y, included=None, moved=None):
+        """
+        Updates the index for the current agent positions.
+        If an included mask is given, only those agents are indexed: the others
+        (dead slots, or agents of another type) are sorted past the last cell, where
+        no query ever looks. This keeps the number of entries constant as agents
+        come and go, so the fast incremental path below still applies.
+        If a moved mask is given, only those agents can have changed position or
+        inclusion since the last update, and the cells of the others are kept.
+        Only agents that crossed into another cell change the bucket order. Since
+        most agents stay in their cell between steps, the previous order is almost
+        sorted already and re-sorting it is close to linear.
+        """
+        self.x = x
+        self.y = y
+        if moved is not None and len(x) == len(self.cells):
+            changed = np.flatnonzero(moved)
+            cx, cy = self.cell_coords(x[changed], y[changed])
+            cells = self.cells.copy()
+            cells[changed] = cy * self.cells_x + cx
+            if included is not None:
+                cells[changed[~included[changed]]] = self.cell_count
+        else:
+            cx, cy = self.cell_coords(x, y)
+            cells = cy * self.cells_x + cx
+            if included is not None:
+                cells[~included] = self.cell_count
+
+        if len(cells) != len(self.cells):
+            # Agents were added or removed: rebuild from scratch
+            self.order = np.argsort(cells, kind='stable')
+        elif np.array_equal(cells, self.cells):
+            return # Nobody changed cell, the index is still valid
+        else:
+            # Stable sort of the nearly sorted previous order
+            self.order = self.order[np.argsort(cells[self.order], kind='stable')]
+
+        self.cells = cells
+        self.indexed_count = int(np.count_nonzero(cells < self.cell_count))
+        if self.cell_count <= SPATIAL_DENSE_CELLS_PER_AGENT * max(len(cells), 1):
+            if self.cell_start is None:
+                self.cell_start = np.zeros(self.cell_count + 1, dtype=np.int64)
+            self.cell_start[1:] = np.cumsum(np.bincount(cells, minlength=self.cell_count + 1)[:self.cell_count])
+        else:
+            # The order is sorted by cell, so each occupied cell is one run of it
+            self.cell_start = None
+            sorted_cells = cells[self.order[:self.indexed_count]]
+            run_starts = np.flatnonzero(np.concatenate(([True], sorted_cells[1:] != sorted_cells[:-1])))
+            if not sorted_cells.size:
+                run_starts = run_starts[:0]
+            self.occupied = sorted_cells[run_starts]
+            self.occupied_start = np.append(run_starts, self.indexed_count)
+
+    def cell_ranges(self, cells):
+        """
+        Returns (starts, counts): where the agents of each of the given cells start
+        in order, and how many there are.
+        """
+        if self.cell_start is not None:
+            starts = self.cell_start[cells]
+            return starts, self.cell_start[cells + 1] - starts
+        if not self.occupied.size:
+            return np.zeros(np.shape(cells), dtype=np.int64), np.zeros(np.shape(cells), dtype=np.int64)
+        position = np.minimum(np.searchsorted(self.occupied, cells), self.occupied.size - 1)
+        starts = self.occupied_start[position]
+        counts = np.where(self.occupied[position] == cells, self.occupied_start[position + 1] - starts, 0)
+        return starts, counts
+
+    def occupied_cells(self):
+        """
+        Returns (cells, counts) for every cell holding at least one indexed agent.
+        """
+        if self.cell_start is not None:
+            counts = np.diff(self.cell_start)
+            cells = np.flatnonzero(counts)
+            return cells, counts[cells]
+        return self.occupied, np.diff(self.occupied_start)
+
+    def wrapped_dx(self, a, b):
+        """
+        Returns the shortest signed X offset from b to a on the toroidal map.
+        """
+        return (a - b + self.half_width) % self.width - self.half_width
+
+    def wrapped_dy(self, a, b):
+        """
+        Returns the shortest signed Y offset from b to a on the toroidal map.
+        """
+        return (a - b + self.half_height) % self.height - self.half_height
+
+    def _cells_around(self, x, y, ring_x, ring_y):
+        """
+        Returns the indices of all cells within the given number of cells
+        (along each axis) of the cell containing the point (x, y).
+        """
+        cx, cy = self.cell_coords(x, y)
+        # A ring wider than the grid would visit the same cells twice
+        columns = np.unique((int(cx) + np.arange(-ring_x, ring_x + 1)) % self.cells_x)
+        rows = np.unique((int(cy) + np.arange(-ring_y, ring_y + 1)) % self.cells_y)
+        return (rows[:, None] * self.cells_x + columns[None, :]).ravel()
+
+    def _agents_in_cells(self, cells):
+        """
+        Returns the indices of all agents bucketed in the given cells.
+        """
+        starts, counts = self.cell_ranges(cells)
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # Ragged arange: positions starts[i] .. starts[i] + counts[i] - 1 for every cell
+        group_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(starts, counts) + (np.arange(total) - group_offsets)
+        return self.order[positions]
+
+    def _distances(self, indices, x, y):
+        dx = self.wrapped_dx(self.x[indices], x)
+        dy = self.wrapped_dy(self.y[indices], y)
+        return np.hypot(dx, dy)
+
+    def query_radius(self, x, y, radius):
+        """
+        Returns (indices, distances) of every agent within the given radius of (x, y),
+        measured across the toroidal wrap.
+        """
+        ring_x = int(math.ceil(radius / self.cell_width))
+        ring_y = int(math.ceil(radius / self.cell_height))
+        candidates = self._agents_in_cells(self._cells_around(x, y, ring_x, ring_y))
+        distances = self._distances(candidates, x, y)
+        within = distances <= radius
+        return candidates[within], distances[within]
+
+    def query_knn(self, x, y, k, max_radius=None):
+        """
+        Returns (indices, distances) of the k agents nearest to (x, y), sorted by distance.
+        The search grows ring by ring from the cell containing the point, and stops
+        once the k nearest found so far are closer than any unvisited cell could be.
+        If max_radius is given, agents farther away than it are ignored.
+        """
+        max_ring = max(self.cells_x, self.cells_y) // 2 + 1
+        if max_radius is not None:
+            max_ring = min(max_ring, int(math.ceil(max_radius / self.min_cell_size)))
+
+        ring = 1
+        while True:
+            candidates = self._agents_in_cells(self._cells_around(x, y, ring, ring))
+            distances = self._distances(candidates, x, y)
+            if max_radius is not None:
+                within = distances <= max_radius
+                candidates, distances = candidates[within], distances[within]
+
+            # Every agent closer than `ring` cells has been visited at this point
+            searched_radius = ring * self.min_cell_size
+            if ring >= max_ring or \
+               (len(candidates) >= k and np.partition(distances, k - 1)[k - 1] <= searched_radius):
+                nearest = np.argsort(distances, kind='stable')[:k]
+                return candidates[nearest], distances[nearest]
+            ring += 1
+
+    def batch_nearest(self, px, py, max_radius, exclude=None):
+        """
+        Finds, for many query points at once, the nearest indexed agent within max_radius.
+        Each query searches outward ring by ring from its own cell, and drops out as
+        soon as its best match is closer than any cell not yet visited could be, so
+        the work per query tracks local density rather than the search radius.
+        If exclude is given, the query at position q never matches agent exclude[q]
+        (used to keep agents from finding themselves).
+        Returns (indices, distances), with -1 and inf for queries with no match.
+        """
+        best_index = np.full(len(px), -1, dtype=np.int64)
+        best_distance = np.full(len(px), np.inf)
+
+        # Distance from each query point to the nearest border of its own cell
+        offset_x = np.mod(px + self.half_width, self.cell_width)
+        offset_y = np.mod(py + self.half_height, self.cell_height)
+        margin = np.minimum(np.minimum(offset_x, self.cell_width - offset_x),
+                            np.minimum(offset_y, self.cell_height - offset_y))
+        query_cx, query_cy = self.cell_coords(px, py)
+
+        active = np.arange(len(px))
+        max_ring = min(int(math.ceil(max_radius / self.min_cell_size)), max(self.cells_x, self.cells_y) // 2)
+        for ring in range(max_ring + 1):
+            # Cells on the perimeter of this ring (only the center cell for ring 0)
+            span = np.arange(-ring, ring + 1)
+            if ring == 0:
+                ring_x, ring_y = np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+            else:
+                inner = span[1:-1]
+                ring_x = np.concatenate((span, span, np.full(inner.size, -ring), np.full(inner.size, ring)))
+                ring_y = np.concatenate((np.full(span.size, -ring), np.full(span.size, ring), inner, inner))
+
+            # Every (active query, ring cell) combination, searched in one batch
+            cells = (((query_cy[active][:, None] + ring_y[None, :]) % self.cells_y) * self.cells_x +
+                     (query_cx[active][:, None] + ring_x[None, :]) % self.cells_x).ravel()
+            starts, counts = self.cell_ranges(cells)
+            total = int(counts.sum())
+            if total:
+                # Pair every active query with every agent in its ring cells
+                group_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+                queries = np.repeat(np.repeat(active, ring_x.size), counts)
+                candidates = self.order[np.repeat(starts, counts) + (np.arange(total) - group_offsets)]
+                distances = np.hypot(self.wrapped_dx(self.x[candidates], px[queries]),
+                                     self.wrapped_dy(self.y[candidates], py[queries]))
+                if exclude is not None:
+                    distances[candidates == exclude[queries]] = np.inf
+
+                # Keep the closest candidate per query (candidates are grouped by query)
+                group_starts = np.flatnonzero(np.concatenate(([True], queries[1:] != queries[:-1])))
+                group_minimum = np.minimum.reduceat(distances, group_starts)
+                group_sizes = np.diff(np.append(group_starts, total))
+                closest = np.flatnonzero(distances == np.repeat(group_minimum, group_sizes))
+                closest = closest[np.concatenate(([True], queries[closest[1:]] != queries[closest[:-1]]))]
+                queries, candidates, distances = queries[closest], candidates[closest], distances[closest]
+                better = distances < best_distance[queries]
+                best_index[queries[better]] = candidates[better]
+                best_distance[queries[better]] = distances[better]
+
+            # Queries whose best match is closer than any unvisited cell are done
+            searched_radius = margin[active] + ring * self.min_cell_size
+            active = active[best_distance[active] > searched_radius]
+            if not active.size:
+                break
+
+        too_far = best_distance > max_radius
+        best_index[too_far] = -1
+        best_distance[too_far] = np.inf
+        return best_index, best_distance
+
+    def neighbour_pairs(self, radius):
+        """
+        Returns (i, j, distances) for every ordered pair of distinct agents within
+        the given radius of each other, computed for all agents at once.
+        Intended for interaction code (catching, sensing) that needs every neighbour
+        of every agent; the cost scales with local density rather than agent count squared.
+        """
+        # A ring wider than the grid would repeat cells
+        ring_x = int(math.ceil(radius / self.cell_width))
+        ring_y = int(math.ceil(radius / self.cell_height))
+        offsets_x = np.unique(np.arange(-ring_x, ring_x + 1) % self.cells_x)
+        offsets_y = np.unique(np.arange(-ring_y, ring_y + 1) % self.cells_y)
+
+        indexed = self.order[:self.indexed_count] # Leaves out agents excluded from the index
+        agent_cells = self.cells[indexed]
+        cx = agent_cells % self.cells_x
+        cy = agent_cells // self.cells_x
+
+        pairs_i = []
+        pairs_j = []
+        pairs_d = []
+        for ox in offsets_x:
+            for oy in offsets_y:
+                neighbour_cells = ((cy + oy) % self.cells_y) * self.cells_x + (cx + ox) % self.cells_x
+                starts, counts = self.cell_ranges(neighbour_cells)
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+
+                # Pair every agent (in cell order) with every agent in its neighbouring cell
+                group_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+                i = np.repeat(indexed, counts)
+                j = self.order[np.repeat(starts, counts) + (np.arange(total) - group_offsets)]
+
+                dx = self.wrapped_dx(self.x[j], self.x[i])
+                dy = self.wrapped_dy(self.y[j], self.y[i])
+                distances = np.hypot(dx, dy)
+                keep = (distances <= radius) & (i != j)
+                pairs_i.append(i[keep])
+                pairs_j.append(j[keep])
+                pairs_d.append(distances[keep])
+
+        if not pairs_i:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float64)
+        return np.concatenate(pairs_i), np.concatenate(pairs_j), np.concatenate(pairs_d)
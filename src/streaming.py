@@ -0,0 +1,557 @@
+import asyncio
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from constants import *
+from recording import ReplayAgents
+from spatial import SpatialHash, map_extent
+from chunks import ChunkGrid
+
+# --- Stream Protocol ---
+# A TCP client opens with STREAM_MAGIC; after that, messages in both directions are
+# a message header (payload size, message kind) followed by the payload. WebSocket
+# clients connect with a regular upgrade request instead, and every binary WebSocket
+# message is a kind byte followed by the payload (text messages from the client are
+# viewport requests).
+#
+#   hello      server -> client, JSON: map size, species speeds, frame rate, agent cap
+#   viewport   client -> server, JSON: {"viewport": [left, top, right, bottom]} or null for everything
+#   frame      server -> client, binary (frame_zlib: the same, zlib-compressed)
+#
+# A frame is a frame header (step, frame type, column encodings, agent count, new agent
+# count, living agents per type) followed by the agents in the client's viewport, sorted
+# by ID. Positions are quantized to uint16 across the map, angles to uint8 turns, and
+# every column is unpadded.
+#
+#   keyframe   id (uint32), x, y (uint16), angle, type (uint8) of every agent
+#   delta      a bitmask (np.packbits) of which agents of the previous frame are kept,
+#              the columns above for the new agents, then the changes of the kept
+#              agents' x, y and angle, each omitted when nothing changed
+#
+# Deltas are taken modulo the column's range, so they are exact: the client always
+# ends up with the same quantized values the server sent.
+STREAM_MAGIC = b'PPSTREAM'
+MESSAGE_HEADER = struct.Struct('<IB')
+MESSAGE_HELLO = 0
+MESSAGE_VIEWPORT = 1
+MESSAGE_FRAME = 2
+MESSAGE_FRAME_ZLIB = 3
+FRAME_HEADER = struct.Struct('<qBBxx' + 'I' * (2 + len(AGENT_TYPE_NAMES)))
+KEYFRAME = 0
+DELTA = 1
+# Encodings of a delta's kept columns, 2 bits per column in the frame header
+UNCHANGED = 0
+DELTA_INT8 = 1
+DELTA_INT16 = 2
+DELTA_COLUMNS = ('x', 'y', 'angle')
+AGENT_COLUMNS = (('id', np.uint32), ('x', np.uint16), ('y', np.uint16), ('angle', np.uint8), ('type', np.uint8))
+COLUMN_RANGES = {'x': 1 << 16, 'y': 1 << 16, 'angle': 1 << 8}
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+def quantize(map_width, map_height, x, y, angle):
+    """
+    Returns the quantized positions (uint16 steps across the map) and angles
+    (uint8 steps per turn) of agents.
+    """
+    qx = np.clip(np.round((x + map_width / 2) * (65535 / map_width)), 0, 65535).astype(np.uint16)
+    qy = np.clip(np.round((y + map_height / 2) * (65535 / map_height)), 0, 65535).astype(np.uint16)
+    qangle = (np.round(np.mod(angle, 2 * np.pi) * (256 / (2 * np.pi))).astype(np.int64) & 0xFF).astype(np.uint8)
+    return qx, qy, qangle
+
+def dequantize(map_width, map_height, qx, qy, qangle):
+    x = qx.astype(np.float32) * np.float32(map_width / 65535) - np.float32(map_width / 2)
+    y = qy.astype(np.float32) * np.float32(map_height / 65535) - np.float32(map_height / 2)
+    angle = qangle.astype(np.float32) * np.float32(2 * np.pi / 256)
+    return x, y, angle
+
+class StreamState:
+    """
+    The quantized state of a set of agents, sorted by ID: what a client last received.
+    """
+
+    def __init__(self, step, columns, type_counts):
+        self.step = step
+        self.columns = columns # Column name -> quantized array, see AGENT_COLUMNS
+        self.type_counts = type_counts # Living agents per type in the whole world
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def select(self, keep):
+        return StreamState(self.step, {name: column[keep] for name, column in self.columns.items()}, self.type_counts)
+
+def encode_frame(state, previous):
+    """
+    Encodes a state as a frame: a delta against the previous state the client
+    holds, or a keyframe if there is none (or the delta wouldn't be smaller).
+    Returns the frame's bytes.
+    """
+    count = len(state)
+    key_size = FRAME_HEADER.size + count * sum(np.dtype(dtype).itemsize for _, dtype in AGENT_COLUMNS)
+    if previous is not None:
+        ids = state.columns['id']
+        previous_ids = previous.columns['id']
+        # Both ID columns are sorted, so membership is a binary search
+        position = np.minimum(np.searchsorted(ids, previous_ids), max(count - 1, 0))
+        kept = (ids[position] == previous_ids) if count else np.zeros(len(previous_ids), dtype=bool)
+        is_new = np.ones(count, dtype=bool)
+        is_new[position[kept]] = False
+        kept_now = ~is_new
+
+        parts = [np.packbits(kept).tobytes()]
+        parts.extend(state.columns[name][is_new].tobytes() for name, _ in AGENT_COLUMNS)
+        encodings = 0
+        for bit, name in enumerate(DELTA_COLUMNS):
+            change = (state.columns[name][kept_now].astype(np.int64) - previous.columns[name][kept].astype(np.int64)) % COLUMN_RANGES[name]
+            # Changes past half the range wrap around to negative ones
+            change[change >= COLUMN_RANGES[name] // 2] -= COLUMN_RANGES[name]
+            if not change.any():
+                encoding = UNCHANGED
+            elif name == 'angle' or (change.min() >= -128 and change.max() <= 127):
+                encoding = DELTA_INT8
+                parts.append(change.astype(np.int8).tobytes())
+            else:
+                encoding = DELTA_INT16
+                parts.append(change.astype(np.int16).tobytes())
+            encodings |= encoding << (2 * bit)
+        body = b''.join(parts)
+        if FRAME_HEADER.size + len(body) < key_size:
+            return FRAME_HEADER.pack(state.step, DELTA, encodings, count, int(is_new.sum()), *state.type_counts) + body
+
+    body = b''.join(state.columns[name].tobytes() for name, _ in AGENT_COLUMNS)
+    return FRAME_HEADER.pack(state.step, KEYFRAME, 0, count, count, *state.type_counts) + body
+
+def decode_frame(frame, previous):
+    """
+    Decodes a frame against the previous state (None before the first keyframe).
+    Returns the new state.
+    """
+    step, frame_type, encodings, count, new_count, *type_counts = FRAME_HEADER.unpack_from(frame, 0)
+    offset = FRAME_HEADER.size
+    if frame_type == DELTA:
+        if previous is None:
+            raise ValueError("delta frame received before any keyframe")
+        kept_bytes = (len(previous) + 7) // 8
+        kept = np.unpackbits(np.frombuffer(frame, dtype=np.uint8, count=kept_bytes, offset=offset), count=len(previous)).astype(bool)
+        offset += kept_bytes
+
+    columns = {}
+    for name, dtype in AGENT_COLUMNS:
+        columns[name] = np.frombuffer(frame, dtype=dtype, count=new_count, offset=offset)
+        offset += new_count * np.dtype(dtype).itemsize
+    if frame_type == KEYFRAME:
+        return StreamState(step, columns, type_counts)
+
+    kept_state = previous.select(kept)
+    kept_count = count - new_count
+    for bit, name in enumerate(DELTA_COLUMNS):
+        encoding = (encodings >> (2 * bit)) & 3
+        if encoding == UNCHANGED:
+            continue
+        dtype = np.int8 if encoding == DELTA_INT8 else np.int16
+        change = np.frombuffer(frame, dtype=dtype, count=kept_count, offset=offset)
+        offset += kept_count * np.dtype(dtype).itemsize
+        column = kept_state.columns[name]
+        kept_state.columns[name] = ((column.astype(np.int64) + change) % COLUMN_RANGES[name]).astype(column.dtype)
+
+    # Newcomers are merged back into ID order
+    merged = {name: np.concatenate((kept_state.columns[name], columns[name])) for name, _ in AGENT_COLUMNS}
+    order = np.argsort(merged['id'], kind='stable')
+    return StreamState(step, {name: column[order] for name, column in merged.items()}, type_counts)
+
+class TcpConnection:
+    """
+    A client connected over plain TCP, after its STREAM_MAGIC.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, kind, payload):
+        self.writer.write(MESSAGE_HEADER.pack(len(payload), kind) + payload)
+        await self.writer.drain()
+
+    async def receive(self):
+        size, kind = MESSAGE_HEADER.unpack(await self.reader.readexactly(MESSAGE_HEADER.size))
+        return kind, await self.reader.readexactly(size)
+
+class WebSocketConnection:
+    """
+    A client connected over WebSocket (RFC 6455), after the upgrade handshake.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    async def handshake(reader, writer, request_start):
+        """
+        Reads the rest of the HTTP upgrade request and accepts it.
+        """
+        request = request_start + await reader.readuntil(b'\r\n\r\n')
+        key = None
+        for line in request.decode('latin-1').split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'sec-websocket-key':
+                key = value.strip()
+        if key is None:
+            raise ConnectionError("not a WebSocket upgrade request")
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        await writer.drain()
+
+    async def send_frame(self, opcode, payload):
+        size = len(payload)
+        if size < 126:
+            header = struct.pack('!BB', 0x80 | opcode, size)
+        elif size < 1 << 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, size)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, size)
+        self.writer.write(header + payload)
+        await self.writer.drain()
+
+    async def send(self, kind, payload):
+        await self.send_frame(0x2, bytes((kind,)) + payload)
+
+    async def receive(self):
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode = first & 0x0F
+            size = second & 0x7F
+            if size == 126:
+                size = struct.unpack('!H', await self.reader.readexactly(2))[0]
+            elif size == 127:
+                size = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+            mask = await self.reader.readexactly(4) if second & 0x80 else bytes(4)
+            payload = np.frombuffer(await self.reader.readexactly(size), dtype=np.uint8)
+            payload = (payload ^ np.resize(np.frombuffer(mask, dtype=np.uint8), size)).tobytes()
+            if opcode == 0x8: # Close
+                raise ConnectionError("WebSocket closed by the client")
+            if opcode == 0x9: # Ping
+                await self.send_frame(0xA, payload)
+            elif opcode == 0x1: # Text: a viewport request
+                return MESSAGE_VIEWPORT, payload
+            elif opcode == 0x2 and payload:
+                return payload[0], payload[1:]
+
+class StreamSubscriber:
+    """
+    Server-side state of one connected client.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.viewport = None # (left, top, right, bottom) in world units, None for the whole map
+        self.state = None # StreamState the client holds
+        self.frames = 0 # Frames sent so far
+        self.wake = asyncio.Event() # Set when there is a newer snapshot to send
+        self.closed = False
+
+class StreamServer:
+    """
+    Publishes live frames of a world to any number of TCP and WebSocket clients.
+    The server runs its own asyncio event loop on a background thread. The stepping
+    thread only copies the living agents' columns, at most fps times per second,
+    only while someone is connected and only once the server thread has taken the
+    previous copy; quantizing, culling to each client's viewport and encoding happen
+    on the server thread. Each client gets the latest snapshot
+    whenever it is ready for more, so slow clients skip frames instead of queueing
+    them, and at most max_agents agents per frame (sampled by ID when the viewport
+    holds more), which keeps every viewer's bandwidth bounded.
+    """
+
+    def __init__(self, host=STREAM_HOST, port=STREAM_PORT, fps=STREAM_FPS, max_agents=STREAM_MAX_AGENTS,
+                 keyframe_interval=STREAM_KEYFRAME_INTERVAL):
+        self.host = host
+        self.port = port # 0 picks a free port, read back once started
+        self.fps = fps
+        self.max_agents = max_agents
+        self.keyframe_interval = keyframe_interval # Frames between keyframes sent to each client
+        self.clients = set()
+        self.latest = None # Latest StreamState of every living agent
+        self.pending = None # Snapshot handed over by the stepping thread, not published yet
+        self.last_publish = 0.0
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.error = None
+
+    def start(self, world):
+        """
+        Starts serving on a background thread. Raises OSError if the port can't be bound.
+        """
+        self.map_width, self.map_height = world.map_width, world.map_height
+        self.hello = json.dumps({
+            'map_size': [self.map_width, self.map_height],
+            'prey_speed': world.prey_speed,
+            'predator_speed': world.predator_speed,
+            'fps': self.fps,
+            'max_agents': self.max_agents,
+        }).encode()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.serve, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+        if self.error:
+            raise self.error
+
+    def serve(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self.handle_client, self.host, self.port))
+        except OSError as error:
+            self.error = error
+            ready.set()
+            return
+        self.port = self.server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_forever()
+
+        # Stopped by close(): hang up on the clients, let their handlers finish, then stop listening
+        self.server.close()
+        for client in self.clients:
+            client.closed = True
+            client.wake.set()
+            client.connection.writer.close()
+        tasks = asyncio.all_tasks(self.loop)
+        if tasks:
+            self.loop.run_until_complete(asyncio.wait(tasks, timeout=1))
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def close(self):
+        """
+        Disconnects every client and stops the server thread.
+        """
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    def after_step(self, world):
+        """
+        Hands a snapshot of the living agents to the server thread, when one is due
+        and anyone is watching. Never waits on the network, and skips the snapshot
+        while the server thread is still publishing the previous one, so a server
+        slower than the stepping never falls behind on stale snapshots.
+        """
+        if not self.clients or self.pending is not None:
+            return
+        now = time.perf_counter()
+        if now - self.last_publish < 1 / self.fps:
+            return
+        self.last_publish = now
+        agents = world.agents
+        living = np.flatnonzero(agents.alive)
+        self.pending = (world.step_count, agents.id[living], agents.x[living], agents.y[living],
+                        agents.angle[living], agents.type[living], agents.type_counts.tolist())
+        self.loop.call_soon_threadsafe(self.publish)
+
+    def publish(self):
+        """
+        Quantizes the pending snapshot into the latest state, and wakes every client.
+        """
+        step, ids, x, y, angle, types, type_counts = self.pending
+        order = np.argsort(ids, kind='stable')
+        qx, qy, qangle = quantize(self.map_width, self.map_height, x[order], y[order], angle[order])
+        columns = {'id': ids[order].astype(np.uint32), 'x': qx, 'y': qy, 'angle': qangle, 'type': types[order].astype(np.uint8)}
+        self.latest = StreamState(step, columns, type_counts)
+        self.pending = None # The stepping thread may hand over the next one
+        for client in self.clients:
+            client.wake.set()
+
+    def view(self, client):
+        """
+        Returns the part of the latest state a client receives: the agents in its
+        viewport, sampled down to max_agents.
+        """
+        state = self.latest
+        if client.viewport is not None:
+            # Culled in quantized units, against the viewport's corners
+            left, top, right, bottom = client.viewport
+            (qleft, qright), (qtop, qbottom), _ = quantize(self.map_width, self.map_height, np.array([left, right]),
+                                                           np.array([top, bottom]), np.zeros(2))
+            x, y = state.columns['x'], state.columns['y']
+            state = state.select(np.flatnonzero((x >= qleft) & (x <= qright) & (y >= qtop) & (y <= qbottom)))
+        if len(state) > self.max_agents:
+            # Sample by a hash of the ID, so the same agents stay in view from frame to frame
+            hashed = (state.columns['id'].astype(np.uint64) * np.uint64(2654435761)) % np.uint64(1 << 32)
+            keep = np.flatnonzero(hashed < np.uint64(int(self.max_agents / len(state) * (1 << 32))))
+            state = state.select(keep[:self.max_agents])
+        return state
+
+    async def handle_client(self, reader, writer):
+        try:
+            opening = await reader.readexactly(len(STREAM_MAGIC))
+            if opening == STREAM_MAGIC:
+                connection = TcpConnection(reader, writer)
+            elif opening.startswith(b'GET '):
+                await WebSocketConnection.handshake(reader, writer, opening)
+                connection = WebSocketConnection(reader, writer)
+            else:
+                writer.close()
+                return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+
+        client = StreamSubscriber(connection)
+        self.clients.add(client)
+        receiving = asyncio.ensure_future(self.receive_requests(client))
+        try:
+            await connection.send(MESSAGE_HELLO, self.hello)
+            if self.latest is not None:
+                client.wake.set()
+            while True:
+                await client.wake.wait()
+                client.wake.clear()
+                if client.closed:
+                    break
+                if self.latest is None:
+                    continue
+                state = self.view(client)
+                keyframe_due = client.frames % self.keyframe_interval == 0
+                frame = encode_frame(state, None if keyframe_due else client.state)
+                # Sending waits for the client to catch up; snapshots published meanwhile
+                # are skipped, not queued
+                if len(frame) > STREAM_COMPRESS_BYTES:
+                    await connection.send(MESSAGE_FRAME_ZLIB, zlib.compress(frame, STREAM_COMPRESSION_LEVEL))
+                else:
+                    await connection.send(MESSAGE_FRAME, frame)
+                client.state = state
+                client.frames += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.discard(client)
+            receiving.cancel()
+            writer.close()
+
+    async def receive_requests(self, client):
+        """
+        Reads a client's viewport requests until it disconnects.
+        """
+        try:
+            while True:
+                kind, payload = await client.connection.receive()
+                if kind == MESSAGE_VIEWPORT:
+                    viewport = json.loads(payload).get('viewport')
+                    client.viewport = tuple(float(value) for value in viewport) if viewport is not None else None
+                    client.wake.set()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, TypeError, AttributeError):
+            client.closed = True
+            client.wake.set()
+
+class StreamAgents(ReplayAgents):
+    """
+    The agents of the latest frame received from a stream.
+    Only the agents in the subscribed viewport are present, but the population
+    counts are the whole world's.
+    """
+
+    @property
+    def population(self):
+        return int(self.type_counts.sum())
+
+class StreamClient:
+    """
+    Stands in for a World in the pygame viewer, showing the frames of a StreamServer.
+    A background thread receives and decodes every frame; update() shows the latest
+    one. subscribe() tells the server which part of the map is on screen.
+    """
+
+    def __init__(self, host=STREAM_HOST, port=STREAM_PORT):
+        self.socket = socket.create_connection((host, port))
+        self.socket.sendall(STREAM_MAGIC)
+        kind, payload = self.receive_message()
+        if kind != MESSAGE_HELLO:
+            raise ConnectionError(f"{host}:{port} is not a simulation stream")
+        hello = json.loads(payload)
+        self.map_width, self.map_height = map_extent(hello['map_size'])
+        self.map_size = self.map_width if self.map_width == self.map_height else (self.map_width, self.map_height)
+        self.prey_speed = hello['prey_speed']
+        self.predator_speed = hello['predator_speed']
+
+        self.agents = StreamAgents(self.prey_speed, self.predator_speed)
+        self.spatial = SpatialHash(self.map_size)
+        self.chunks = ChunkGrid(self.map_size) # Only used for the zoomed-out view
+        self.step_count = 0
+        self.viewport = None
+        self.connected = True
+        self.latest = None # Latest decoded StreamState, swapped in by update()
+        self.shown = None
+        self.thread = threading.Thread(target=self.receive_frames, daemon=True)
+        self.thread.start()
+
+    def receive_exactly(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.socket.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("stream closed by the server")
+            data.extend(chunk)
+        return bytes(data)
+
+    def receive_message(self):
+        size, kind = MESSAGE_HEADER.unpack(self.receive_exactly(MESSAGE_HEADER.size))
+        return kind, self.receive_exactly(size)
+
+    def receive_frames(self):
+        state = None
+        try:
+            while True:
+                kind, payload = self.receive_message()
+                if kind == MESSAGE_FRAME_ZLIB:
+                    payload = zlib.decompress(payload)
+                elif kind != MESSAGE_FRAME:
+                    continue
+                state = decode_frame(payload, state)
+                self.latest = state
+        except (OSError, ValueError, zlib.error):
+            self.connected = False
+
+    def subscribe(self, viewport):
+        """
+        Asks the server for only the agents inside a (left, top, right, bottom) world rectangle.
+        """
+        if viewport == self.viewport or not self.connected:
+            return
+        self.viewport = viewport
+        message = json.dumps({'viewport': list(viewport) if viewport is not None else None}).encode()
+        try:
+            self.socket.sendall(MESSAGE_HEADER.pack(len(message), MESSAGE_VIEWPORT) + message)
+        except OSError:
+            self.connected = False
+
+    def update(self):
+        """
+        Shows the latest frame received, if it is new.
+        """
+        state = self.latest
+        if state is None or state is self.shown:
+            return
+        self.shown = state
+        agents = self.agents
+        columns = state.columns
+        agents.x, agents.y, agents.angle = dequantize(self.map_width, self.map_height, columns['x'], columns['y'], columns['angle'])
+        agents.id = columns['id']
+        agents.type = columns['type']
+        agents.count = len(state)
+        if len(agents.alive) != agents.count:
+            agents.alive = np.ones(agents.count, dtype=bool)
+        agents.type_counts = np.array(state.type_counts, dtype=np.int64)
+        self.step_count = state.step
+        self.spatial.update(agents.x.astype(np.float64), agents.y.astype(np.float64))
+
+    def close(self):
+        self.socket.close()
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+import pygame
+from constants import *
+
+class TextCache:
+    """
+    Caches fonts and rendered text surfaces.
+    One font is created per size and shared, and rendered surfaces are kept in a
+    bounded LRU keyed by (text, color, size), so labels that don't change between
+    frames are only rendered once. Numbers are drawn from cached digit glyphs.
+    """
+
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.fonts = {} # Font size -> shared pygame Font
+        self.surfaces = OrderedDict() # (text, color, size) -> rendered Surface, least recently used first
+
+    def font(self, size):
+        """
+        Returns the shared default font of the given size, creating it on first use.
+        """
+        font = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self.fonts[size] = font
+        return font
+
+    def render(self, text, color, size):
+        """
+        Returns the rendered surface for the given text, color and font size,
+        rendering it only if it isn't cached yet.
+        """
+        key = (text, color, size)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = self.font(size).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False) # Evict the least recently used surface
+        return surface
+
+    def blit_number(self, target, number, color, size, center):
+        """
+        Draws a non-negative integer centered on the given point by blitting one
+        cached glyph per digit, so no new text is rendered for unseen numbers.
+        """
+        glyphs = [self.render(digit, color, size) for digit in str(number)]
+        width = sum(glyph.get_width() for glyph in glyphs)
+        height = max(glyph.get_height() for glyph in glyphs)
+
+        x = center[0] - width // 2
+        y = center[1] - height // 2
+        blit_sequence = []
+        for glyph in glyphs:
+            blit_sequence.append((glyph, (x, y)))
+            x += glyph.get_width()
+        target.blits(blit_sequence, False)
@@ -0,0 +1,291 @@
+import numpy as np
+from constants import *
+from agent_store import AgentStore
+from spatial import SpatialHash, index_for_population, brute_force_nearest, map_extent
+from chunks import ChunkGrid
+from brain import Brain
+from sensors import SENSORS
+from profiler import span
+
+class World:
+    """
+    The world-stepping core of the simulation.
+    Holds the agents and advances them one step at a time, without any
+    dependency on pygame or a display, so it can run headless as fast as possible.
+    The map can be square (map_size is a number) or not (map_size is a (width, height)
+    pair). With idle_chunks, the agents of quiet regions of the map are stepped
+    less often, see ChunkGrid.
+    """
+
+    def __init__(self, prey_count=PREY_COUNT, predator_count=PREDATOR_COUNT, map_size=MAP_SIZE, seed=None,
+                 prey_speed=PREY_SPEED, predator_speed=PREDATOR_SPEED, direction_change_interval=DIRECTION_CHANGE_INTERVAL,
+                 ecosystem=True, idle_chunks=False, catch_distance=CATCH_DISTANCE, energy_per_step=ENERGY_PER_STEP,
+                 reproduction_energy=REPRODUCTION_ENERGY, max_population=MAX_POPULATION, pool_capacity=AGENT_POOL_CAPACITY):
+        self.prey_count = prey_count
+        self.predator_count = predator_count
+        self.map_size = tuple(map_size) if np.ndim(map_size) else map_size
+        self.map_width, self.map_height = map_extent(map_size)
+        self.seed = seed
+        self.prey_speed = prey_speed
+        self.predator_speed = predator_speed
+        self.direction_change_interval = direction_change_interval
+        self.ecosystem = ecosystem # Predation, energy, reproduction and death; without it agents only move
+        self.catch_distance = catch_distance
+        self.reproduction_energy = reproduction_energy
+        self.max_population = max_population
+        self.pool_capacity = pool_capacity # Initial agent slots, and the pool size compaction never goes below
+        self.reproduction = True # Evolution episodes turn births off, so every agent keeps its genome
+        self.compaction = True # Evolution episodes turn it off too, so every agent keeps its slot
+        self.step_count = 0
+        self.recorder = None # Optional Recorder that captures every step
+        self.checkpointer = None # Optional Checkpointer that periodically saves the world
+        self.metrics = None # Optional Metrics sampling population statistics
+        self.profiler = None # Optional Profiler timing the phases of each step
+        self.streamer = None # Optional StreamServer publishing live frames to remote viewers
+        self.partitioner = None # Optional Partitioner running the neighbour searches in worker processes
+        self.catch_count = 0 # Prey caught so far
+        self.brains = {} # Agent type -> Brain steering the agents of that species
+        self.sensor = None # Computes the brains' inputs
+        self.prey_index = None # Spatial index of the prey only, for predators looking for a catch
+        self.energy_per_step = np.array(energy_per_step) # Energy change per step, by agent type
+        self.idle_chunks = idle_chunks
+        self.chunks = ChunkGrid(self.map_size) # Region chunks, for idle stepping and the zoomed-out view
+
+        # Every world draws from its own seeded generator, never from the global random module
+        self.agents = AgentStore(self.map_size, np.random.default_rng(seed), direction_change_interval, pool_capacity,
+                                 reproduction_energy)
+        self.initialize_agents()
+
+        # Spatial index for neighbour queries, refreshed after every step
+        self.spatial = SpatialHash(self.map_size)
+        self.spatial.update(self.agents.x, self.agents.y, self.agents.alive)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Creates a world with the parameters of a Config.
+        """
+        map_size = config.map_size if config.map_height is None else (config.map_size, config.map_height)
+        return cls(config.prey_count, config.predator_count, map_size, config.seed, config.prey_speed,
+                   config.predator_speed, config.direction_change_interval, config.ecosystem, config.idle_chunks,
+                   config.catch_distance, config.energy_per_step, config.reproduction_energy, config.max_population,
+                   config.pool_capacity)
+
+    def initialize_agents(self):
+        """
+        Places agents randomly on the map.
+        The map ranges from -map_width/2 to +map_width/2 for X, and from
+        -map_height/2 to +map_height/2 for Y.
+        """
+        rng = self.agents.rng
+        half_width = self.map_width / 2
+        half_height = self.map_height / 2
+        self.agents.add(
+            rng.uniform(-half_width, half_width, self.prey_count),
+            rng.uniform(-half_height, half_height, self.prey_count),
+            PREY_TYPE, self.prey_speed
+        )
+        self.agents.add(
+            rng.uniform(-half_width, half_width, self.predator_count),
+            rng.uniform(-half_height, half_height, self.predator_count),
+            PREDATOR_TYPE, self.predator_speed
+        )
+
+    def update(self):
+        """
+        Updates the state of all agents, including movement, direction changes, and boundary looping,
+        then (with the ecosystem enabled) predation, energy, births and deaths.
+        The whole step runs as batch array operations in the agent store.
+        With idle chunks, only the agents advancing this step sense, hunt and
+        give birth; frozen agents are left as they are until they catch up.
+        """
+        profiler = self.profiler
+        steps = stepping = moved = None
+        if self.idle_chunks:
+            with span(profiler, 'chunks'):
+                steps = self.chunks.steps_due(self.agents, self.step_count)
+                stepping = moved = steps > 0
+        steered = None
+        if self.brains:
+            with span(profiler, 'steer'):
+                steered = self.steer(stepping)
+        with span(profiler, 'move'):
+            self.agents.step(steered, steps)
+        if self.ecosystem:
+            with span(profiler, 'hunt'):
+                self.hunt(stepping)
+            with span(profiler, 'metabolize'):
+                self.metabolize(steps)
+            if self.reproduction:
+                with span(profiler, 'reproduce'):
+                    self.reproduce(stepping)
+            # After a crash, stop stepping the slots of the dead
+            if self.compaction and self.agents.count > self.pool_capacity and self.agents.population < self.agents.count * POOL_COMPACT_FRACTION:
+                self.agents.compact()
+                moved = None # Agents changed slots
+        with span(profiler, 'spatial index'):
+            # Frozen agents neither move nor die, so their cells stay as they were
+            self.spatial.update(self.agents.x, self.agents.y, self.agents.alive, moved)
+        self.step_count += 1
+        if self.idle_chunks and self.chunks.review_due(self.step_count):
+            with span(profiler, 'chunks'):
+                self.chunks.border = self.chunk_border()
+                self.chunks.review(self.agents, self.step_count)
+        with span(profiler, 'observers'):
+            if self.recorder:
+                self.recorder.record(self.step_count, self.agents)
+            if self.metrics:
+                self.metrics.after_step(self)
+            if self.checkpointer:
+                self.checkpointer.after_step(self)
+            if self.streamer:
+                self.streamer.after_step(self)
+
+    def chunk_border(self):
+        """
+        Returns how close to its chunk's edge an agent keeps the chunk active: the
+        farthest agents interact across, plus how far two agents can travel
+        towards each other over an idle interval.
+        """
+        interaction = max(self.catch_distance, self.sensor.reach if self.sensor else 0)
+        travel = 2 * self.chunks.idle_interval * max(self.prey_speed, self.predator_speed)
+        return interaction + travel
+
+    def hunt(self, stepping=None):
+        """
+        Lets every predator catch the nearest prey its body touches.
+        A prey touched by several predators is eaten by only one of them.
+        Only the agents in the optional stepping mask take part: a whole chunk is
+        frozen or stepping at once, and frozen chunks are out of any other's reach.
+        """
+        agents = self.agents
+        prey = agents.alive & (agents.type == PREY_TYPE)
+        hunting = agents.alive & (agents.type == PREDATOR_TYPE)
+        if stepping is not None:
+            prey &= stepping
+            hunting &= stepping
+        predators = np.flatnonzero(hunting)
+        prey_count = int(np.count_nonzero(prey))
+        if not predators.size or not prey_count:
+            return
+
+        if predators.size * prey_count <= HUNT_BRUTE_FORCE_PAIRS and not self.partitioner:
+            # Too few to be worth indexing
+            targets = np.flatnonzero(prey)
+            caught, _ = brute_force_nearest(agents.x[predators], agents.y[predators], agents.x[targets], agents.y[targets],
+                                            self.map_size, self.catch_distance)
+            caught = np.where(caught >= 0, targets[np.maximum(caught, 0)], -1)
+        else:
+            caught = self.catch_targets(predators, prey, prey_count, stepping)
+
+        hunters = predators[caught >= 0]
+        if not hunters.size:
+            return
+        caught, first_hunter = np.unique(caught[caught >= 0], return_index=True)
+        agents.energy[hunters[first_hunter]] += CATCH_ENERGY
+        agents.catches[hunters[first_hunter]] += 1
+        self.catch_count += caught.size
+        self.kill(caught)
+
+    def catch_targets(self, predators, prey, prey_count, stepping=None):
+        """
+        Returns, for each of the given predator slots, the slot of the nearest prey
+        (of the prey mask) its body touches, or -1, searching a prey-only index.
+        """
+        agents = self.agents
+        # A prey-only index with cells sized to the prey population
+        self.prey_index = index_for_population(self.prey_index, self.map_size, prey_count,
+                                               self.catch_distance, max(self.map_width, self.map_height))
+        if self.partitioner:
+            return self.partitioner.catch_targets(predators, self.prey_index.target_cell_size, stepping)
+        self.prey_index.update(agents.x, agents.y, prey)
+        caught, _ = self.prey_index.batch_nearest(agents.x[predators], agents.y[predators], self.catch_distance)
+        return caught
+
+    def metabolize(self, steps=None):
+        """
+        Applies every agent's energy change for the step (or for the optional
+        per-agent number of steps), and kills the agents that ran out of energy.
+        """
+        agents = self.agents
+        if steps is None:
+            agents.energy += self.energy_per_step[agents.type]
+        else:
+            agents.energy += self.energy_per_step[agents.type] * steps
+        self.kill(np.flatnonzero(agents.alive & (agents.energy <= 0)))
+
+    def reproduce(self, stepping=None):
+        """
+        Every agent with enough energy splits it with a newborn of its species,
+        born at its position and inheriting its brain, up to max_population agents.
+        Only the agents in the optional stepping mask give birth.
+        """
+        agents = self.agents
+        ready = agents.alive & (agents.energy >= self.reproduction_energy)
+        if stepping is not None:
+            ready &= stepping
+        parents = np.flatnonzero(ready)
+        parents = parents[:max(self.max_population - agents.population, 0)]
+        if not parents.size:
+            return
+
+        agents.energy[parents] /= 2
+        children = agents.add(agents.x[parents], agents.y[parents], agents.type[parents],
+                              agents.speed[parents], agents.energy[parents])
+        for agent_type, brain in self.brains.items():
+            inheriting = (agents.type[parents] == agent_type) & (agents.brain_row[parents] >= 0)
+            rows = brain.inherit(agents.brain_row[parents[inheriting]], agents.rng)
+            agents.brain_row[children[inheriting]] = rows
+
+    def kill(self, slots):
+        """
+        Removes the agents in the given slots, freeing their slots and brain rows.
+        """
+        if not len(slots):
+            return
+        agents = self.agents
+        for agent_type, brain in self.brains.items():
+            dying = slots[(agents.type[slots] == agent_type) & (agents.brain_row[slots] >= 0)]
+            brain.release_rows(agents.brain_row[dying])
+        agents.remove(slots)
+
+    def attach_brains(self, hidden_sizes=BRAIN_HIDDEN_SIZES, agent_types=(PREY_TYPE, PREDATOR_TYPE), sensor='nearest'):
+        """
+        Gives every agent of the given types a randomly initialized brain, fed by
+        the named sensor (see sensors.SENSORS).
+        All agents of a species share one network architecture.
+        """
+        self.sensor = SENSORS[sensor](self.map_size)
+        layer_sizes = (self.sensor.input_size, *hidden_sizes, BRAIN_OUTPUT_SIZE)
+        for agent_type in agent_types:
+            members = np.flatnonzero(self.agents.alive & (self.agents.type == agent_type))
+            self.brains[agent_type] = Brain(layer_sizes, len(members), self.agents.rng)
+            self.agents.brain_row[members] = np.arange(len(members), dtype=np.int32)
+
+    def steer(self, stepping=None):
+        """
+        Turns every agent that has a brain by its brain's output, all species at once.
+        Only the agents in the optional stepping mask sense and turn.
+        Returns the mask of steered agents.
+        """
+        agents = self.agents
+        inputs = self.partitioner.sense(stepping) if self.partitioner else self.sensor.sense(agents, stepping)
+        steered = agents.brain_row >= 0
+        if stepping is not None:
+            steered &= stepping
+        for agent_type, brain in self.brains.items():
+            members = np.flatnonzero(steered & (agents.type == agent_type))
+            outputs = brain.forward(inputs[members], agents.brain_row[members])
+            agents.angle[members] = np.mod(agents.angle[members] + outputs[:, 0] * MAX_TURN_RATE, 2 * np.pi)
+        return steered
+
+    def summary(self):
+        """
+        Returns a dictionary summarizing the current state of the world.
+        """
+        return {
+            'steps': self.step_count,
+            'agents': self.agents.population,
+            'prey': self.agents.count_type(PREY_TYPE),
+            'predators': self.agents.count_type(PREDATOR_TYPE),
+        }
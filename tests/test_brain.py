@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from brain import Brain
+from constants import *
+
+def forward_one_by_one(brain, inputs, rows):
+    outputs = []
+    for agent_inputs, row in zip(inputs.astype(np.float32), rows):
+        activations = agent_inputs[None, :]
+        for weights, biases in zip(brain.weights, brain.biases):
+            activations = np.tanh(activations @ weights[row] + biases[row])
+        outputs.append(activations[0])
+    return np.array(outputs)
+
+# One row per agent, and a few rows dealt out to many agents (as in evolution)
+@pytest.mark.parametrize('rows_count, agents', [(300, 300), (5, 300), (1, 40)])
+def test_every_agent_thinks_with_its_own_row(rows_count, agents):
+    rng = np.random.default_rng(rows_count)
+    brain = Brain((6, *BRAIN_HIDDEN_SIZES, 2), rows_count, rng)
+    for biases in brain.biases:
+        biases[:] = rng.normal(0, 0.5, biases.shape)
+    rows = rng.permutation(brain.deal(agents))
+    inputs = rng.normal(0, 1, (agents, 6))
+    outputs = brain.forward(inputs, rows)
+    assert outputs.shape == (agents, 2) and outputs.dtype == np.float32
+    assert np.allclose(outputs, forward_one_by_one(brain, inputs, rows), atol=1e-6)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from checkpoint import STORE_COLUMNS, save_checkpoint, load_checkpoint
+from world import World
+
+def state(world):
+    agents = world.agents
+    arrays = {name: getattr(agents, name)[:agents.count].copy() for name in STORE_COLUMNS}
+    for agent_type, brain in world.brains.items():
+        for layer, (weights, biases) in enumerate(zip(brain.weights, brain.biases)):
+            arrays[f'weights_{agent_type}_{layer}'] = weights[:brain.rows_used].copy()
+            arrays[f'biases_{agent_type}_{layer}'] = biases[:brain.rows_used].copy()
+    arrays['counters'] = np.array([world.step_count, world.catch_count, agents.births, agents.deaths, agents.next_id])
+    return arrays
+
+def assert_same_world(restored, world):
+    expected = state(world)
+    result = state(restored)
+    assert result.keys() == expected.keys()
+    for name, value in expected.items():
+        assert result[name].dtype == value.dtype, name
+        assert np.array_equal(result[name], value), name
+
+# Saved between idle chunk reviews, so frozen agents are still behind when saved.
+# Sensors widen the border that keeps chunks active, so those worlds need more room to have idle chunks.
+@pytest.mark.parametrize('sensor, idle_chunks, map_size', [(None, False, (512, 384)), ('nearest', False, (512, 384)),
+                                                           ('rays', False, (512, 384)), (None, True, (512, 384)),
+                                                           ('nearest', True, (1024, 768))])
+def test_restored_world_continues_bit_for_bit(tmp_path, sensor, idle_chunks, map_size):
+    world = World(300, 60, map_size, seed=11, idle_chunks=idle_chunks)
+    if sensor:
+        world.attach_brains(sensor=sensor)
+    for _ in range(205):
+        world.update()
+    assert np.any(world.agents.idle) == idle_chunks
+    path = str(tmp_path / 'world.npz')
+    save_checkpoint(world, path)
+
+    restored = load_checkpoint(path)
+    assert_same_world(restored, world)
+    assert restored.idle_chunks == idle_chunks
+    assert (restored.sensor.name if restored.sensor else None) == sensor
+    for _ in range(150):
+        world.update()
+        restored.update()
+    assert_same_world(restored, world)
+    assert world.catch_count > 0
+
+def test_a_new_seed_forks_the_run(tmp_path):
+    world = World(300, 60, 128, seed=12)
+    for _ in range(50):
+        world.update()
+    path = str(tmp_path / 'world.npz')
+    save_checkpoint(world, path)
+
+    first = load_checkpoint(path, seed=1)
+    second = load_checkpoint(path, seed=1)
+    other = load_checkpoint(path, seed=2)
+    for _ in range(50):
+        for restored in (first, second, other):
+            restored.update()
+    assert_same_world(second, first)
+    assert not np.array_equal(other.agents.x, first.agents.x)
+
+def test_other_files_are_refused(tmp_path):
+    path = str(tmp_path / 'other.npz')
+    np.savez(path, metadata=np.array('{"format": "something else"}'))
+    with pytest.raises(ValueError):
+        load_checkpoint(path)
@@ -0,0 +1,66 @@
+import json
+import pytest
+from config import Config
+from constants import *
+
+def test_defaults_and_derived_values():
+    config = Config()
+    assert config.map_size == MAP_SIZE
+    assert config.map_height is None
+    assert config.half_width == config.half_height == MAP_SIZE / 2
+    assert config.energy_per_step == (ENERGY_PER_STEP[PREY_TYPE], ENERGY_PER_STEP[PREDATOR_TYPE])
+    assert config.screen_width == config.content_width + 2 * config.area_padding + config.panel_width
+
+@pytest.mark.parametrize('values', [
+    {'prey_count': -1},
+    {'prey_count': 2.5},
+    {'prey_count': True},
+    {'prey_count': '10'},
+    {'map_size': 0},
+    {'prey_speed': -0.1},
+    {'ecosystem': 1},
+    {'seed': -3},
+    {'direction_change_interval': 0},
+    {'screen_height': 20, 'area_padding': 10},
+    {'not_a_field': 1},
+])
+def test_invalid_values_are_refused(values):
+    with pytest.raises(ValueError):
+        Config(**values)
+
+def test_values_are_converted_to_their_field_type():
+    config = Config(prey_count=10.0, prey_speed=2, seed=None)
+    assert config.prey_count == 10 and type(config.prey_count) is int
+    assert config.prey_speed == 2.0 and type(config.prey_speed) is float
+    assert config.seed is None
+
+def test_replace_returns_an_updated_copy():
+    config = Config(prey_count=10)
+    changed = config.replace(map_size=300, map_height=200, prey_speed=3)
+    assert config.map_size == MAP_SIZE and config.prey_speed == PREY_SPEED
+    assert (changed.map_size, changed.map_height, changed.prey_speed, changed.prey_count) == (300, 200, 3.0, 10)
+    # Derived values follow the new fields
+    assert (changed.half_width, changed.half_height) == (150, 100)
+    with pytest.raises(ValueError):
+        config.replace(prey_count=-5)
+
+def test_configs_are_read_only():
+    config = Config()
+    with pytest.raises(AttributeError):
+        config.prey_count = 5
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'run.json')
+    config = Config(map_size=500, seed=4, idle_chunks=True)
+    config.save(path)
+    assert Config.load(path).as_dict() == config.as_dict()
+
+    # Fields left out keep their defaults
+    with open(path, 'w') as file:
+        json.dump({'prey_count': 7}, file)
+    assert Config.load(path).as_dict() == Config(prey_count=7).as_dict()
+
+    with open(path, 'w') as file:
+        json.dump([1, 2], file)
+    with pytest.raises(ValueError):
+        Config.load(path)
@@ -0,0 +1,30 @@
+import numpy as np
+import evolution
+from brain import Brain
+from constants import *
+from sensors import SENSORS
+
+def test_episode_survives_predators_wiping_out_the_prey():
+    # Enough predators to eat every prey, then starve: the population collapses
+    # far enough that a world stepping normally would compact its pool
+    params = {
+        'prey_count': 100,
+        'predator_count': 1500,
+        'map_size': 64,
+        'hidden_sizes': BRAIN_HIDDEN_SIZES,
+        'sensor': 'nearest',
+        'steps': 2100,
+    }
+    layer_sizes = (SENSORS['nearest'](params['map_size']).input_size, *BRAIN_HIDDEN_SIZES, BRAIN_OUTPUT_SIZE)
+    population = 4
+    rng = np.random.default_rng(0)
+    evolution._worker_genomes = np.stack([Brain(layer_sizes, population, rng).genomes(np.arange(population))
+                                          for _ in (PREY_TYPE, PREDATOR_TYPE)])
+
+    groups = {PREY_TYPE: np.arange(population), PREDATOR_TYPE: np.arange(population)}
+    results = evolution.run_episode((groups, 0, params))
+
+    for agent_type in (PREY_TYPE, PREDATOR_TYPE):
+        group, fitness = results[agent_type]
+        assert np.array_equal(group, groups[agent_type])
+        assert np.all((fitness >= 0) & (fitness <= params['steps'] + CATCH_FITNESS * params['prey_count']))
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from partition import Partitioner
+from world import World
+
+def run(workers, sensor=None, idle_chunks=False, steps=150):
+    world = World(400, 80, 128, seed=5, idle_chunks=idle_chunks)
+    if sensor:
+        world.attach_brains(sensor=sensor)
+    partitioner = Partitioner(world, workers) if workers else None
+    try:
+        for _ in range(steps):
+            world.update()
+        agents = world.agents
+        return {
+            'x': agents.x.copy(),
+            'y': agents.y.copy(),
+            'energy': agents.energy.copy(),
+            'alive': agents.alive.copy(),
+            'id': agents.id.copy(),
+            'catches': world.catch_count,
+        }
+    finally:
+        if partitioner:
+            partitioner.close()
+
+@pytest.mark.parametrize('sensor, idle_chunks', [(None, False), ('nearest', False), ('rays', False), (None, True)])
+def test_seeded_runs_match_with_any_number_of_workers(sensor, idle_chunks):
+    expected = run(0, sensor, idle_chunks)
+    for workers in (2, 3):
+        result = run(workers, sensor, idle_chunks)
+        for name, value in expected.items():
+            assert np.array_equal(result[name], value), (workers, name)
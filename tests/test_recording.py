@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+import recording
+from recording import Recorder, Replay
+from world import World
+
+def record_run(path, steps, quantize=False, interval=1, close=True):
+    """
+    Records a seeded run and returns the living agents' columns of every recorded step, by step.
+    """
+    world = World(150, 30, (128, 96), seed=7)
+    recorder = Recorder(path, world, quantize, interval)
+    float_dtype = np.float16 if quantize else np.float32
+    expected = {}
+    for step in range(steps + 1):
+        if step:
+            world.update()
+            recorder.record(world.step_count, world.agents)
+        if world.step_count % interval == 0:
+            agents = world.agents
+            living = np.flatnonzero(agents.alive)
+            expected[world.step_count] = {
+                'id': agents.id[living].astype(np.uint32),
+                'x': agents.x[living].astype(float_dtype),
+                'y': agents.y[living].astype(float_dtype),
+                'angle': agents.angle[living].astype(float_dtype),
+                'type': agents.type[living].astype(np.uint8),
+            }
+    if close:
+        recorder.close()
+    else:
+        recorder.file.flush() # Interrupted: the buffered chunk and the index are never written
+    return expected
+
+def assert_frame(replay, expected):
+    frame = expected[replay.step_count]
+    for name, column in frame.items():
+        assert np.array_equal(getattr(replay.agents, name), column), name
+    assert replay.agents.count == len(frame['id'])
+    assert replay.agents.type_counts.tolist() == np.bincount(frame['type'], minlength=2).tolist()
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(recording, 'RECORDING_CHUNK_STEPS', 16)
+
+@pytest.mark.parametrize('quantize, interval', [(False, 1), (True, 1), (False, 3)])
+def test_replay_plays_back_every_recorded_frame(tmp_path, quantize, interval):
+    path = str(tmp_path / 'run.rec')
+    expected = record_run(path, 100, quantize, interval)
+    replay = Replay(path)
+    assert (replay.map_width, replay.map_height) == (128, 96)
+    assert replay.first_step == 0
+    assert replay.last_step == max(expected)
+
+    played = [replay.step_count]
+    assert_frame(replay, expected)
+    while replay.step_count < replay.last_step:
+        replay.update()
+        played.append(replay.step_count)
+        assert_frame(replay, expected)
+    assert played == sorted(expected)
+
+def test_seek_shows_the_last_frame_at_or_before_a_step(tmp_path):
+    path = str(tmp_path / 'run.rec')
+    expected = record_run(path, 100, interval=3)
+    replay = Replay(path)
+    for step in (50, 0, 99, 16, 17, 48, 1000, -5):
+        replay.seek(step)
+        recorded = [recorded for recorded in expected if recorded <= max(step, 0)]
+        assert replay.step_count == max(recorded)
+        assert_frame(replay, expected)
+
+def test_unclosed_recording_rebuilds_its_index(tmp_path):
+    path = str(tmp_path / 'run.rec')
+    expected = record_run(path, 70, close=False)
+    replay = Replay(path)
+    # Only whole chunks made it to disk
+    assert replay.last_step == 63
+    for step in (63, 0, 31, 32, 40):
+        replay.seek(step)
+        assert replay.step_count == step
+        assert_frame(replay, expected)
+
+    # A chunk cut off partway through is left out too
+    with open(path, 'r+b') as file:
+        file.truncate(file.seek(0, 2) - 100)
+    replay = Replay(path)
+    assert replay.last_step == 47
@@ -0,0 +1,47 @@
+import numpy as np
+import pygame
+import pytest
+from constants import *
+from render import AgentRenderer
+
+@pytest.fixture
+def renderer():
+    yield AgentRenderer(64, 40, None)
+
+def pixels(surface):
+    return pygame.surfarray.array3d(surface)
+
+def write_line(size, start, angle):
+    surface = pygame.Surface(size)
+    AgentRenderer(*size, None).draw_facing_lines(surface, np.array([start[0]]), np.array([start[1]]), np.array([angle]), 24)
+    return pixels(surface)
+
+def test_facing_lines_match_drawn_lines():
+    for angle in np.linspace(0, 2 * np.pi, 73):
+        drawn = pygame.Surface((64, 64))
+        pygame.draw.line(drawn, WHITE, (30, 30), (30 + int(24 * np.cos(angle)), 30 + int(24 * np.sin(angle))), 1)
+        assert np.array_equal(write_line((64, 64), (30, 30), angle), pixels(drawn))
+
+def test_facing_lines_are_cropped_by_the_surface():
+    for angle in np.linspace(0, 2 * np.pi, 73):
+        whole = write_line((100, 100), (50, 50), angle)
+        assert np.array_equal(write_line((40, 30), (10, 5), angle), whole[40:80, 45:75])
+
+def test_density_map_shades_by_type_and_count(renderer):
+    surface = pygame.Surface((64, 40))
+    surface.fill(WHITE)
+    screen_x = np.array([10, 20, 20] + [40] * (DENSITY_SATURATION + 3) + [63])
+    screen_y = np.array([10, 30, 30] + [5] * (DENSITY_SATURATION + 3) + [39])
+    types = np.array([PREY_TYPE, PREY_TYPE, PREDATOR_TYPE] + [PREY_TYPE] * (DENSITY_SATURATION + 3) + [PREDATOR_TYPE])
+    renderer.draw_density(surface, screen_x, screen_y, types)
+    image = pixels(surface)
+
+    assert tuple(image[10, 10]) == tuple(image[9, 9]) == AGENT_TYPE_COLORS[PREY_TYPE]
+    assert tuple(image[20, 30]) == AGENT_TYPE_COLORS[PREDATOR_TYPE] # Predators cover prey
+    assert tuple(image[40, 5]) == WHITE # Saturated
+    assert tuple(image[62, 38]) == AGENT_TYPE_COLORS[PREDATOR_TYPE] # Clipped at the edge
+    assert tuple(image[0, 0]) == BLACK
+    covered = np.zeros((64, 40), dtype=bool)
+    for x, y in zip(screen_x, screen_y):
+        covered[max(x - 1, 0):x + 1, max(y - 1, 0):y + 1] = True
+    assert not image[~covered].any()
@@ -0,0 +1,31 @@
+import os
+import pygame
+import pytest
+
+# Draw into an offscreen dummy display, like the benchmarks do
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+from simulation import Simulation
+from world import World
+
+@pytest.fixture
+def simulation():
+    simulation = Simulation(World(50, 10, 256, seed=1))
+    yield simulation
+    pygame.quit()
+
+def text_area(simulation):
+    return pygame.image.tobytes(simulation.screen.subsurface(simulation.panel_text_rect), 'RGB')
+
+def bare_text_area(simulation):
+    chrome_rect = simulation.panel_text_rect.move(-simulation.config.total_display_width, 0)
+    return pygame.image.tobytes(simulation.panel_surface.subsurface(chrome_rect), 'RGB')
+
+def test_panel_text_is_drawn_when_the_chrome_changes(simulation):
+    simulation.draw_panel()
+    assert text_area(simulation) != bare_text_area(simulation)
+
+    # A hover or selection change redraws the whole panel, live values included
+    simulation.panel_chrome_key = None
+    assert simulation.draw_panel() == [simulation.panel_rect]
+    assert text_area(simulation) != bare_text_area(simulation)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from spatial import SpatialHash, brute_force_nearest
+
+def wrapped_distances(x, y, px, py, width, height):
+    dx = x - px
+    dx -= width * np.round(dx / width)
+    dy = y - py
+    dy -= height * np.round(dy / height)
+    return np.hypot(dx, dy)
+
+# A small crowded map (dense cell table) and a large empty one (sparse cell table)
+@pytest.fixture(params=[((200, 120), 7, 2000), ((4000, 3000), 10, 300)])
+def scattered(request):
+    map_size, cell_size, count = request.param
+    width, height = map_size
+    rng = np.random.default_rng(count)
+    x = rng.uniform(-width / 2, width / 2, count)
+    y = rng.uniform(-height / 2, height / 2, count)
+    index = SpatialHash(map_size, cell_size)
+    index.update(x, y)
+    # Queries include points right on the wrapping edges
+    px = np.concatenate((rng.uniform(-width / 2, width / 2, 60), [-width / 2, width / 2 - 1e-9, 0]))
+    py = np.concatenate((rng.uniform(-height / 2, height / 2, 60), [-height / 2, 0, height / 2 - 1e-9]))
+    return index, map_size, x, y, px, py
+
+def test_query_radius_finds_every_agent_in_range(scattered):
+    index, (width, height), x, y, px, py = scattered
+    for qx, qy in zip(px, py):
+        indices, distances = index.query_radius(qx, qy, 25)
+        expected = np.flatnonzero(wrapped_distances(x, y, qx, qy, width, height) <= 25)
+        assert np.array_equal(np.sort(indices), expected)
+        assert np.allclose(distances, wrapped_distances(x[indices], y[indices], qx, qy, width, height))
+
+@pytest.mark.parametrize('max_radius', [None, 40])
+def test_query_knn_finds_the_nearest_agents(scattered, max_radius):
+    index, (width, height), x, y, px, py = scattered
+    for qx, qy in zip(px, py):
+        indices, distances = index.query_knn(qx, qy, 5, max_radius)
+        all_distances = wrapped_distances(x, y, qx, qy, width, height)
+        expected = np.sort(all_distances)[:5]
+        if max_radius is not None:
+            expected = expected[expected <= max_radius]
+        assert np.allclose(distances, expected)
+        assert np.allclose(all_distances[indices], distances)
+
+def test_batch_nearest_matches_brute_force(scattered):
+    index, map_size, x, y, px, py = scattered
+    for max_radius in (5, 30, 1000):
+        indices, distances = index.batch_nearest(px, py, max_radius)
+        expected_indices, expected_distances = brute_force_nearest(px, py, x, y, map_size, max_radius)
+        assert np.array_equal(indices, expected_indices)
+        assert np.allclose(distances, expected_distances)
+
+def test_batch_nearest_excludes_the_asking_agent(scattered):
+    index, map_size, x, y, px, py = scattered
+    own = np.arange(50)
+    indices, distances = index.batch_nearest(x[own], y[own], 1000, exclude=own)
+    assert not np.any(indices == own)
+    others = np.ones(len(x), dtype=bool)
+    for query in own:
+        others[:] = True
+        others[query] = False
+        candidates = np.flatnonzero(others)
+        nearest, distance = brute_force_nearest(x[query:query + 1], y[query:query + 1],
+                                                x[candidates], y[candidates], map_size, 1000)
+        assert indices[query] == candidates[nearest[0]]
+        assert np.isclose(distances[query], distance[0])
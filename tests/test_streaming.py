@@ -0,0 +1,157 @@
+import base64
+import hashlib
+import socket
+import time
+import numpy as np
+import pytest
+from streaming import (StreamServer, StreamClient, StreamState, encode_frame, decode_frame, quantize, dequantize,
+                       AGENT_COLUMNS, FRAME_HEADER, KEYFRAME, DELTA, MESSAGE_HELLO, WEBSOCKET_GUID)
+from world import World
+
+def random_state(rng, ids, step, map_size=256):
+    x = rng.uniform(-map_size / 2, map_size / 2, len(ids))
+    y = rng.uniform(-map_size / 2, map_size / 2, len(ids))
+    qx, qy, qangle = quantize(map_size, map_size, x, y, rng.uniform(0, 2 * np.pi, len(ids)))
+    columns = {'id': np.sort(ids).astype(np.uint32), 'x': qx, 'y': qy, 'angle': qangle,
+               'type': rng.integers(0, 2, len(ids)).astype(np.uint8)}
+    return StreamState(step, columns, [int(np.count_nonzero(columns['type'] == 0)), int(np.count_nonzero(columns['type']))])
+
+def moved(state, rng, step, spread):
+    """
+    Returns the state with some agents gone, some new ones, and the rest moved by up to spread quantized steps.
+    """
+    ids = state.columns['id']
+    keep = np.flatnonzero(rng.random(len(ids)) < 0.9)
+    kept = state.select(keep)
+    for name, span in (('x', 1 << 16), ('y', 1 << 16), ('angle', 1 << 8)):
+        change = rng.integers(-spread, spread + 1, len(kept))
+        kept.columns[name] = ((kept.columns[name].astype(np.int64) + change) % span).astype(kept.columns[name].dtype)
+    newcomers = random_state(rng, np.arange(20) + int(ids.max()) + 1, step)
+    merged = {name: np.concatenate((kept.columns[name], newcomers.columns[name])) for name, _ in AGENT_COLUMNS}
+    return StreamState(step, merged, state.type_counts)
+
+def assert_same_state(decoded, expected):
+    assert decoded.step == expected.step
+    assert list(decoded.type_counts) == list(expected.type_counts)
+    for name, dtype in AGENT_COLUMNS:
+        assert decoded.columns[name].dtype == dtype
+        assert np.array_equal(decoded.columns[name], expected.columns[name]), name
+
+@pytest.mark.parametrize('spread', [0, 3, 100, 40000])
+def test_frames_decode_to_the_encoded_state(spread):
+    rng = np.random.default_rng(spread)
+    state = random_state(rng, np.arange(500), 0)
+    frame = encode_frame(state, None)
+    assert FRAME_HEADER.unpack_from(frame)[1] == KEYFRAME
+    decoded = decode_frame(frame, None)
+    assert_same_state(decoded, state)
+
+    for step in range(1, 6):
+        previous = state
+        state = moved(state, rng, step, spread)
+        frame = encode_frame(state, previous)
+        if spread <= 100:
+            assert FRAME_HEADER.unpack_from(frame)[1] == DELTA
+        decoded = decode_frame(frame, decoded)
+        assert_same_state(decoded, state)
+
+def test_delta_needs_a_keyframe_first():
+    rng = np.random.default_rng(0)
+    state = random_state(rng, np.arange(50), 0)
+    frame = encode_frame(moved(state, rng, 1, 1), state)
+    with pytest.raises(ValueError):
+        decode_frame(frame, None)
+
+def test_quantized_positions_stay_within_a_step():
+    rng = np.random.default_rng(1)
+    x = rng.uniform(-128, 128, 1000)
+    y = rng.uniform(-64, 64, 1000)
+    angle = rng.uniform(0, 2 * np.pi, 1000)
+    dx, dy, dangle = dequantize(256, 128, *quantize(256, 128, x, y, angle))
+    assert np.all(np.abs(dx - x) <= 256 / 65535)
+    assert np.all(np.abs(dy - y) <= 128 / 65535)
+    turn = np.abs(np.mod(dangle - angle + np.pi, 2 * np.pi) - np.pi)
+    assert np.all(turn <= np.pi / 256 + 1e-6)
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+@pytest.fixture
+def served_world():
+    world = World(300, 60, (256, 128), seed=3)
+    server = StreamServer(host='127.0.0.1', port=0, fps=1000)
+    server.start(world)
+    yield world, server
+    server.close()
+
+def test_tcp_client_receives_hello_and_frames(served_world):
+    world, server = served_world
+    client = StreamClient('127.0.0.1', server.port)
+    try:
+        assert (client.map_width, client.map_height) == (256, 128)
+        assert client.prey_speed == world.prey_speed
+        wait_for(lambda: server.clients)
+        for _ in range(5):
+            world.update()
+            server.after_step(world)
+            wait_for(lambda: server.pending is None)
+            time.sleep(1 / server.fps) # So the next snapshot is due
+        wait_for(lambda: client.latest is not None and client.latest.step == world.step_count)
+
+        client.update()
+        agents = world.agents
+        living = np.flatnonzero(agents.alive)
+        assert client.agents.count == living.size
+        assert np.array_equal(client.agents.id, np.sort(agents.id[living]))
+        assert client.agents.type_counts.tolist() == agents.type_counts.tolist()
+    finally:
+        client.close()
+
+def test_snapshots_are_skipped_while_one_is_pending(served_world):
+    world, server = served_world
+    server.clients.add(object()) # Someone is watching
+    server.pending = ('unpublished',)
+    world.update()
+    server.after_step(world)
+    assert server.pending == ('unpublished',)
+    server.clients.clear()
+    server.pending = None
+
+def receive_websocket_message(connection):
+    first, second = connection.recv(2, socket.MSG_WAITALL)
+    size = second & 0x7F
+    if size == 126:
+        size = int.from_bytes(connection.recv(2, socket.MSG_WAITALL), 'big')
+    elif size == 127:
+        size = int.from_bytes(connection.recv(8, socket.MSG_WAITALL), 'big')
+    return first & 0x0F, connection.recv(size, socket.MSG_WAITALL)
+
+def test_websocket_handshake_and_hello(served_world):
+    world, server = served_world
+    key = base64.b64encode(b'sixteen byte key').decode()
+    with socket.create_connection(('127.0.0.1', server.port)) as connection:
+        connection.settimeout(10)
+        connection.sendall((f"GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+        response = b''
+        while not response.endswith(b'\r\n\r\n'):
+            response += connection.recv(1)
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest()).decode()
+        assert response.startswith(b'HTTP/1.1 101')
+        assert f"Sec-WebSocket-Accept: {accept}".encode() in response
+
+        opcode, payload = receive_websocket_message(connection)
+        assert opcode == 0x2
+        assert payload[0] == MESSAGE_HELLO
+        assert b'"map_size": [256, 128]' in payload[1:]
+
+def test_other_openings_are_hung_up_on(served_world):
+    world, server = served_world
+    with socket.create_connection(('127.0.0.1', server.port)) as connection:
+        connection.settimeout(10)
+        connection.sendall(b'NOTASTREAM')
+        assert connection.recv(1) == b''
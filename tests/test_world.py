@@ -0,0 +1,37 @@
+import numpy as np
+from checkpoint import save_checkpoint, load_checkpoint
+from world import World
+
+def living_ids(world):
+    agents = world.agents
+    return agents.id[agents.alive]
+
+def test_two_worlds_keep_their_ids_unique():
+    first = World(200, 40, 64, seed=1)
+    for _ in range(600):
+        first.update()
+    second = World(200, 40, 64, seed=2)
+    for _ in range(600):
+        first.update()
+        second.update()
+
+    for world in (first, second):
+        ids = living_ids(world)
+        assert np.unique(ids).size == ids.size
+        assert world.agents.next_id > ids.max()
+
+def test_checkpoint_restores_the_id_counter_of_its_world(tmp_path):
+    world = World(200, 40, 64, seed=3)
+    for _ in range(300):
+        world.update()
+    path = str(tmp_path / 'world.npz')
+    save_checkpoint(world, path)
+    World(10, 2, 64, seed=4) # Another world in between must not disturb either counter
+
+    restored = load_checkpoint(path)
+    assert restored.agents.next_id == world.agents.next_id
+    for _ in range(300):
+        world.update()
+        restored.update()
+    assert np.array_equal(living_ids(restored), living_ids(world))
+    assert np.unique(living_ids(restored)).size == living_ids(restored).size